@@ -22,6 +22,11 @@ unsigned long lastMillis = 0;
 const char* AP_NAME = "SolireSense";
 const char* MQTT_ID = "SolireSense";
 
+// Id of this probe: MQTT_ID and the chip's MAC address, e.g.
+// "SolireSense-A1B2C3D4E5F6". It is the MQTT client id, so probes sharing
+// the broker don't disconnect each other, and the device_id of its readings.
+String deviceId;
+
 // PH
 #define DMS_PIN 13
 #define ADC_PIN 34
@@ -41,7 +46,7 @@ DallasTemperature sensors(&oneWire);
 
 void connectMqtt() {
   Serial.print("\nConnecting To MQTT Server!\n");
-  while (!client.connect(MQTT_ID, mqtt_user, mqtt_password)) {
+  while (!client.connect(deviceId.c_str(), mqtt_user, mqtt_password)) {
     Serial.print(".");
     delay(1000);
   }
@@ -106,6 +111,11 @@ void setup() {
 
   setupWiFi();
 
+  deviceId = String(MQTT_ID) + "-" + WiFi.macAddress();
+  deviceId.replace(":", "");
+  Serial.print("Device id: ");
+  Serial.println(deviceId);
+
   client.begin("piperbelly008.cloud.shiftr.io", net);
   client.onMessage(messageReceived);
   connectMqtt();
@@ -143,7 +153,9 @@ void loop() {
 
   // --- Publish all data to a single topic ---
 
-  DynamicJsonDocument allSensorDoc(256); // Increased size to accommodate all data
+  DynamicJsonDocument allSensorDoc(384); // Increased size to accommodate all data
+
+  allSensorDoc["device_id"] = deviceId;
 
   // Add Temperature data
   allSensorDoc["temperature_c"] = tempC;
@@ -158,7 +170,7 @@ void loop() {
   allSensorDoc["ph_adc"] = phAdc;
   allSensorDoc["ph_value"] = lastReading;
 
-  char combinedJsonBuffer[256]; // Increased buffer size
+  char combinedJsonBuffer[384]; // Increased buffer size
   serializeJson(allSensorDoc, combinedJsonBuffer);
   client.publish(topic, combinedJsonBuffer);
   Serial.print("Published to ");
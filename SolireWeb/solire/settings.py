@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it times everything below it
+    'solire_app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,13 +80,73 @@ WSGI_APPLICATION = 'solire.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# The database is chosen with environment variables:
+#
+#   SOLIRE_DB_ENGINE      'sqlite' (default) or 'postgresql'
+#   SOLIRE_DB_NAME        SQLite file or PostgreSQL database name
+#   SOLIRE_DB_USER, SOLIRE_DB_PASSWORD, SOLIRE_DB_HOST, SOLIRE_DB_PORT
+#                         PostgreSQL connection (needs psycopg installed)
+#   SOLIRE_DB_CONN_MAX_AGE
+#                         Seconds a connection is kept open and reused across
+#                         requests (default 600, 0 closes it after each one)
+#   SOLIRE_SQLITE_PROFILE 'tuned' (default) or 'default' for SQLite's stock
+#                         settings, e.g. to compare them with bench_ingest
+
+SOLIRE_DB_ENGINE = os.environ.get('SOLIRE_DB_ENGINE', 'sqlite')
+
+SOLIRE_SQLITE_PROFILE = os.environ.get('SOLIRE_SQLITE_PROFILE', 'tuned')
+
+# Many probes inserting at once on SQLite:
+# - WAL lets readers carry on while a reading is written, and with
+#   synchronous=NORMAL a commit no longer waits for an fsync (the database
+#   stays consistent, a power cut can lose the last commits)
+# - a bigger page cache (in KiB when negative), temporary tables in memory
+#   and memory-mapped reads
+# - transactions take the write lock when they begin (IMMEDIATE), so two of
+#   them never deadlock upgrading a read lock, and writers wait up to 20 s
+#   for the lock instead of failing with "database is locked"
+SQLITE_TUNED_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-65536;'
+        'PRAGMA temp_store=MEMORY;'
+        'PRAGMA mmap_size=268435456'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
 }
 
+if SOLIRE_DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('SOLIRE_DB_NAME', 'solire'),
+            'USER': os.environ.get('SOLIRE_DB_USER', 'solire'),
+            'PASSWORD': os.environ.get('SOLIRE_DB_PASSWORD', ''),
+            'HOST': os.environ.get('SOLIRE_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('SOLIRE_DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('SOLIRE_DB_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+elif SOLIRE_DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SOLIRE_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+    if SOLIRE_SQLITE_PROFILE == 'tuned':
+        DATABASES['default'].update({
+            'OPTIONS': SQLITE_TUNED_OPTIONS,
+            'CONN_MAX_AGE': int(os.environ.get('SOLIRE_DB_CONN_MAX_AGE', 600)),
+        })
+    elif SOLIRE_SQLITE_PROFILE != 'default':
+        raise ImproperlyConfigured(f"SOLIRE_SQLITE_PROFILE must be 'tuned' or 'default', not {SOLIRE_SQLITE_PROFILE!r}")
+else:
+    raise ImproperlyConfigured(f"SOLIRE_DB_ENGINE must be 'sqlite' or 'postgresql', not {SOLIRE_DB_ENGINE!r}")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,3 +192,123 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Fuzzy recommendation engine
+# The shared fuzzy system is built on first use. Its compiled rule base is
+# cached in SOLIRE_FUZZY_COMPILED_PATH so later workers load it with NumPy
+# alone instead of importing skfuzzy; it is rebuilt whenever the fuzzy logic
+# code or library versions change. None disables the cache file.
+
+SOLIRE_FUZZY_COMPILED_PATH = BASE_DIR / 'fuzzy_tables' / 'compiled_rule_base.npz'
+
+# How suitability scores are defuzzified: 'centroid' reproduces skfuzzy's
+# centroid over the sampled output universe (0.01 steps), 'analytic' computes
+# the exact centroid of the output sets, without that quantization error.
+# Changing it changes the scores, so stored recommendations are recomputed.
+
+SOLIRE_FUZZY_DEFUZZIFIER = 'centroid'
+
+# When enabled, recommendations are interpolated from a precomputed score grid
+# instead of running the fuzzy rules on every request. The grid is built once
+# into SOLIRE_FUZZY_LOOKUP_DIR (shared, memory-mapped, by all workers) and is
+# rebuilt automatically when the plant database or rule sets change.
+
+SOLIRE_FUZZY_LOOKUP_TABLE = False
+
+SOLIRE_FUZZY_LOOKUP_DIR = BASE_DIR / 'fuzzy_tables'
+
+# Grid spacing per input, e.g. {'ph': 0.1, 'temperature': 0.5, 'humidity': 1.0}.
+# None uses helpers.fuzzy_lookup.DEFAULT_LOOKUP_STEPS.
+SOLIRE_FUZZY_LOOKUP_STEPS = None
+
+# Number of recent (rounded) inputs whose recommendations are kept in an LRU
+# cache; 0 (the default) disables it. Precision is decimal places per input,
+# e.g. {'ph': 2, 'temperature': 1, 'humidity': 0}; None uses
+# helpers.fuzzy_cache.DEFAULT_CACHE_PRECISION. Cached recommendations are
+# scored on the rounded inputs, while stored ones (and reports) score the
+# exact readings, so with the cache on api/recommend/ can differ slightly
+# from the recommendation stored for the same reading.
+SOLIRE_FUZZY_CACHE_SIZE = 0
+
+SOLIRE_FUZZY_CACHE_PRECISION = None
+
+# Reports and exports of at least SOLIRE_BULK_MIN_ROWS readings are scored by
+# SOLIRE_BULK_WORKERS processes in parallel (helpers.bulk_recommendations),
+# streamed back in order. 0 scores them in the request process.
+
+SOLIRE_BULK_WORKERS = 0
+
+SOLIRE_BULK_MIN_ROWS = 20000
+
+# Readings stored per INSERT by the bulk ingest endpoint (api/insert/bulk/)
+SOLIRE_INGEST_BATCH_SIZE = 500
+
+# MQTT broker the SolireSense sensors publish to, read by
+# `manage.py ingest_mqtt`. Keep the password out of version control.
+
+SOLIRE_MQTT_HOST = 'localhost'
+
+SOLIRE_MQTT_PORT = 1883
+
+SOLIRE_MQTT_TOPIC = 'Sensors'
+
+SOLIRE_MQTT_CLIENT_ID = 'solire-ingest'
+
+SOLIRE_MQTT_USERNAME = None
+
+SOLIRE_MQTT_PASSWORD = None
+
+# Readings ingest_mqtt received but could not store when it stopped (e.g. the
+# database was down); they are stored first when it starts again
+SOLIRE_MQTT_SPOOL_PATH = BASE_DIR / 'mqtt_spool.ndjson'
+
+# Threads running fuzzy inference for the async views (api/async/...) off the
+# event loop. None uses the ThreadPoolExecutor default.
+SOLIRE_ASYNC_FUZZY_WORKERS = None
+
+# Live feed (api/stream/): seconds between checks for new readings, between
+# keepalive comments, and before a stream ends so the browser reconnects;
+# milliseconds the browser waits before reconnecting.
+
+SOLIRE_SSE_POLL_INTERVAL = 1.0
+
+SOLIRE_SSE_KEEPALIVE = 15
+
+SOLIRE_SSE_MAX_DURATION = 300
+
+SOLIRE_SSE_RETRY_MS = 3000
+
+# Seconds between the dashboard's checks for new readings when it is served
+# over WSGI, where it polls api/ instead of opening the live feed
+SOLIRE_LIVE_POLL_INTERVAL = 5.0
+
+# Serialized responses of the list endpoints are kept in Django's cache
+# (CACHES) for this many seconds, keyed by the dataset version so every write
+# invalidates them; None disables it. Larger responses are not cached.
+
+SOLIRE_RESPONSE_CACHE_TIMEOUT = 60
+
+SOLIRE_RESPONSE_CACHE_MAX_BYTES = 5 * 1024 * 1024
+
+# Rows per page of the dashboard's readings table
+SOLIRE_INDEX_PAGE_SIZE = 25
+
+# Retention (manage.py expire_readings): readings older than this many days
+# are archived to SOLIRE_ARCHIVE_DIR and deleted, SOLIRE_RETENTION_BATCH_SIZE
+# rows at a time; None keeps every reading. The rollups are never deleted.
+
+SOLIRE_RETENTION_DAYS = None
+
+SOLIRE_ARCHIVE_DIR = BASE_DIR / 'archives'
+
+SOLIRE_RETENTION_BATCH_SIZE = 2000
+
+# Per-request metrics (latency, database queries and time, time in the fuzzy
+# system) by view, served in the Prometheus format at /metrics. Off by
+# default, as timing every query costs short requests a noticeable share of
+# their latency. With SOLIRE_METRICS_SERVER_TIMING each response also
+# carries them in a Server-Timing header.
+
+SOLIRE_METRICS_ENABLED = False
+
+SOLIRE_METRICS_SERVER_TIMING = DEBUG
@@ -0,0 +1,170 @@
+import functools
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .models import DatasetVersion
+
+
+def _bump_data_version():
+    if DatasetVersion.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            DatasetVersion.objects.create(pk=1, version=1)
+    except IntegrityError:
+        # Another writer created the row in the meantime
+        DatasetVersion.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def bump_data_version():
+    """
+    Mark the stored readings as changed; call it in the transaction that changes them
+
+    SQLite runs one write transaction at a time anyway, so there the version
+    is bumped right away, in that transaction. Elsewhere it is bumped in a
+    statement of its own once the transaction commits: updating the single
+    DatasetVersion row inside every ingest transaction would hold its row
+    lock until the commit and so serialize all concurrent writers. Readers
+    never see the new version before the new rows; at worst a response with
+    them is cached under the old version, which is dropped with it.
+    """
+
+    if connection.vendor == 'sqlite':
+        _bump_data_version()
+    else:
+        transaction.on_commit(_bump_data_version, robust=True)
+
+
+def data_version(request):
+    """The current DatasetVersion, read once per request"""
+
+    if not hasattr(request, '_solire_data_version'):
+        request._solire_data_version, _ = DatasetVersion.objects.get_or_create(pk=1)
+    return request._solire_data_version
+
+
+def data_etag(request, *args, **kwargs):
+    """ETag of a response that depends on the stored readings only"""
+
+    return f"data-{data_version(request).version}"
+
+
+def data_last_modified(request, *args, **kwargs):
+    """Last-Modified of the stored readings, for the condition() decorator"""
+
+    updated_at = data_version(request).updated_at
+    # Naive datetimes are local time (USE_TZ is off); condition() expects UTC
+    return updated_at if timezone.is_aware(updated_at) else timezone.make_aware(updated_at)
+
+
+def _without_error_validators(response):
+    """Drop the ETag and Last-Modified condition() set on an error response"""
+
+    # An error is not a representation of the resource, so a client should
+    # not revalidate it as one
+    if response.status_code not in (200, 304):
+        del response['ETag']
+        del response['Last-Modified']
+    return response
+
+
+def data_condition(etag_func=data_etag, last_modified_func=data_last_modified):
+    """
+    condition() for a sync or async view of the stored readings
+
+    Conditional GETs get a 304 while the DatasetVersion (and whatever else
+    etag_func includes) is unchanged. The validators are only sent with
+    successful responses. For an async view the DatasetVersion is read
+    through sync_to_async first, since condition() calls etag_func and
+    last_modified_func synchronously.
+    """
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                await sync_to_async(data_version)(request)
+                return _without_error_validators(await conditional_view(request, *args, **kwargs))
+
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return _without_error_validators(conditional_view(request, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+def _cache_key(request, key_prefix, vary_on):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    extra = vary_on(request) if vary_on is not None else ''
+    return f"solire:{key_prefix}:{data_version(request).version}:{extra}:{path}"
+
+
+def _cacheable(response):
+    return (response.status_code == 200 and not response.streaming
+            and len(response.content) <= settings.SOLIRE_RESPONSE_CACHE_MAX_BYTES)
+
+
+def cached_response(key_prefix, vary_on=None):
+    """
+    Keep the serialized responses of a sync or async GET view in Django's cache
+
+    The key holds the DatasetVersion (and vary_on(request), e.g. the rule
+    set version), so every write invalidates what is cached. Only 200
+    responses up to SOLIRE_RESPONSE_CACHE_MAX_BYTES are stored, for
+    SOLIRE_RESPONSE_CACHE_TIMEOUT seconds; a timeout of None disables it.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if settings.SOLIRE_RESPONSE_CACHE_TIMEOUT is None:
+                    return await view(request, *args, **kwargs)
+
+                key = await sync_to_async(_cache_key)(request, key_prefix, vary_on)
+                cached = await cache.aget(key)
+                if cached is not None:
+                    content, content_type = cached
+                    return HttpResponse(content, content_type=content_type)
+
+                response = await view(request, *args, **kwargs)
+                if _cacheable(response):
+                    await cache.aset(key, (response.content, response['Content-Type']),
+                                     settings.SOLIRE_RESPONSE_CACHE_TIMEOUT)
+                return response
+
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.SOLIRE_RESPONSE_CACHE_TIMEOUT is None:
+                return view(request, *args, **kwargs)
+
+            key = _cache_key(request, key_prefix, vary_on)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            response = view(request, *args, **kwargs)
+            if _cacheable(response):
+                cache.set(key, (response.content, response['Content-Type']), settings.SOLIRE_RESPONSE_CACHE_TIMEOUT)
+            return response
+
+        return wrapper
+
+    return decorator
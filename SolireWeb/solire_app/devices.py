@@ -0,0 +1,35 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import DeviceLatestReading
+
+
+def update_latest_readings(soil_conditions):
+    """
+    Make the newest of some just stored SoilConditions the latest reading of their device
+
+    One conditional UPDATE per device, which only replaces an older reading
+    (by timestamps, then id), so writers racing each other keep the newest
+    one; a device seen for the first time gets its row created. Call it in
+    the transaction that stores the readings, so both are committed together.
+    """
+
+    newest = {}
+    for sc in soil_conditions:
+        current = newest.get(sc.device_id)
+        if current is None or (sc.timestamps, sc.id) > (current.timestamps, current.id):
+            newest[sc.device_id] = sc
+
+    for device_id, sc in newest.items():
+        older = DeviceLatestReading.objects.filter(device_id=device_id).filter(
+            Q(timestamps__lt=sc.timestamps) | Q(timestamps=sc.timestamps, soil_condition_id__lt=sc.id)
+        )
+        if older.update(soil_condition=sc, timestamps=sc.timestamps):
+            continue
+        try:
+            with transaction.atomic():
+                DeviceLatestReading.objects.create(device_id=device_id, soil_condition=sc, timestamps=sc.timestamps)
+        except IntegrityError:
+            # The device has a row already: another writer created it in the
+            # meantime, or it holds a newer reading
+            older.update(soil_condition=sc, timestamps=sc.timestamps)
@@ -0,0 +1,170 @@
+import itertools
+
+from django.db import connection
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+# Values of the export format option
+EXPORT_FORMATS = ('parquet', 'arrow')
+
+CONTENT_TYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+FILE_EXTENSIONS = {
+    'parquet': 'parquet',
+    'arrow': 'arrows',
+}
+
+# SoilCondition columns of an export, in order
+EXPORT_FIELDS = ('id', 'device_id', 'ph_value', 'temperature_value', 'moisture_value', 'timestamps')
+
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError("Arrow and Parquet exports need pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+def export_schema(plant_names=()):
+    """Arrow schema of an export, with a score column per plant when plant_names are given"""
+
+    pa = _pyarrow()
+    return pa.schema(
+        [
+            ('id', pa.int64()),
+            ('device_id', pa.string()),
+            ('ph_value', pa.float64()),
+            ('temperature_value', pa.float64()),
+            ('moisture_value', pa.int32()),
+            ('timestamps', pa.timestamp('us')),
+        ]
+        + [(f'score_{plant}', pa.float32()) for plant in plant_names]
+    )
+
+
+def _valid_readings(ph, temperature, moisture):
+    """Mask of the readings the fuzzy system scores, see recommendations.invalid_reasons()"""
+
+    return (ph > 0) & (ph <= 14) & (temperature > 0) & (temperature <= 50) & (moisture > 0) & (moisture <= 100)
+
+
+def record_batches(soil_conditions, fuzzy_system=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield a SoilCondition queryset as Arrow record batches of chunk_size rows
+
+    The rows are read a chunk at a time from one database cursor, as
+    tuples, and each chunk becomes one batch, so memory holds a chunk
+    whatever the number of rows. With a fuzzy_system every batch also gets
+    the suitability score of each plant, computed for the whole chunk in
+    one vectorized pass (null for readings the system cannot score).
+    """
+
+    # Imported here, like pyarrow, so importing the views does not load numpy
+    import numpy as np
+
+    pa = _pyarrow()
+    plant_names = fuzzy_system.vectorized_engine.plant_names if fuzzy_system is not None else []
+    schema = export_schema(plant_names)
+
+    # SQLite stores datetimes as text, which Arrow parses far faster than
+    # Django's converters would
+    columns = [
+        Cast('timestamps', CharField()) if field == 'timestamps' and connection.vendor == 'sqlite' else field
+        for field in EXPORT_FIELDS
+    ]
+    rows = soil_conditions.values_list(*columns).iterator(chunk_size=chunk_size)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        values = list(zip(*chunk))
+        arrays = [pa.array(column, type=schema.field(index).type) for index, column in enumerate(values[:-1])]
+        timestamps = pa.array(values[-1])
+        arrays.append(timestamps.cast(pa.timestamp('us')))
+
+        if plant_names:
+            ph, temperature, moisture = (np.asarray(values[index], dtype=float) for index in (2, 3, 4))
+            valid = _valid_readings(ph, temperature, moisture)
+            scores = np.full((len(chunk), len(plant_names)), np.nan, dtype=np.float32)
+            if valid.any():
+                _, valid_scores = fuzzy_system.score_plants_batch(ph[valid], temperature[valid], moisture[valid])
+                scores[valid] = valid_scores
+            arrays.extend(pa.array(scores[:, index], from_pandas=True) for index in range(len(plant_names)))
+
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _writer(sink, export_format, schema):
+    pa = _pyarrow()
+    if export_format == 'parquet':
+        return pa.parquet.ParquetWriter(sink, schema, compression='zstd')
+    return pa.ipc.new_stream(sink, schema)
+
+
+def write_export(soil_conditions, sink, export_format='parquet', fuzzy_system=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write a SoilCondition queryset to a file as Parquet or an Arrow IPC stream
+
+    Parameters:
+    soil_conditions (QuerySet): Readings to export, in the order to write them
+    sink (str or file-like): Path or binary file to write to
+    export_format (str): 'parquet' (one row group per chunk, zstd
+        compressed) or 'arrow' (an IPC stream, pyarrow.ipc.open_stream())
+    fuzzy_system: PlantRecommendationFuzzySystem to add the plant scores with, or None
+    chunk_size (int): Rows read and written at a time
+
+    Returns:
+    int: Number of rows written
+    """
+
+    plant_names = fuzzy_system.vectorized_engine.plant_names if fuzzy_system is not None else []
+    written = 0
+    with _writer(sink, export_format, export_schema(plant_names)) as writer:
+        for batch in record_batches(soil_conditions, fuzzy_system, chunk_size):
+            writer.write_batch(batch)
+            written += batch.num_rows
+    return written
+
+
+class _Chunks:
+    """Write-only binary file keeping what was written until it is taken, to stream a writer's output"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_export(soil_conditions, export_format='parquet', fuzzy_system=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield an export as bytes while it is written, one chunk of rows at a time, see write_export()"""
+
+    plant_names = fuzzy_system.vectorized_engine.plant_names if fuzzy_system is not None else []
+    sink = _Chunks()
+    with _writer(sink, export_format, export_schema(plant_names)) as writer:
+        for batch in record_batches(soil_conditions, fuzzy_system, chunk_size):
+            writer.write_batch(batch)
+            yield sink.take()
+    yield sink.take()
@@ -0,0 +1,65 @@
+import datetime
+
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import SoilCondition
+
+# Value range query parameters and the lookups they filter on
+RANGE_FILTERS = {
+    'min_ph': 'ph_value__gte',
+    'max_ph': 'ph_value__lte',
+    'min_temperature': 'temperature_value__gte',
+    'max_temperature': 'temperature_value__lte',
+    'min_moisture': 'moisture_value__gte',
+    'max_moisture': 'moisture_value__lte',
+}
+
+
+def parse_timestamp(name, value):
+    """ISO 8601 datetime (or date, meaning midnight) of a query parameter"""
+
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            parsed_date = parse_date(value)
+            if parsed_date is not None:
+                parsed = datetime.datetime.combine(parsed_date, datetime.time())
+    except ValueError:
+        parsed = None
+
+    if parsed is None:
+        raise ValueError(f"{name} must be an ISO 8601 date or datetime")
+    return parsed
+
+
+def filtered_soil_conditions(params):
+    """
+    SoilConditions matching the filter query parameters
+
+    device: readings of this device_id only
+    since / until (ISO 8601): timestamps range, since inclusive, until exclusive
+    min_ph, max_ph, min_temperature, ... (numbers): inclusive value ranges
+
+    Raises ValueError for malformed values.
+    """
+
+    soil_conditions = SoilCondition.objects.all()
+
+    # With (device_id, timestamps, id) indexed, a device's pages are read
+    # from the index like the unfiltered ones
+    if params.get('device'):
+        soil_conditions = soil_conditions.filter(device_id=params['device'])
+
+    for name, lookup in (('since', 'timestamps__gte'), ('until', 'timestamps__lt')):
+        if params.get(name):
+            soil_conditions = soil_conditions.filter(**{lookup: parse_timestamp(name, params[name])})
+
+    for name, lookup in RANGE_FILTERS.items():
+        if params.get(name):
+            try:
+                value = float(params[name])
+            except ValueError:
+                raise ValueError(f"{name} must be a number") from None
+            soil_conditions = soil_conditions.filter(**{lookup: value})
+
+    return soil_conditions
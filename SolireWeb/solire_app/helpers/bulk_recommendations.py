@@ -0,0 +1,152 @@
+import itertools
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .fuzzy_logic import PlantRecommendationFuzzySystem
+
+# The fuzzy system of the current worker process, see _init_worker()
+_worker_system = None
+
+
+def _build_system(compiled_path, defuzzifier, lookup_dir, lookup_steps):
+    fuzzy_system = PlantRecommendationFuzzySystem(compiled_path, defuzzifier)
+    if lookup_dir is not None:
+        fuzzy_system.enable_lookup_table(lookup_dir, lookup_steps)
+    return fuzzy_system
+
+
+def _init_worker(compiled_path, defuzzifier, lookup_dir, lookup_steps):
+    """Build one PlantRecommendationFuzzySystem per worker process"""
+
+    global _worker_system
+    _worker_system = _build_system(compiled_path, defuzzifier, lookup_dir, lookup_steps)
+
+
+def _recommend_chunk(readings, fuzzy_system=None):
+    """(Seconds spent scoring, recommendation dicts) for a list of (ph, temperature, humidity) readings"""
+
+    if not readings:
+        return 0.0, []
+    started = time.perf_counter()
+    ph_values, temp_values, humidity_values = zip(*readings)
+    recommendations = (fuzzy_system or _worker_system).get_plant_recommendation_batch(
+        ph_values, temp_values, humidity_values
+    )
+    return time.perf_counter() - started, recommendations
+
+
+class BulkRecommendationRunner:
+    """
+    Score large numbers of readings across a pool of worker processes
+
+    Items are read lazily in chunks, each chunk is scored in a worker with its
+    own PlantRecommendationFuzzySystem, and results are yielded in input order.
+    At most max_pending chunks are in flight at a time, so memory stays
+    bounded however many rows (e.g. a whole SoilCondition history) go in.
+
+    Parameters:
+    workers (int): Worker processes, defaults to os.cpu_count(). 0 scores in
+        the calling process without a pool (useful for small jobs and tests)
+    chunk_size (int): Readings sent to a worker per task
+    max_pending (int): Chunks in flight at once, defaults to 2 per worker
+    compiled_path (str or Path): Compiled rule base the workers load, see
+        PlantRecommendationFuzzySystem(compiled_path=...)
+    defuzzifier (str): Defuzzification method of the workers' systems
+    lookup_dir, lookup_steps: Enable the lookup table in every worker, see
+        PlantRecommendationFuzzySystem.enable_lookup_table()
+    timer (callable): Called in the consuming thread with
+        ('get_plant_recommendation_batch', seconds) for every chunk, the time
+        a worker spent scoring it, like PlantRecommendationFuzzySystem.set_timer()
+
+    Use it as a context manager, or call close() when done:
+
+        with BulkRecommendationRunner(workers=4) as runner:
+            for sc, recommendation in runner.recommendations(rows, reading=...):
+                ...
+    """
+
+    def __init__(self, workers=None, chunk_size=1000, max_pending=None, compiled_path=None,
+                 defuzzifier='centroid', lookup_dir=None, lookup_steps=None, timer=None):
+        if chunk_size <= 0:
+            raise ValueError("Chunk size must be a positive integer")
+
+        self.workers = os.cpu_count() if workers is None else workers
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending or 2 * max(self.workers, 1)
+        self._initargs = (compiled_path, defuzzifier, lookup_dir, lookup_steps)
+        self.timer = timer
+        self._executor = None
+        self._inline_system = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _submit(self, readings):
+        if self.workers == 0:
+            # Score inline; the first call builds the in-process system
+            if self._inline_system is None:
+                self._inline_system = _build_system(*self._initargs)
+            return _recommend_chunk(readings, self._inline_system)
+
+        if self._executor is None:
+            # spawn rather than fork: the caller may be a threaded web server,
+            # and workers only need the fuzzy helpers, not Django
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=self._initargs,
+            )
+        return self._executor.submit(_recommend_chunk, readings)
+
+    def recommendations(self, items, reading=None):
+        """
+        Yield (item, recommendation) for every item, in input order
+
+        Parameters:
+        items (iterable): Anything, e.g. a QuerySet.iterator() of SoilCondition
+        reading (callable): Maps an item to its (ph, temperature, humidity)
+            reading, or to None to skip scoring it (its recommendation is then
+            None). By default every item is such a tuple itself.
+
+        Only the readings are sent to the workers; the items stay here.
+        """
+
+        if reading is None:
+            reading = tuple
+
+        items = iter(items)
+        pending = deque()
+        while True:
+            # Keep the pool busy up to max_pending chunks ahead of the consumer
+            while len(pending) < self.max_pending:
+                chunk = list(itertools.islice(items, self.chunk_size))
+                if not chunk:
+                    break
+                readings = [reading(item) for item in chunk]
+                scored = [values for values in readings if values is not None]
+                pending.append((chunk, readings, self._submit(scored)))
+
+            if not pending:
+                return
+
+            chunk, readings, result = pending.popleft()
+            seconds, recommendations = result if self.workers == 0 else result.result()
+            if self.timer is not None:
+                self.timer('get_plant_recommendation_batch', seconds)
+            scored = iter(recommendations)
+            for item, values in zip(chunk, readings):
+                yield item, (None if values is None else next(scored))
+
+    def close(self):
+        """Shut the worker processes down"""
+
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+# Decimal places kept per input when building cache keys. Sensors report pH
+# to about 0.01, temperature to about 0.1°C and moisture in whole percents.
+DEFAULT_CACHE_PRECISION = {'ph': 2, 'temperature': 1, 'humidity': 0}
+
+
+class RecommendationCache:
+    """
+    Bounded LRU cache of plant scores keyed on quantized sensor inputs
+
+    Values are stored as tuples of (plant, score) pairs, so nothing handed
+    out of the cache can be mutated by a caller.
+    """
+
+    def __init__(self, maxsize=1024, precision=None):
+        if maxsize <= 0:
+            raise ValueError("Cache size must be a positive integer")
+
+        self.maxsize = maxsize
+        self.precision = dict(DEFAULT_CACHE_PRECISION if precision is None else precision)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def quantize(self, ph_value, temp_value, humidity_value):
+        """Round the inputs to the configured precision, this is the cache key"""
+
+        return (
+            round(float(ph_value), self.precision['ph']),
+            round(float(temp_value), self.precision['temperature']),
+            round(float(humidity_value), self.precision['humidity']),
+        )
+
+    def get(self, key):
+        """Cached scores for a quantized key, or None on a miss"""
+
+        with self._lock:
+            try:
+                scores = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return scores
+
+    def put(self, key, scores):
+        """Store scores (a mapping or pairs of plant -> score) for a quantized key"""
+
+        scores = tuple(dict(scores).items())
+        with self._lock:
+            self._entries[key] = scores
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the fuzzy configuration changed"""
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit, miss and eviction counters plus the current fill level"""
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
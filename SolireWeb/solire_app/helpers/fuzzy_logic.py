@@ -1,16 +1,56 @@
+import functools
+import hashlib
+import importlib.metadata
+import inspect
+import operator
+import os
+import tempfile
+import time
+from pathlib import Path
+
 import numpy as np
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
+# skfuzzy (and the scipy / networkx stack behind it) is imported only when the
+# control systems are actually built, see setup_fuzzy_system()
+
+from .fuzzy_cache import RecommendationCache
+from .fuzzy_lookup import RecommendationLookupTable
+from .fuzzy_vectorized import VectorizedMamdaniEngine
 # No need for matplotlib in the Django integration for actual recommendations
 # import matplotlib.pyplot as plt
 
+
+def _timed(method):
+    """Report the duration of each call of a method to the system's timer, see set_timer()"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        timer = self.timer
+        if timer is None:
+            return method(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            timer(method.__name__, time.perf_counter() - started)
+
+    return wrapper
+
+
 class PlantRecommendationFuzzySystem:
     """
     Mamdani Fuzzy Logic System for Plant Recommendation
     Based on pH, Temperature, and Humidity measurements
     """
 
-    def __init__(self):
+    # skfuzzy variables, built lazily when the system was loaded from a
+    # compiled rule base
+    _SKFUZZY_VARIABLES = {'ph', 'temperature', 'humidity', 'plant_outputs'}
+
+    # skfuzzy rules and simulators, only built on first access: recommendations
+    # come from the vectorized engine and never need them
+    _SKFUZZY_CONTROL_SYSTEMS = {'rule_sets', 'control_systems', 'simulators'}
+
+    def __init__(self, compiled_path=None, defuzzifier='centroid'):
         # Plant database from Table 2.2 "Tanaman Pangan"
         self.plant_database = {
             'Padi': {'ph': (6.0, 7.0), 'temp': (24, 29), 'humidity': (60, 90)},
@@ -22,11 +62,131 @@ class PlantRecommendationFuzzySystem:
             'Ubi_Jalar': {'ph': (5.5, 8.0), 'temp': (21, 27), 'humidity': (65, 75)}
         }
 
-        self.setup_fuzzy_system()
+        # Fuzzy rules per crop, based on the plant requirements from Table 2.2.
+        # Each rule is (clauses, output term): the clauses are AND-ed together
+        # and each clause lists input terms that are OR-ed together. Adding a
+        # crop only takes a new entry here (and in plant_database).
+        self.crop_rules = {
+            # Padi (pH: 6.0-7.0, Temp: 24-29°C, Humidity: 60-90%)
+            'Padi': [
+                ([['ph.neutral'], ['temperature.normal'], ['humidity.medium', 'humidity.high']], 'suitable'),
+                ([['ph.acidic'], ['temperature.normal']], 'moderate'),
+                ([['ph.alkaline', 'temperature.cold', 'temperature.hot', 'humidity.low']], 'unsuitable'),
+            ],
+            # Jagung (pH: 5.8-8.0, Temp: 21-34°C, Humidity: 50-80%)
+            'Jagung': [
+                ([['ph.acidic', 'ph.neutral'], ['temperature.normal'], ['humidity.medium']], 'suitable'),
+                ([['ph.alkaline', 'temperature.cold', 'temperature.hot', 'humidity.low', 'humidity.high']],
+                 'unsuitable'),
+            ],
+            # Kedelai (pH: 6.0-7.0, Temp: 20-25°C, Humidity: 60-80%)
+            'Kedelai': [
+                ([['ph.neutral'], ['temperature.cold', 'temperature.normal'], ['humidity.medium']], 'suitable'),
+                ([['ph.acidic'], ['humidity.medium']], 'moderate'),
+                ([['ph.alkaline', 'temperature.hot', 'humidity.low', 'humidity.high']], 'unsuitable'),
+            ],
+            # Kacang Tanah (pH: 5.8-7.0, Temp: 23-33°C, Humidity: 65-75%)
+            'Kacang_Tanah': [
+                ([['ph.neutral'], ['temperature.normal'], ['humidity.medium']], 'suitable'),
+                ([['ph.acidic'], ['temperature.normal']], 'moderate'),
+                ([['ph.alkaline', 'temperature.cold', 'temperature.hot', 'humidity.low', 'humidity.high']],
+                 'unsuitable'),
+            ],
+            # Kacang Hijau (pH: 6.0-7.0, Temp: 25-35°C, Humidity: 50-80%)
+            'Kacang_Hijau': [
+                ([['ph.neutral'], ['temperature.cold', 'temperature.normal'], ['humidity.low', 'humidity.medium']],
+                 'suitable'),
+                ([['ph.acidic'], ['temperature.normal']], 'moderate'),
+                ([['ph.alkaline', 'temperature.hot', 'humidity.high']], 'unsuitable'),
+            ],
+            # Ubi Kayu (pH: 4.5-8.0, Temp: 24-30°C, Humidity: 70-85%)
+            'Ubi_Kayu': [
+                ([['ph.acidic', 'ph.neutral', 'ph.alkaline'], ['temperature.normal'],
+                  ['humidity.low', 'humidity.medium']], 'suitable'),
+                ([['temperature.cold', 'temperature.hot', 'humidity.high']], 'unsuitable'),
+            ],
+            # Ubi Jalar (pH: 5.5-8.0, Temp: 21-27°C, Humidity: 65-80%)
+            'Ubi_Jalar': [
+                ([['ph.neutral', 'ph.alkaline'], ['temperature.cold', 'temperature.normal'], ['humidity.medium']],
+                 'suitable'),
+                ([['ph.acidic', 'temperature.hot', 'humidity.low', 'humidity.high']], 'unsuitable'),
+            ],
+        }
+
+        # 'centroid' matches skfuzzy's sampled centroid, 'analytic' computes
+        # the exact centroid of the output sets (fuzzy_vectorized.DEFUZZIFIERS)
+        self.defuzzifier = defuzzifier
+
+        # Optional precomputed score grid, see enable_lookup_table()
+        self.lookup_table = None
+
+        # Optional LRU cache of recent recommendations, see enable_cache()
+        self.cache = None
+
+        # Optional callback timing the recommendations, see set_timer()
+        self.timer = None
+
+        # Load the precompiled rule base if it was built from this exact code,
+        # otherwise build the skfuzzy control systems and refresh the file
+        self.compiled_path = compiled_path
+        if compiled_path is None or not self.load_compiled(compiled_path):
+            self.setup_fuzzy_system()
+            if compiled_path is not None:
+                try:
+                    self.save_compiled(compiled_path)
+                except OSError:
+                    # e.g. a read-only deployment, which simply builds at startup
+                    pass
+
+    def __getattr__(self, name):
+        # Only called for attributes that do not exist yet: the skfuzzy
+        # objects are built on first access
+        if 'vectorized_engine' in self.__dict__:
+            if name in self._SKFUZZY_VARIABLES:
+                self._setup_fuzzy_variables()
+                return self.__dict__[name]
+            if name in self._SKFUZZY_CONTROL_SYSTEMS:
+                self._create_control_systems()
+                return self.__dict__[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
     def setup_fuzzy_system(self):
         """Initialize the complete Mamdani fuzzy logic system"""
 
+        # Define input and output variables with their membership functions
+        self._setup_fuzzy_variables()
+
+        # Compile the crop rule table into one vectorized engine for all plants
+        inputs = {'ph': self.ph, 'temperature': self.temperature, 'humidity': self.humidity}
+        self.vectorized_engine = VectorizedMamdaniEngine(
+            {label: (variable.universe, {term_label: term.mf for term_label, term in variable.terms.items()})
+             for label, variable in inputs.items()},
+            self.crop_rules,
+            {plant_name: (output.universe, {term_label: term.mf for term_label, term in output.terms.items()})
+             for plant_name, output in self.plant_outputs.items()},
+            defuzzifier=self.defuzzifier,
+        )
+
+        # skfuzzy rules and simulators of a previous configuration are stale
+        for name in self._SKFUZZY_CONTROL_SYSTEMS:
+            self.__dict__.pop(name, None)
+
+        # Identifies this exact configuration, e.g. for versioned lookup tables
+        self.fingerprint = self._compute_fingerprint()
+
+        # Re-open (and rebuild if needed) the lookup table for the new configuration
+        if self.lookup_table is not None:
+            self.enable_lookup_table(self.lookup_table.directory, self.lookup_table.steps)
+
+        # Cached scores belong to the previous configuration
+        if self.cache is not None:
+            self.cache.clear()
+
+    def _setup_fuzzy_variables(self):
+        """Define the skfuzzy input and output variables and their membership functions"""
+
+        from skfuzzy import control as ctrl
+
         # Define input variables with their universes
         self.ph = ctrl.Antecedent(np.arange(0, 14.1, 0.1), 'ph')
         self.temperature = ctrl.Antecedent(np.arange(0, 50.1, 0.1), 'temperature')
@@ -34,22 +194,157 @@ class PlantRecommendationFuzzySystem:
 
         # Define output variables for each plant
         self.plant_outputs = {}
-        for plant in self.plant_database.keys():
+        for plant in self.crop_rules.keys():
             self.plant_outputs[plant] = ctrl.Consequent(np.arange(0, 1.01, 0.01), plant.lower())
 
         # Setup membership functions
         self._setup_input_membership_functions()
         self._setup_output_membership_functions()
 
-        # Setup fuzzy rules
-        self._setup_fuzzy_rules()
+    def _compute_fingerprint(self):
+        """Short hash of the plant database, membership functions and rule sets"""
+
+        digest = hashlib.sha256()
+        digest.update(repr(sorted(self.plant_database.items())).encode())
+        self.vectorized_engine.update_digest(digest)
+        return digest.hexdigest()[:16]
+
+    @property
+    def rule_set_version(self):
+        """
+        Identifies the scores this system produces, e.g. to tag stored recommendations
+
+        The fingerprint of the rule base, plus the grid spacing when scores are
+        interpolated from a lookup table.
+        """
+
+        if self.lookup_table is None:
+            return self.fingerprint
+        steps = '-'.join(f"{self.lookup_table.steps[label]:g}" for label in self.lookup_table.INPUTS)
+        return f"{self.fingerprint}-lookup-{steps}"
+
+    def _compiled_source_key(self):
+        """Identifies the code and library versions a compiled rule base comes from"""
+
+        digest = hashlib.sha256()
+        module_files = {inspect.getfile(cls) for cls in type(self).__mro__ if cls is not object}
+        module_files.add(inspect.getfile(VectorizedMamdaniEngine))
+        for module_file in sorted(module_files):
+            digest.update(Path(module_file).read_bytes())
+        digest.update(repr(sorted(self.plant_database.items())).encode())
+        digest.update(repr(sorted(self.crop_rules.items())).encode())
+        for distribution in ('numpy', 'scikit-fuzzy'):
+            try:
+                digest.update(importlib.metadata.version(distribution).encode())
+            except importlib.metadata.PackageNotFoundError:
+                pass
+        return digest.hexdigest()
+
+    def save_compiled(self, path):
+        """
+        Save the compiled rule base (membership arrays and crop rules)
+
+        A later PlantRecommendationFuzzySystem(compiled_path=path) loads it with
+        NumPy alone instead of importing skfuzzy and building the membership
+        functions, as long as this module, the plant database, the crop rules
+        and the library versions are unchanged.
+        """
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.npz.tmp')
+        os.close(fd)
+        try:
+            self.vectorized_engine.save(tmp_path, source_key=self._compiled_source_key())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load_compiled(self, path):
+        """Use a rule base written by save_compiled(); False if missing or stale"""
+
+        try:
+            engine, metadata = VectorizedMamdaniEngine.load(path, defuzzifier=self.defuzzifier)
+        except Exception:
+            # Missing, truncated or foreign file: build from scratch instead
+            return False
+
+        if metadata.get('source_key') != self._compiled_source_key():
+            return False
+
+        self.vectorized_engine = engine
+        self.fingerprint = self._compute_fingerprint()
+        return True
+
+    def enable_lookup_table(self, directory, steps=None):
+        """
+        Answer queries from a precomputed, memory-mapped score grid
+
+        Parameters:
+        directory (str or Path): Where the versioned .npy tables are stored
+        steps (dict): Grid spacing per input ('ph', 'temperature', 'humidity'),
+            defaults to fuzzy_lookup.DEFAULT_LOOKUP_STEPS
+
+        The table is built on first use and rebuilt whenever the fingerprint
+        of the plant database, membership functions or rule sets changes.
+        """
+
+        self.lookup_table = RecommendationLookupTable(self, directory, steps).load()
+        if self.cache is not None:
+            self.cache.clear()
+        return self.lookup_table
+
+    def disable_lookup_table(self):
+        """Go back to evaluating the fuzzy rules for every query"""
+
+        self.lookup_table = None
+        if self.cache is not None:
+            self.cache.clear()
+
+    def enable_cache(self, maxsize=1024, precision=None):
+        """
+        Cache get_plant_recommendation results for recently seen inputs
+
+        Parameters:
+        maxsize (int): Number of distinct rounded inputs kept (LRU eviction)
+        precision (dict): Decimal places per input ('ph', 'temperature',
+            'humidity'), defaults to fuzzy_cache.DEFAULT_CACHE_PRECISION
+
+        Inputs are rounded to the given precision before scoring, so readings
+        that only differ below it get identical scores. Only
+        get_plant_recommendation goes through the cache: the batch methods
+        score the exact inputs, so for the same reading the two can differ
+        by the effect of the rounding. Hit, miss and eviction counters are
+        available through self.cache.stats().
+        """
 
-        # Create control systems for each plant
-        self._create_control_systems()
+        self.cache = RecommendationCache(maxsize, precision)
+        return self.cache
+
+    def disable_cache(self):
+        """Score every get_plant_recommendation call from scratch again"""
+
+        self.cache = None
+
+    def set_timer(self, timer):
+        """
+        Time every get_plant_recommendation and get_plant_recommendation_batch call
+
+        Parameters:
+        timer (callable): Called with (method name, seconds) after each
+            call, e.g. to attribute the time to the current request; None
+            stops the timing
+        """
+
+        self.timer = timer
 
     def _setup_input_membership_functions(self):
         """Define membership functions for input variables"""
 
+        import skfuzzy as fuzz
+
         # pH membership functions
         self.ph['acidic'] = fuzz.trapmf(self.ph.universe, [0, 0, 5, 6.5])
         self.ph['neutral'] = fuzz.trimf(self.ph.universe, [5.5, 6.5, 7.5])
@@ -82,87 +377,45 @@ class PlantRecommendationFuzzySystem:
     def _setup_output_membership_functions(self):
         """Define membership functions for output variables (plant suitability)"""
 
+        import skfuzzy as fuzz
+
         for plant_name, plant_output in self.plant_outputs.items():
             plant_output['unsuitable'] = fuzz.trimf(plant_output.universe, [0, 0, 0.4])
             plant_output['moderate'] = fuzz.trimf(plant_output.universe, [0.2, 0.6, 0.8])
             plant_output['suitable'] = fuzz.trimf(plant_output.universe, [0.7, 1.0, 1.0])
 
     def _setup_fuzzy_rules(self):
-        """Define fuzzy rules based on plant requirements from Table 2.2"""
+        """Build skfuzzy rules from the crop rule table (self.crop_rules)"""
 
-        self.rule_sets = {}
+        from skfuzzy import control as ctrl
+
+        inputs = {'ph': self.ph, 'temperature': self.temperature, 'humidity': self.humidity}
 
-        # Rules for Padi (pH: 6.0-7.0, Temp: 24-29°C, Humidity: 60-90%)
-        self.rule_sets['Padi'] = [
-            ctrl.Rule(
-                self.ph['neutral'] & self.temperature['normal'] & (self.humidity['medium'] | self.humidity['high']),
-                self.plant_outputs['Padi']['suitable']),
-            ctrl.Rule(self.ph['acidic'] & self.temperature['normal'], self.plant_outputs['Padi']['moderate']),
-            ctrl.Rule(self.ph['alkaline'] | self.temperature['cold'] | self.temperature['hot'] | self.humidity['low'],
-                      self.plant_outputs['Padi']['unsuitable'])
-        ]
-
-        # Rules for Jagung (pH: 5.8-8.0, Temp: 21-34°C, Humidity: 50-80%)
-        self.rule_sets['Jagung'] = [
-            ctrl.Rule((self.ph['acidic'] | self.ph['neutral']) & self.temperature['normal'] & self.humidity['medium'],
-                      self.plant_outputs['Jagung']['suitable']),
-            ctrl.Rule(self.ph['alkaline'] | self.temperature['cold'] | self.temperature['hot'] | self.humidity['low'] |
-                      self.humidity['high'],
-                      self.plant_outputs['Jagung']['unsuitable'])
-        ]
-
-        # Rules for Kedelai (pH: 6.0-7.0, Temp: 20-25°C, Humidity: 60-80%)
-        self.rule_sets['Kedelai'] = [
-            ctrl.Rule(
-                self.ph['neutral'] & (self.temperature['cold'] | self.temperature['normal']) & self.humidity['medium'],
-                self.plant_outputs['Kedelai']['suitable']),
-            ctrl.Rule(self.ph['acidic'] & self.humidity['medium'], self.plant_outputs['Kedelai']['moderate']),
-            ctrl.Rule(self.ph['alkaline'] | self.temperature['hot'] | self.humidity['low'] | self.humidity['high'],
-                      self.plant_outputs['Kedelai']['unsuitable'])
-        ]
-
-        # Rules for Kacang Tanah (pH: 5.8-7.0, Temp: 23-33°C, Humidity: 65-75%)
-        self.rule_sets['Kacang_Tanah'] = [
-            ctrl.Rule(self.ph['neutral'] & self.temperature['normal'] & self.humidity['medium'],
-                      self.plant_outputs['Kacang_Tanah']['suitable']),
-            ctrl.Rule(self.ph['acidic'] & self.temperature['normal'],
-                      self.plant_outputs['Kacang_Tanah']['moderate']),
-            ctrl.Rule(self.ph['alkaline'] | self.temperature['cold'] | self.temperature['hot'] | self.humidity['low'] |
-                      self.humidity['high'],
-                      self.plant_outputs['Kacang_Tanah']['unsuitable'])
-        ]
-
-        # Rules for Kacang Hijau (pH: 6.0-7.0, Temp: 25-35°C, Humidity: 50-80%)
-        self.rule_sets['Kacang_Hijau'] = [
-            ctrl.Rule(self.ph['neutral'] & (self.temperature['cold'] | self.temperature['normal']) & (
-                        self.humidity['low'] | self.humidity['medium']),
-                      self.plant_outputs['Kacang_Hijau']['suitable']),
-            ctrl.Rule(self.ph['acidic'] & self.temperature['normal'], self.plant_outputs['Kacang_Hijau']['moderate']),
-            ctrl.Rule(self.ph['alkaline'] | self.temperature['hot'] | self.humidity['high'],
-                      self.plant_outputs['Kacang_Hijau']['unsuitable'])
-        ]
-
-        # Rules for Ubi Kayu (pH: 4.5-8.0, Temp: 24-30°C, Humidity: 70-85%)
-        self.rule_sets['Ubi_Kayu'] = [
-            ctrl.Rule((self.ph['acidic'] | self.ph['neutral'] | self.ph['alkaline']) & self.temperature['normal'] & (
-                        self.humidity['low'] | self.humidity['medium']),
-                      self.plant_outputs['Ubi_Kayu']['suitable']),
-            ctrl.Rule(self.temperature['cold'] | self.temperature['hot'] | self.humidity['high'],
-                      self.plant_outputs['Ubi_Kayu']['unsuitable'])
-        ]
-
-        # Rules for Ubi Jalar (pH: 5.5-8.0, Temp: 21-27°C, Humidity: 65-80%)
-        self.rule_sets['Ubi_Jalar'] = [
-            ctrl.Rule(
-                (self.ph['neutral'] | self.ph['alkaline']) & (self.temperature['cold'] | self.temperature['normal']) &
-                self.humidity['medium'],
-                self.plant_outputs['Ubi_Jalar']['suitable']),
-            ctrl.Rule(self.ph['acidic'] | self.temperature['hot'] | self.humidity['low'] | self.humidity['high'],
-                      self.plant_outputs['Ubi_Jalar']['unsuitable'])
-        ]
+        def input_term(name):
+            label, term_label = name.split('.')
+            return inputs[label][term_label]
+
+        self.rule_sets = {}
+        for plant_name, rules in self.crop_rules.items():
+            self.rule_sets[plant_name] = []
+            for clauses, output_term in rules:
+                antecedent = functools.reduce(operator.and_, [
+                    functools.reduce(operator.or_, [input_term(name) for name in clause]) for clause in clauses
+                ])
+                self.rule_sets[plant_name].append(ctrl.Rule(antecedent, self.plant_outputs[plant_name][output_term]))
 
     def _create_control_systems(self):
-        """Create control systems for each plant"""
+        """
+        Create skfuzzy control systems and simulators for each plant
+
+        Recommendations are computed by the vectorized engine; these are kept
+        as the reference implementation, e.g. to cross-check its scores.
+        """
+
+        from skfuzzy import control as ctrl
+
+        self._setup_fuzzy_rules()
+
         self.control_systems = {}
         self.simulators = {}
 
@@ -170,6 +423,7 @@ class PlantRecommendationFuzzySystem:
             self.control_systems[plant_name] = ctrl.ControlSystem(rules)
             self.simulators[plant_name] = ctrl.ControlSystemSimulation(self.control_systems[plant_name])
 
+    @_timed
     def get_plant_recommendation(self, ph_value, temp_value, humidity_value):
         """
         Get plant recommendation based on sensor inputs
@@ -191,31 +445,85 @@ class PlantRecommendationFuzzySystem:
         # if not (0 <= humidity_value <= 100):
         #     raise ValueError("Humidity must be between 0 and 100%")
 
-        results = {}
-
-        # Calculate suitability for each plant
-        for plant_name, simulator in self.simulators.items():
-            try:
-                # Set input values
-                simulator.input['ph'] = float(ph_value)
-                simulator.input['temperature'] = temp_value
-                simulator.input['humidity'] = humidity_value
+        if self.cache is None:
+            sorted_results = self._score_plants(ph_value, temp_value, humidity_value)
+        else:
+            # Readings that round to the same key share one computation, done
+            # on the rounded inputs so the cached scores never depend on which
+            # reading happened to fill the entry
+            key = self.cache.quantize(ph_value, temp_value, humidity_value)
+            cached = self.cache.get(key)
+            if cached is None:
+                sorted_results = self._score_plants(*key)
+                self.cache.put(key, sorted_results)
+            else:
+                sorted_results = dict(cached)
 
-                # Compute the result
-                simulator.compute()
+        return self._format_recommendation(sorted_results, ph_value, temp_value, humidity_value)
 
-                # Get the defuzzified output (suitability score)
-                suitability_score = simulator.output[plant_name.lower()]
-                results[plant_name] = round(suitability_score, 3)
+    def _score_plants(self, ph_value, temp_value, humidity_value):
+        """Rounded suitability score per plant, sorted from best to worst"""
 
-            except Exception as e:
-                # Handle cases where no rules fire
-                results[plant_name] = 0.0
+        # Scores come from the lookup table if enabled, otherwise from the
+        # vectorized engine. Neither keeps state between calls, unlike the
+        # ControlSystemSimulation objects in self.simulators (whose inputs live
+        # on the shared Antecedents), so concurrent requests in a threaded or
+        # ASGI server cannot mix up each other's inputs. The engine's scores
+        # are identical to the simulators' output.
+        plant_names, scores = self.score_plants_batch([float(ph_value)], [temp_value], [humidity_value])
+        results = dict(zip(plant_names, np.round(scores[0], 3).tolist()))
 
         # Sort results by suitability score
         sorted_results = dict(sorted(results.items(), key=lambda x: x[1], reverse=True))
 
-        return self._format_recommendation(sorted_results, ph_value, temp_value, humidity_value)
+        return sorted_results
+
+    def score_plants_batch(self, ph_values, temp_values, humidity_values):
+        """
+        Score every plant for many readings in one vectorized pass
+
+        Parameters:
+        ph_values (array-like): pH values (0-14)
+        temp_values (array-like): Temperatures in Celsius
+        humidity_values (array-like): Humidity percentages (0-100)
+
+        Returns:
+        tuple: (plant names, np.ndarray of raw scores shaped (N, plants))
+
+        With the default 'centroid' defuzzifier, raw scores match the per-row
+        skfuzzy simulators within fuzzy_vectorized.BATCH_TOLERANCE before
+        rounding. With a lookup table enabled the scores are interpolated from
+        the grid instead.
+        """
+
+        if self.lookup_table is not None:
+            return self.lookup_table.plant_names, self.lookup_table.score(ph_values, temp_values, humidity_values)
+
+        scores = self.vectorized_engine.score(ph_values, temp_values, humidity_values)
+        return self.vectorized_engine.plant_names, scores
+
+    @_timed
+    def get_plant_recommendation_batch(self, ph_values, temp_values, humidity_values):
+        """
+        Batch counterpart of get_plant_recommendation
+
+        Returns:
+        list: One recommendation dict per reading, in the same format as
+        get_plant_recommendation
+        """
+
+        plant_names, scores = self.score_plants_batch(ph_values, temp_values, humidity_values)
+
+        recommendations = []
+        inputs = (np.atleast_1d(np.asarray(values)).tolist() for values in (ph_values, temp_values, humidity_values))
+        # np.round (not the builtin) so ties round the same way as the np.float64
+        # scores in get_plant_recommendation
+        for row, ph_value, temp_value, humidity_value in zip(np.round(scores, 3).tolist(), *inputs):
+            results = dict(zip(plant_names, row))
+            sorted_results = dict(sorted(results.items(), key=lambda x: x[1], reverse=True))
+            recommendations.append(self._format_recommendation(sorted_results, ph_value, temp_value, humidity_value))
+
+        return recommendations
 
     def _format_recommendation(self, results, ph_value, temp_value, humidity_value):
         """Format the recommendation output with confidence levels"""
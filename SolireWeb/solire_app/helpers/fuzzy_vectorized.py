@@ -0,0 +1,413 @@
+import itertools
+import json
+
+import numpy as np
+
+# Largest absolute difference allowed between a raw (unrounded) score from
+# the vectorized engine and the one produced by skfuzzy's
+# ControlSystemSimulation for the same reading. Both implement the same
+# Mamdani pipeline with the same upsampled centroid and summation order, so
+# in practice the scores are bit-identical (and so are the rounded
+# suitability_score values); the tolerance leaves room for NumPy versions
+# that interpolate or sort with different floating point rounding.
+BATCH_TOLERANCE = 1e-9
+
+# Defuzzification methods VectorizedMamdaniEngine supports:
+# 'centroid' reproduces skfuzzy's centroid on the sampled output universe,
+# 'analytic' is the exact centroid of the piecewise-linear output sets.
+DEFUZZIFIERS = ('centroid', 'analytic')
+
+
+def _padded(rows, fill):
+    """Ragged lists of indexes as one 2-D index array, short rows padded with fill"""
+
+    width = max((len(row) for row in rows), default=1)
+    matrix = np.full((len(rows), width), fill, dtype=np.intp)
+    for index, row in enumerate(rows):
+        matrix[index, :len(row)] = row
+    return matrix
+
+
+class VectorizedMamdaniEngine:
+    """
+    Array-based Mamdani inference for PlantRecommendationFuzzySystem
+
+    Evaluates the same membership functions and rules as the skfuzzy
+    simulators, but for N readings at once using NumPy operations instead of
+    one ControlSystemSimulation.compute() call per reading and plant.
+
+    The rule base is plain data, compiled into index matrices over the input
+    terms: a clause is the max of its terms, a rule the min of its clauses and
+    an output term the max of the rules that conclude it. Adding a crop adds
+    rows to those matrices, so the cost per reading grows with their size and
+    not with Python work per crop.
+
+    The engine is built from plain data (NumPy arrays, lists and names), so
+    it can be saved with save() and loaded with load() without importing or
+    rebuilding the skfuzzy control systems.
+
+    Parameters:
+    inputs (dict): label -> (universe, {term label: membership array})
+    rules (dict): plant -> [(clauses, output term label)] where the clauses
+        are AND-ed together and each clause is a list of 'input.term' names
+        that are OR-ed together, e.g. ([['ph.neutral'], ['humidity.medium',
+        'humidity.high']], 'suitable')
+    outputs (dict): plant -> (universe, {term label: membership array})
+    defuzzifier (str): One of DEFUZZIFIERS
+    """
+
+    def __init__(self, inputs, rules, outputs, chunk_size=2048, defuzzifier='centroid'):
+        if defuzzifier not in DEFUZZIFIERS:
+            raise ValueError(f"Unknown defuzzifier '{defuzzifier}', expected one of {DEFUZZIFIERS}")
+
+        self.defuzzifier = defuzzifier
+        self.inputs = inputs
+        self.rules = {
+            plant_name: [([list(clause) for clause in clauses], output_term) for clauses, output_term in plant_rules]
+            for plant_name, plant_rules in rules.items()
+        }
+        self.outputs = outputs
+        self.plant_names = list(rules.keys())
+        self.chunk_size = chunk_size
+
+        # Column of every input term in the membership matrix built by _fuzzify()
+        self._input_terms = [
+            (label, term_label) for label, (_, term_mfs) in inputs.items() for term_label in term_mfs
+        ]
+        term_columns = {f'{label}.{term_label}': column for column, (label, term_label) in enumerate(self._input_terms)}
+
+        # Identical clauses (e.g. ['temperature.normal']) are shared between
+        # rules and crops, so each is only evaluated once per reading
+        clauses = {}
+        rule_clauses = []
+        rule_targets = {}
+        for plant_name, plant_rules in self.rules.items():
+            if plant_name not in outputs:
+                raise ValueError(f"No output variable for plant '{plant_name}'")
+            for clause_list, output_term in plant_rules:
+                if not clause_list or not all(clause_list):
+                    raise ValueError(f"Empty rule or clause for plant '{plant_name}'")
+                if output_term not in outputs[plant_name][1]:
+                    raise ValueError(f"Unknown output term '{output_term}' for plant '{plant_name}'")
+                columns = []
+                for clause in clause_list:
+                    try:
+                        key = tuple(sorted({term_columns[name] for name in clause}))
+                    except KeyError as error:
+                        raise ValueError(f"Unknown input term '{error.args[0]}' for plant '{plant_name}'") from None
+                    columns.append(clauses.setdefault(key, len(clauses)))
+                rule_targets.setdefault((plant_name, output_term), []).append(len(rule_clauses))
+                rule_clauses.append(columns)
+
+        # Short rows are padded with an extra column that is 0 for the OR of a
+        # clause, 1 for the AND of a rule and 0 for an output term no rule
+        # concludes, so padding never changes a result
+        self._clause_terms = _padded(list(clauses), fill=len(self._input_terms))
+        self._rule_clauses = _padded(rule_clauses, fill=len(clauses))
+
+        # Plants whose outputs share a universe and term shapes (all of them,
+        # in practice) are defuzzified together in one call
+        groups = {}
+        for column, plant_name in enumerate(self.plant_names):
+            universe, term_mfs = outputs[plant_name]
+            signature = (universe.tobytes(),) + tuple((label, mf.tobytes()) for label, mf in term_mfs.items())
+            groups.setdefault(signature, (universe, term_mfs, []))[2].append(column)
+
+        self._output_groups = []
+        for universe, term_mfs, columns in groups.values():
+            targets = [
+                rule_targets.get((self.plant_names[column], term_label), [])
+                for column in columns for term_label in term_mfs
+            ]
+            target_rules = _padded(targets, fill=len(rule_clauses)).reshape(len(columns), len(term_mfs), -1)
+            self._output_groups.append(
+                (universe, term_mfs, columns, target_rules, self._compile_analytic(universe, term_mfs))
+            )
+
+    def update_digest(self, digest):
+        """Feed every array, rule and name that affects the scores into a hashlib digest"""
+
+        digest.update(self.defuzzifier.encode())
+        for label, (universe, term_mfs) in self.inputs.items():
+            digest.update(label.encode())
+            digest.update(universe.tobytes())
+            for term_label, mf in term_mfs.items():
+                digest.update(term_label.encode())
+                digest.update(mf.tobytes())
+
+        for plant_name in self.plant_names:
+            universe, term_mfs = self.outputs[plant_name]
+            digest.update(plant_name.encode())
+            digest.update(repr(self.rules[plant_name]).encode())
+            digest.update(universe.tobytes())
+            for term_label, mf in term_mfs.items():
+                digest.update(term_label.encode())
+                digest.update(mf.tobytes())
+
+    def save(self, path, **metadata):
+        """
+        Write the compiled rule base to an .npz file
+
+        Arrays are stored as NumPy arrays and the structure as JSON, so
+        loading never unpickles anything. metadata must be JSON serializable.
+        """
+
+        arrays = {}
+        structure = {'inputs': {}, 'rules': self.rules, 'outputs': {}, 'metadata': metadata}
+
+        for label, (universe, term_mfs) in self.inputs.items():
+            arrays[f'input.{label}'] = universe
+            structure['inputs'][label] = list(term_mfs)
+            for term_label, mf in term_mfs.items():
+                arrays[f'input.{label}.{term_label}'] = mf
+
+        for plant_name, (universe, term_mfs) in self.outputs.items():
+            arrays[f'output.{plant_name}'] = universe
+            structure['outputs'][plant_name] = list(term_mfs)
+            for term_label, mf in term_mfs.items():
+                arrays[f'output.{plant_name}.{term_label}'] = mf
+
+        arrays['structure'] = np.array(json.dumps(structure))
+        with open(path, 'wb') as compiled_file:
+            np.savez(compiled_file, **arrays)
+
+    @classmethod
+    def load(cls, path, chunk_size=2048, defuzzifier='centroid'):
+        """
+        Read a rule base written by save()
+
+        Returns:
+        tuple: (engine, metadata)
+        """
+
+        with np.load(path, allow_pickle=False) as arrays:
+            structure = json.loads(str(arrays['structure']))
+            inputs = {
+                label: (arrays[f'input.{label}'],
+                        {term_label: arrays[f'input.{label}.{term_label}'] for term_label in term_labels})
+                for label, term_labels in structure['inputs'].items()
+            }
+            outputs = {
+                plant_name: (arrays[f'output.{plant_name}'],
+                             {term_label: arrays[f'output.{plant_name}.{term_label}'] for term_label in term_labels})
+                for plant_name, term_labels in structure['outputs'].items()
+            }
+
+        return cls(inputs, structure['rules'], outputs, chunk_size, defuzzifier), structure['metadata']
+
+    def _fuzzify(self, inputs):
+        """
+        Membership degree of every input term, clipped to the universe like skfuzzy
+
+        Returns:
+        np.ndarray: Shape (N, input terms + 1), the last column is the 0 padding
+        """
+
+        n = inputs['ph'].shape[0]
+        memberships = np.zeros((n, len(self._input_terms) + 1), dtype=np.float64)
+        column = 0
+        for label, (universe, term_mfs) in self.inputs.items():
+            values = np.clip(inputs[label], universe.min(), universe.max())
+            for mf in term_mfs.values():
+                memberships[:, column] = np.interp(values, universe, mf, left=0.0, right=0.0)
+                column += 1
+        return memberships
+
+    def _defuzzify(self, universe, term_mfs, cuts):
+        """
+        Centroid of the aggregated output set, one value per reading
+
+        Mirrors skfuzzy's CrispValueCalculator: the universe is upsampled with
+        the points where each activated term crosses its cut level, the
+        clipped terms are max-aggregated on that universe and the centroid is
+        integrated exactly over the resulting piecewise-linear polygon.
+        Readings whose aggregated set is empty score 0.0, which is what
+        get_plant_recommendation reports when no rule fires.
+        """
+
+        x0 = universe[:-1]
+        x1 = universe[1:]
+        n = next(iter(cuts.values())).shape[0]
+
+        # Every segment of the base universe gets its two end points plus, per
+        # activated term, the cut crossing inside it (or a duplicate of x0).
+        points = [np.broadcast_to(x0, (n, x0.size)), np.broadcast_to(x1, (n, x1.size))]
+        for label, cut in cuts.items():
+            mf = term_mfs[label]
+            m0 = mf[:-1]
+            m1 = mf[1:]
+            level = cut[:, None]
+            crosses = (m0 >= level) != (m1 >= level)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                crossing = x0 + (level - m0) * (x1 - x0) / (m1 - m0)
+            points.append(np.where(crosses, crossing, x0))
+
+        points = np.sort(np.stack(points, axis=-1), axis=-1)
+
+        aggregated = np.zeros_like(points)
+        for label, cut in cuts.items():
+            clipped = np.minimum(cut[:, None, None], np.interp(points, universe, term_mfs[label]))
+            np.maximum(aggregated, clipped, out=aggregated)
+
+        xa = points[..., :-1].reshape(n, -1)
+        xb = points[..., 1:].reshape(n, -1)
+        ya = aggregated[..., :-1].reshape(n, -1)
+        yb = aggregated[..., 1:].reshape(n, -1)
+        dx = xb - xa
+
+        # Same per-segment shapes (rectangle, triangles, trapezoid) and the
+        # same left-to-right accumulation (cumsum, not pairwise sum) as
+        # skfuzzy.defuzzify.centroid, so rounding ties break identically.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            moment = np.where(ya == yb, 0.5 * (xa + xb),
+                     np.where(ya == 0.0, 2.0 / 3.0 * dx + xa,
+                     np.where(yb == 0.0, 1.0 / 3.0 * dx + xa,
+                              (2.0 / 3.0 * dx * (yb + 0.5 * ya)) / (ya + yb) + xa)))
+        area = np.where(ya == yb, dx * ya,
+               np.where(ya == 0.0, 0.5 * dx * yb,
+               np.where(yb == 0.0, 0.5 * dx * ya,
+                        0.5 * dx * (ya + yb))))
+        empty = ((ya == 0.0) & (yb == 0.0)) | (dx == 0.0)
+        area[empty] = 0.0
+        moment[empty] = 0.0
+
+        sum_moment_area = np.cumsum(moment * area, axis=1)[:, -1]
+        sum_area = np.cumsum(area, axis=1)[:, -1]
+
+        scores = sum_moment_area / np.fmax(sum_area, np.finfo(float).eps)
+        scores[aggregated.reshape(n, -1).sum(axis=1) == 0] = 0.0
+        return scores
+
+    def _compile_analytic(self, universe, term_mfs):
+        """
+        Output terms as vertex lists, for _defuzzify_analytic()
+
+        Returns:
+        tuple: ([(vertex x, vertex y)] per term, sorted x of the kinks of the
+        aggregated set that do not depend on the cut levels: every term
+        vertex and every crossing between segments of two different terms)
+        """
+
+        vertices = []
+        for mf in term_mfs.values():
+            # A sampled membership function is linear between the samples, so
+            # only the samples where its slope changes are vertices
+            slopes = np.diff(mf) / np.diff(universe)
+            kinks = np.flatnonzero(~np.isclose(slopes[1:], slopes[:-1], rtol=1e-9, atol=1e-9)) + 1
+            index = np.concatenate([[0], kinks, [universe.size - 1]])
+            vertices.append((universe[index], mf[index]))
+
+        fixed = [x for term_x, _ in vertices for x in term_x]
+        for (x1, y1), (x2, y2) in itertools.combinations(vertices, 2):
+            for i, j in itertools.product(range(x1.size - 1), range(x2.size - 1)):
+                slope1 = (y1[i + 1] - y1[i]) / (x1[i + 1] - x1[i])
+                slope2 = (y2[j + 1] - y2[j]) / (x2[j + 1] - x2[j])
+                if slope1 == slope2:
+                    continue
+                x = (y2[j] - y1[i] + slope1 * x1[i] - slope2 * x2[j]) / (slope1 - slope2)
+                if max(x1[i], x2[j]) < x < min(x1[i + 1], x2[j + 1]):
+                    fixed.append(x)
+
+        return vertices, np.unique(fixed)
+
+    def _defuzzify_analytic(self, analytic, cuts):
+        """
+        Exact centroid of the aggregated output set, one value per reading
+
+        The clipped, max-aggregated terms form a piecewise-linear function
+        whose only kinks are the fixed ones from _compile_analytic() plus the
+        points where a term crosses one of the cut levels. Between those few
+        points (a few dozen, against the hundreds of upsampled points of
+        _defuzzify()) it is linear, so the trapezoid moments are exact and the
+        result carries no quantization error from the sampled universe.
+        """
+
+        vertices, fixed = analytic
+        n = cuts.shape[0]
+
+        points = [np.broadcast_to(fixed, (n, fixed.size))]
+        for term_x, term_y in vertices:
+            x0, x1 = term_x[:-1], term_x[1:]
+            y0, y1 = term_y[:-1], term_y[1:]
+            level = cuts[:, :, None]
+            crosses = (np.minimum(y0, y1) < level) & (level < np.maximum(y0, y1))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                crossing = x0 + (level - y0) * (x1 - x0) / (y1 - y0)
+            points.append(np.where(crosses, crossing, x0).reshape(n, -1))
+        points = np.sort(np.concatenate(points, axis=1), axis=1)
+
+        aggregated = np.zeros_like(points)
+        for column, (term_x, term_y) in enumerate(vertices):
+            np.maximum(aggregated, np.minimum(cuts[:, column, None], np.interp(points, term_x, term_y)),
+                       out=aggregated)
+
+        xa, xb = points[:, :-1], points[:, 1:]
+        ya, yb = aggregated[:, :-1], aggregated[:, 1:]
+        dx = xb - xa
+        area = (0.5 * dx * (ya + yb)).sum(axis=1)
+        moment = (dx * (xa * (2 * ya + yb) + xb * (ya + 2 * yb)) / 6).sum(axis=1)
+
+        scores = np.zeros(n, dtype=np.float64)
+        np.divide(moment, area, out=scores, where=area > 0)
+        return scores
+
+    def _score_chunk(self, inputs):
+        memberships = self._fuzzify(inputs)
+        n = memberships.shape[0]
+        scores = np.zeros((n, len(self.plant_names)), dtype=np.float64)
+
+        # OR (max) of the terms in every clause, then AND (min) of the clauses
+        # in every rule; the appended columns are the padding values
+        clause_strength = memberships[:, self._clause_terms].max(axis=2)
+        clause_strength = np.hstack([clause_strength, np.ones((n, 1))])
+        firing = clause_strength[:, self._rule_clauses].min(axis=2)
+        firing = np.hstack([firing, np.zeros((n, 1))])
+
+        for universe, term_mfs, columns, target_rules, analytic in self._output_groups:
+            labels = list(term_mfs)
+
+            # Activation level of every output term, per reading and plant: the
+            # max over the rules concluding it. A term that no rule activates
+            # is left at 0, which defuzzifies exactly like skfuzzy leaving it out.
+            levels = firing[:, target_rules].max(axis=3)
+
+            # Many readings share the same activation levels (e.g. every
+            # reading deep inside one membership plateau), so only defuzzify
+            # each distinct combination once.
+            levels = levels.reshape(-1, len(labels))
+            distinct, inverse = np.unique(levels, axis=0, return_inverse=True)
+            if self.defuzzifier == 'analytic':
+                group_scores = self._defuzzify_analytic(analytic, distinct)[inverse.ravel()]
+            else:
+                distinct_cuts = {label: distinct[:, i] for i, label in enumerate(labels)}
+                group_scores = self._defuzzify(universe, term_mfs, distinct_cuts)[inverse.ravel()]
+            scores[:, columns] = group_scores.reshape(n, len(columns))
+
+        return scores
+
+    def score(self, ph_values, temp_values, humidity_values):
+        """
+        Suitability score of every plant for every reading
+
+        Parameters:
+        ph_values, temp_values, humidity_values (array-like): Equal-length inputs
+
+        Returns:
+        np.ndarray: Shape (N, len(plant_names)), columns ordered as plant_names
+        """
+
+        ph_values = np.atleast_1d(np.asarray(ph_values, dtype=np.float64))
+        temp_values = np.atleast_1d(np.asarray(temp_values, dtype=np.float64))
+        humidity_values = np.atleast_1d(np.asarray(humidity_values, dtype=np.float64))
+        if not (ph_values.shape == temp_values.shape == humidity_values.shape) or ph_values.ndim != 1:
+            raise ValueError("pH, temperature and humidity must be 1-D arrays of equal length")
+
+        scores = np.empty((ph_values.shape[0], len(self.plant_names)), dtype=np.float64)
+        for start in range(0, ph_values.shape[0], self.chunk_size):
+            stop = start + self.chunk_size
+            scores[start:stop] = self._score_chunk({
+                'ph': ph_values[start:stop],
+                'temperature': temp_values[start:stop],
+                'humidity': humidity_values[start:stop],
+            })
+        return scores
@@ -0,0 +1,186 @@
+import json
+import math
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from .caching import bump_data_version
+from .devices import update_latest_readings
+from .models import DEFAULT_DEVICE_ID, SoilCondition
+from .rollups import add_to_rollups
+
+# Keys of a reading as the SolireSense firmware publishes it
+REQUIRED_FIELDS = ['temperature_c', 'moisture_percent', 'ph_value']
+
+# Longest device_id a reading may carry, see SoilCondition.device_id
+DEVICE_ID_MAX_LENGTH = SoilCondition._meta.get_field('device_id').max_length
+
+
+# Wakes up the live feed streams of this process when readings are stored,
+# see views.stream_data
+_new_readings = threading.Condition()
+
+
+def _notify_new_readings():
+    with _new_readings:
+        _new_readings.notify_all()
+
+
+def wait_for_new_readings(timeout):
+    """Block until this process stores a reading or timeout seconds pass"""
+
+    with _new_readings:
+        _new_readings.wait(timeout)
+
+
+class ReadingError(ValueError):
+    """A reading that cannot be stored; details are extra fields for the error response"""
+
+    def __init__(self, message, **details):
+        super().__init__(message)
+        self.details = details
+
+
+def clean_reading(data):
+    """
+    Validate one reading and map it to SoilCondition fields
+
+    Parameters:
+    data (dict): Reading with temperature_c, moisture_percent and ph_value
+        (a missing ph_value is stored as 0, which marks 'no pH data'), and
+        the device_id of the probe (DEFAULT_DEVICE_ID when missing)
+
+    Returns:
+    dict: device_id, ph_value, temperature_value and moisture_value
+
+    Raises ReadingError with the message the API reports.
+    """
+
+    if not isinstance(data, dict):
+        raise ReadingError('Reading must be a JSON object')
+
+    # Validate pH value before anything else
+    try:
+        ph_value = float(data.get('ph_value', 0))
+    except (TypeError, ValueError):
+        raise ReadingError('pH value must be a number', received_ph=data.get('ph_value')) from None
+    if not (0.0 <= ph_value <= 14.0):
+        raise ReadingError('pH value must be between 0 and 14', received_ph=ph_value)
+
+    for field in ('temperature_c', 'moisture_percent'):
+        if field not in data:
+            raise ReadingError(f"Missing required field: '{field}'", required_fields=REQUIRED_FIELDS)
+
+    try:
+        temperature_value = float(data['temperature_c'])
+    except (TypeError, ValueError):
+        temperature_value = math.nan
+    if not math.isfinite(temperature_value):
+        raise ReadingError('Temperature must be a number', received_temperature=data['temperature_c'])
+
+    # int() like the IntegerField itself, so 45.0 (or 45.7) is stored as 45
+    try:
+        moisture_value = int(data['moisture_percent'])
+    except (TypeError, ValueError, OverflowError):
+        raise ReadingError('Moisture must be an integer', received_moisture=data['moisture_percent']) from None
+
+    device_id = data.get('device_id', DEFAULT_DEVICE_ID)
+    if not isinstance(device_id, str) or not 0 < len(device_id) <= DEVICE_ID_MAX_LENGTH:
+        raise ReadingError(
+            f'Device id must be a string of 1 to {DEVICE_ID_MAX_LENGTH} characters', received_device_id=device_id
+        )
+
+    return {
+        'device_id': device_id,
+        'ph_value': ph_value,
+        'temperature_value': temperature_value,
+        'moisture_value': moisture_value,
+    }
+
+
+def store_reading(fields):
+    """Create a SoilCondition from clean_reading() fields and add it to the rollups and its device's latest reading"""
+
+    with transaction.atomic():
+        soil_condition = SoilCondition.objects.create(**fields)
+        add_to_rollups([soil_condition])
+        update_latest_readings([soil_condition])
+        bump_data_version()
+        transaction.on_commit(_notify_new_readings)
+    return soil_condition
+
+
+def parse_readings(lines):
+    """
+    Yield (index, reading or ReadingError) for a newline-delimited JSON stream
+
+    Blank lines are skipped; a line that is not valid JSON becomes a
+    ReadingError for that index instead of failing the whole upload.
+    """
+
+    index = 0
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if not line.strip():
+            continue
+        try:
+            yield index, json.loads(line)
+        except ValueError as e:
+            yield index, ReadingError(f'Invalid JSON: {e}')
+        index += 1
+
+
+def ingest_readings(readings, batch_size=None, on_batch=None):
+    """
+    Validate and store many readings with batched bulk_create
+
+    Parameters:
+    readings (iterable): (index, reading dict or ReadingError) pairs, e.g.
+        from parse_readings() or enumerate(json_array)
+    batch_size (int): Rows per INSERT / transaction, defaults to
+        settings.SOLIRE_INGEST_BATCH_SIZE
+    on_batch (callable): Called with each list of stored SoilConditions,
+        e.g. to store their recommendations
+
+    Returns:
+    tuple: (readings received, readings stored, list of
+    {'index', 'error', ...details} for the rejected readings)
+    """
+
+    batch_size = batch_size or settings.SOLIRE_INGEST_BATCH_SIZE
+    received = 0
+    inserted = 0
+    errors = []
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            created = SoilCondition.objects.bulk_create(batch)
+            add_to_rollups(created)
+            update_latest_readings(created)
+            bump_data_version()
+            transaction.on_commit(_notify_new_readings)
+        if on_batch is not None:
+            on_batch(created)
+        batch.clear()
+        return len(created)
+
+    for index, reading in readings:
+        received += 1
+        try:
+            if isinstance(reading, ReadingError):
+                raise reading
+            batch.append(SoilCondition(**clean_reading(reading)))
+        except ReadingError as e:
+            errors.append({'index': index, 'error': str(e), **e.details})
+            continue
+
+        if len(batch) >= batch_size:
+            inserted += flush()
+
+    if batch:
+        inserted += flush()
+
+    return received, inserted, errors
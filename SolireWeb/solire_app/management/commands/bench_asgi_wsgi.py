@@ -0,0 +1,229 @@
+import asyncio
+import io
+import json
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode
+
+import numpy as np
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from solire_app import recommendations
+from solire_app.models import SoilCondition
+
+# Any 32 character secret works as a CSRF cookie with the same value in the header
+CSRF_TOKEN = 'solirebenchsolirebenchsolirebenc'
+
+# (method, sync path, async path, query string or body) per scenario
+SCENARIOS = {
+    'insert': ('POST', '/api/insert/', '/api/async/insert/', None),
+    'list': ('GET', '/api/', '/api/async/', {'limit': 20}),
+    'recommend': ('GET', '/api/recommend/', '/api/async/recommend/', {'ph': 6.5, 'temp': 28, 'humidity': 70}),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the WSGI views with their async versions under ASGI: many "
+        "concurrent sensor connections each send requests back to back, and "
+        "requests per second and latency percentiles are reported. Both "
+        "handlers run in-process (no sockets), against a throwaway SQLite database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=200,
+                            help='Concurrent client connections (default: 200)')
+        parser.add_argument('--requests', type=int, default=10,
+                            help='Requests each connection sends, one after the other (default: 10)')
+        parser.add_argument('--wsgi-threads', type=int, default=8,
+                            help='Request threads of the WSGI server, like gunicorn --threads (default: 8)')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f"Comma separated scenarios (default: {','.join(SCENARIOS)})")
+        parser.add_argument('--rows', type=int, default=10000,
+                            help='Readings in the database before the run (default: 10000)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The ASGI/WSGI benchmark runs against SQLite only")
+
+        scenarios = options['scenarios'].split(',')
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        # An on-disk test database: the WSGI threads each open a connection,
+        # which an in-memory database would not share reliably
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = str(Path(directory) / 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.populate(options['rows'])
+                # Build the fuzzy system now, not inside the first timed request
+                recommendations.fuzzy_system_instance.rule_set_version
+
+                self.stdout.write(
+                    f"{options['connections']} connections x {options['requests']} requests, "
+                    f"{options['wsgi_threads']} WSGI threads\n"
+                )
+                self.stdout.write(
+                    f"{'scenario':<10} {'server':<6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}"
+                )
+                wsgi_app = get_wsgi_application()
+                asgi_app = get_asgi_application()
+                for scenario in scenarios:
+                    for server in ('wsgi', 'asgi'):
+                        result = asyncio.run(self.run(server, wsgi_app, asgi_app, scenario, options))
+                        self.stdout.write(
+                            f"{scenario:<10} {server:<6} {result['rps']:>9.1f} {result['p50'] * 1e3:>9.1f} "
+                            f"{result['p99'] * 1e3:>9.1f} {result['errors']:>7}"
+                        )
+            finally:
+                connections.close_all()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def populate(self, rows):
+        rng = np.random.default_rng(0)
+        SoilCondition.objects.bulk_create(
+            (SoilCondition(ph_value=ph, temperature_value=temp, moisture_value=moisture)
+             for ph, temp, moisture in zip(np.round(rng.uniform(4.0, 9.0, rows), 2).tolist(),
+                                           np.round(rng.uniform(15.0, 38.0, rows), 1).tolist(),
+                                           rng.integers(30, 100, rows).tolist())),
+            batch_size=10000,
+        )
+
+    def request(self, scenario, server):
+        """(method, path, query string, body) of one request of a scenario"""
+
+        method, sync_path, async_path, data = SCENARIOS[scenario]
+        path = async_path if server == 'asgi' else sync_path
+        if method == 'POST':
+            body = json.dumps({'temperature_c': 26.5, 'moisture_percent': 70, 'ph_value': 6.5}).encode()
+            return method, path, '', body
+        return method, path, urlencode(data), b''
+
+    async def run(self, server, wsgi_app, asgi_app, scenario, options):
+        method, path, query_string, body = self.request(scenario, server)
+        latencies = []
+        errors = 0
+
+        if server == 'wsgi':
+            executor = ThreadPoolExecutor(max_workers=options['wsgi_threads'])
+            loop = asyncio.get_running_loop()
+
+            async def send_request():
+                return await loop.run_in_executor(
+                    executor, call_wsgi, wsgi_app, method, path, query_string, body
+                )
+        else:
+            async def send_request():
+                return await call_asgi(asgi_app, method, path, query_string, body)
+
+        async def client():
+            nonlocal errors
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                status = await send_request()
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['connections'])))
+        elapsed = time.perf_counter() - started
+
+        if server == 'wsgi':
+            executor.submit(connections.close_all).result()
+            executor.shutdown()
+
+        latencies.sort()
+        return {
+            'rps': len(latencies) / elapsed,
+            'p50': statistics.median(latencies),
+            'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+            'errors': errors,
+        }
+
+
+def call_wsgi(app, method, path, query_string, body):
+    """Status code of one request through the WSGI application"""
+
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_COOKIE': f'{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}',
+        'HTTP_X_CSRFTOKEN': CSRF_TOKEN,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    response = app(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return int(status[0].split()[0])
+
+
+async def call_asgi(app, method, path, query_string, body):
+    """Status code of one request through the ASGI application"""
+
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': query_string.encode(),
+        'headers': [
+            (b'host', b'testserver'),
+            (b'cookie', f'{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}'.encode()),
+            (b'x-csrftoken', CSRF_TOKEN.encode()),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    request_sent = False
+    status = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        # The client stays connected until the response is complete
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await app(scope, receive, send)
+    return status[0]
@@ -0,0 +1,58 @@
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from solire_app.helpers.bulk_recommendations import BulkRecommendationRunner
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark BulkRecommendationRunner with 1..N worker processes on "
+        "synthetic readings, and check every run returns the same results in "
+        "the same order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='1,2,4,8',
+                            help='Comma separated worker counts, 0 is in-process (default: 1,2,4,8)')
+        parser.add_argument('--rows', type=int, default=100000,
+                            help='Number of readings (default: 100000)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Readings per worker task (default: 1000)')
+
+    def handle(self, *args, **options):
+        worker_counts = [int(count) for count in options['workers'].split(',')]
+
+        # Sensor-like readings: pH to 0.01, temperature to 0.1°C, whole percents
+        rng = np.random.default_rng(0)
+        readings = list(zip(
+            np.round(rng.uniform(4.0, 9.0, options['rows']), 2).tolist(),
+            np.round(rng.uniform(15.0, 38.0, options['rows']), 1).tolist(),
+            rng.integers(30, 100, options['rows']).tolist(),
+        ))
+
+        self.stdout.write(f"{'workers':>7}  {'seconds':>8}  {'readings/s':>12}  {'speed-up':>8}  {'same':>5}")
+
+        baseline = None
+        expected = None
+        for worker_count in worker_counts:
+            started = time.perf_counter()
+            with BulkRecommendationRunner(workers=worker_count, chunk_size=options['chunk_size'],
+                                          compiled_path=settings.SOLIRE_FUZZY_COMPILED_PATH,
+                                          defuzzifier=settings.SOLIRE_FUZZY_DEFUZZIFIER) as runner:
+                top_plants = [
+                    (recommendation['top_recommendation']['plant'],
+                     recommendation['top_recommendation']['suitability_score'])
+                    for _, recommendation in runner.recommendations(readings)
+                ]
+            elapsed = time.perf_counter() - started
+
+            expected = expected or top_plants
+            throughput = len(readings) / elapsed
+            baseline = baseline or throughput
+            self.stdout.write(
+                f"{worker_count:>7}  {elapsed:>8.2f}  {throughput:>12.0f}  {throughput / baseline:>7.2f}x  "
+                f"{str(top_plants == expected):>5}"
+            )
@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from solire_app.helpers.fuzzy_logic import PlantRecommendationFuzzySystem
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark fuzzy recommendation throughput with 1..N threads sharing one "
+        "PlantRecommendationFuzzySystem, and check every result against a "
+        "single-threaded reference."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', default='1,2,4,8',
+                            help='Comma separated thread counts (default: 1,2,4,8)')
+        parser.add_argument('--calls', type=int, default=300,
+                            help='Calls per thread (default: 300)')
+        parser.add_argument('--batch-size', type=int, default=1,
+                            help='Readings per call; above 1 the batch API is used (default: 1)')
+        parser.add_argument('--legacy-simulators', action='store_true',
+                            help='Drive the shared skfuzzy simulators directly, to show the race they have')
+
+    def handle(self, *args, **options):
+        thread_counts = [int(count) for count in options['threads'].split(',')]
+        calls = options['calls']
+        batch_size = options['batch_size']
+
+        fuzzy_system = PlantRecommendationFuzzySystem()
+        plant_names = list(fuzzy_system.vectorized_engine.plant_names)
+
+        # A fixed pool of realistic readings with a single-threaded reference answer
+        rng = np.random.default_rng(0)
+        pool_size = 512
+        ph_values = np.round(rng.uniform(4.0, 9.0, pool_size), 2)
+        temp_values = np.round(rng.uniform(15.0, 38.0, pool_size), 1)
+        humidity_values = rng.integers(30, 100, pool_size).astype(float)
+        _, expected = fuzzy_system.score_plants_batch(ph_values, temp_values, humidity_values)
+        expected = np.round(expected, 3)
+
+        def evaluate(indexes):
+            if options['legacy_simulators']:
+                rows = []
+                for index in indexes:
+                    row = []
+                    for plant_name in plant_names:
+                        simulator = fuzzy_system.simulators[plant_name]
+                        try:
+                            simulator.input['ph'] = float(ph_values[index])
+                            simulator.input['temperature'] = temp_values[index]
+                            simulator.input['humidity'] = humidity_values[index]
+                            simulator.compute()
+                            row.append(round(simulator.output[plant_name.lower()], 3))
+                        except Exception:
+                            row.append(0.0)
+                    rows.append(row)
+                return np.array(rows)
+
+            if batch_size == 1:
+                index = indexes[0]
+                recommendation = fuzzy_system.get_plant_recommendation(
+                    ph_values[index], temp_values[index], humidity_values[index]
+                )
+                scores = {plant['plant']: plant['suitability_score'] for plant in recommendation['all_plants']}
+                return np.array([[scores[plant_name] for plant_name in plant_names]])
+
+            _, scores = fuzzy_system.score_plants_batch(
+                ph_values[indexes], temp_values[indexes], humidity_values[indexes]
+            )
+            return np.round(scores, 3)
+
+        self.stdout.write(
+            f"{'threads':>7}  {'readings/s':>12}  {'speed-up':>8}  {'mismatches':>10}"
+        )
+
+        baseline = None
+        for thread_count in thread_counts:
+            barrier = threading.Barrier(thread_count)
+
+            def worker(offset):
+                mismatches = 0
+                barrier.wait()
+                for call in range(calls):
+                    start = (offset * 7919 + call * batch_size) % pool_size
+                    indexes = np.arange(start, start + batch_size) % pool_size
+                    if not np.array_equal(evaluate(indexes), expected[indexes]):
+                        mismatches += 1
+                return mismatches
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=thread_count) as executor:
+                mismatches = sum(executor.map(worker, range(thread_count)))
+            elapsed = time.perf_counter() - started
+
+            throughput = thread_count * calls * batch_size / elapsed
+            baseline = baseline or throughput
+            self.stdout.write(
+                f"{thread_count:>7}  {throughput:>12.0f}  {throughput / baseline:>7.2f}x  {mismatches:>10}"
+            )
@@ -0,0 +1,188 @@
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Any 32 character secret works as a CSRF cookie with the same value in the header
+CSRF_TOKEN = 'solirebenchsolirebenchsolirebenc'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure ingest throughput of a local server (runserver) with many probes "
+        "posting readings at once, for each database configuration: SQLite with "
+        "its stock settings, the tuned SQLite profile and, given a scratch "
+        "database, PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='default,tuned',
+                            help="Comma separated: default, tuned, postgresql (default: default,tuned)")
+        parser.add_argument('--clients', type=int, default=50,
+                            help='Probes posting concurrently (default: 50)')
+        parser.add_argument('--requests', type=int, default=40,
+                            help='Requests per probe (default: 40)')
+        parser.add_argument('--bulk', type=int, default=0,
+                            help='Readings per request through api/insert/bulk/; 0 posts single '
+                                 'readings to api/insert/ (default: 0)')
+        parser.add_argument('--postgres-db',
+                            help='Scratch PostgreSQL database for the postgresql profile; the '
+                                 'other SOLIRE_DB_* variables are taken from the environment')
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'].split(',')
+        unknown = set(profiles) - {'default', 'tuned', 'postgresql'}
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+        if 'postgresql' in profiles and not options['postgres_db']:
+            raise CommandError("The postgresql profile needs --postgres-db, a database it may fill with test rows")
+
+        self.stdout.write(
+            f"{options['clients']} probes x {options['requests']} requests, "
+            f"{options['bulk'] or 1} reading(s) per request\n"
+        )
+        self.stdout.write(
+            f"{'profile':<11} {'readings/s':>10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}  errors"
+        )
+        for profile in profiles:
+            with tempfile.TemporaryDirectory() as directory:
+                env = dict(os.environ)
+                if profile == 'postgresql':
+                    env.update(SOLIRE_DB_ENGINE='postgresql', SOLIRE_DB_NAME=options['postgres_db'])
+                else:
+                    env.update(SOLIRE_DB_ENGINE='sqlite', SOLIRE_SQLITE_PROFILE=profile,
+                               SOLIRE_DB_NAME=str(Path(directory) / 'bench.sqlite3'))
+                result = self.run_profile(env, options)
+
+            errors = ', '.join(f"{count}x {status}" for status, count in sorted(result['errors'].items())) or '-'
+            self.stdout.write(
+                f"{profile:<11} {result['readings_per_second']:>10.1f} {result['rps']:>8.1f} "
+                f"{result['p50'] * 1e3:>8.1f} {result['p99'] * 1e3:>8.1f}  {errors}"
+            )
+
+    def run_profile(self, env, options):
+        manage = [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py')]
+        subprocess.run(manage + ['migrate', '--verbosity', '0'], env=env, check=True)
+
+        with socket.socket() as free:
+            free.bind(('127.0.0.1', 0))
+            port = free.getsockname()[1]
+        server = subprocess.Popen(
+            manage + ['runserver', f'127.0.0.1:{port}', '--noreload', '--skip-checks'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.wait_for_server(port, server)
+            return self.load(port, options)
+        finally:
+            server.terminate()
+            server.wait()
+
+    def wait_for_server(self, port, server, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("The server exited on startup")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"The server did not start within {timeout}s")
+
+    def load(self, port, options):
+        if options['bulk']:
+            path = '/api/insert/bulk/'
+            body = json.dumps([self.reading(index) for index in range(options['bulk'])]).encode()
+        else:
+            path = '/api/insert/'
+            body = json.dumps(self.reading(0)).encode()
+        headers = {
+            'Content-Type': 'application/json',
+            'Cookie': f'{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}',
+            'X-CSRFToken': CSRF_TOKEN,
+        }
+
+        # The first request builds the server's fuzzy system; keep it out of the timings
+        self.post(port, path, body, headers)
+
+        latencies = []
+        errors = Counter()
+        lock = threading.Lock()
+
+        # runserver accepts only a few pending connections at a time, so the
+        # probes connect (retrying) before the clock starts
+        ready = threading.Barrier(options['clients'] + 1)
+
+        def probe():
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+            for _ in range(50):
+                try:
+                    connection.connect()
+                    break
+                except OSError:
+                    connection.close()
+                    time.sleep(0.1)
+            ready.wait()
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                try:
+                    connection.request('POST', path, body, headers)
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                except OSError as e:
+                    connection.close()
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if status != 201:
+                        errors[str(status)] += 1
+            connection.close()
+
+        threads = [threading.Thread(target=probe) for _ in range(options['clients'])]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        succeeded = len(latencies) - sum(errors.values())
+        return {
+            'readings_per_second': succeeded * (options['bulk'] or 1) / elapsed,
+            'rps': len(latencies) / elapsed,
+            'p50': statistics.median(latencies),
+            'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+            'errors': errors,
+        }
+
+    def post(self, port, path, body, headers):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        try:
+            connection.request('POST', path, body, headers)
+            connection.getresponse().read()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def reading(index):
+        return {
+            'temperature_c': 20.0 + index % 15,
+            'moisture_percent': 40 + index % 50,
+            'ph_value': round(5.0 + (index % 30) / 10, 1),
+        }
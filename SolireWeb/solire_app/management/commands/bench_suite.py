@@ -0,0 +1,222 @@
+import datetime
+import importlib.metadata
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import JsonResponse
+from django.test import RequestFactory, override_settings
+
+from solire_app import recommendations, views
+from solire_app.helpers.fuzzy_logic import PlantRecommendationFuzzySystem
+from solire_app.models import SoilCondition
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the benchmark suite for the fuzzy engine and the API hot paths against "
+        "a throwaway SQLite test database, write the results as JSON and compare "
+        "them with a baseline from an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,100000,1000000',
+                            help='Comma separated table sizes for the API benchmarks (default: 1000,100000,1000000)')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Timed runs per benchmark, the median is reported (default: 3)')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=1.25,
+                            help='Slowdown ratio against the baseline reported as a regression (default: 1.25)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The benchmark suite runs against SQLite only")
+
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        self.repeat = options['repeat']
+        self.results = {}
+        self.factory = RequestFactory()
+
+        # Fresh test database, so runs are repeatable and never touch real data
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.bench_fuzzy_system()
+            self.bench_api(sizes)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {'environment': self.environment(), 'results': self.results}
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            self.compare(json.loads(Path(options['baseline']).read_text()), options['threshold'])
+
+    def measure(self, name, func, number=None, repeat=None, **info):
+        """
+        Time func() and record seconds per call under name
+
+        Without number, fast calls are repeated until a run takes at least
+        0.2 s (which also warms them up) so timer resolution does not matter.
+        """
+
+        if number is None:
+            number = 1
+            while True:
+                started = time.perf_counter()
+                for _ in range(number):
+                    func()
+                if time.perf_counter() - started >= 0.2:
+                    break
+                number *= 10
+
+        timings = []
+        for _ in range(repeat or self.repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            timings.append((time.perf_counter() - started) / number)
+
+        self.results[name] = {
+            'seconds': statistics.median(timings),
+            'min_seconds': min(timings),
+            'runs': len(timings),
+            'calls_per_run': number,
+            **info,
+        }
+        self.stdout.write(f"{name:<48} {statistics.median(timings) * 1e3:>12.3f} ms")
+
+    def bench_fuzzy_system(self):
+        self.measure('fuzzy.construct', PlantRecommendationFuzzySystem, number=1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            compiled_path = Path(directory) / 'compiled_rule_base.npz'
+            PlantRecommendationFuzzySystem(compiled_path)
+            self.measure('fuzzy.construct_compiled', lambda: PlantRecommendationFuzzySystem(compiled_path))
+
+        fuzzy_system = PlantRecommendationFuzzySystem()
+        self.measure('fuzzy.recommend_single', lambda: fuzzy_system.get_plant_recommendation(6.5, 26.0, 70))
+
+        fuzzy_system.enable_cache()
+        self.measure('fuzzy.recommend_single_cached', lambda: fuzzy_system.get_plant_recommendation(6.5, 26.0, 70))
+        fuzzy_system.disable_cache()
+
+        # Every input combination at sensor-like resolution, across the universes
+        grid = np.meshgrid(np.arange(0, 14.01, 0.25), np.arange(0, 50.1, 1.0), np.arange(0, 100.1, 2.0),
+                           indexing='ij')
+        readings = [axis.ravel() for axis in grid]
+        self.measure('fuzzy.sweep_input_space', lambda: fuzzy_system.score_plants_batch(*readings),
+                     number=1, readings=int(readings[0].size))
+
+        analytic_system = PlantRecommendationFuzzySystem(defuzzifier='analytic')
+        self.measure('fuzzy.recommend_single_analytic',
+                     lambda: analytic_system.get_plant_recommendation(6.5, 26.0, 70))
+        self.measure('fuzzy.sweep_input_space_analytic', lambda: analytic_system.score_plants_batch(*readings),
+                     number=1, readings=int(readings[0].size))
+
+    def bench_api(self, sizes):
+        rng = np.random.default_rng(0)
+
+        for size in sorted(sizes):
+            # Grow the table to size rows of sensor-like readings, about 2% of
+            # them with the 0 values a disconnected probe sends
+            missing = size - SoilCondition.objects.count()
+            ph_values = np.round(rng.uniform(4.0, 9.0, missing), 2)
+            temp_values = np.round(rng.uniform(15.0, 38.0, missing), 1)
+            moisture_values = rng.integers(30, 100, missing)
+            moisture_values[rng.random(missing) < 0.02] = 0
+            SoilCondition.objects.bulk_create(
+                (SoilCondition(ph_value=ph, temperature_value=temp, moisture_value=moisture)
+                 for ph, temp, moisture in zip(ph_values.tolist(), temp_values.tolist(), moisture_values.tolist())),
+                batch_size=10000,
+            )
+
+            # Storing the new rows' recommendations mutates the table, so it is
+            # timed once; the reads below all see stored recommendations
+            self.measure(f'api.refresh_recommendations.{size}',
+                         lambda: recommendations.refresh_recommendations(
+                             recommendations.stale_recommendations(SoilCondition.objects.all())
+                         ),
+                         number=1, repeat=1, rows=missing)
+
+            # One run is plenty (and all there is time for) on the largest tables
+            repeat = self.repeat if size <= 100000 else 1
+            # Without the response cache, or every run after the first would
+            # time a cache hit
+            with override_settings(SOLIRE_RESPONSE_CACHE_TIMEOUT=None):
+                for name, view, path in (
+                    ('list_data', views.list_data, '/api/'),
+                    ('list_data_with_recommendation', views.list_data_with_recommendation, '/api/recommendation-list'),
+                    ('generate_report', views.generate_report, '/api/report/'),
+                ):
+                    self.measure(f'api.{name}.{size}', lambda: self.call_view(view, path),
+                                 number=1, repeat=repeat, rows=size)
+
+            self.bench_cache_hit(size)
+
+    def bench_cache_hit(self, size):
+        """Time list_data served from the response cache, when it is small enough to be stored"""
+
+        # The table grew without a DatasetVersion bump, so drop the responses of the smaller size
+        cache.clear()
+        self.call_view(views.list_data, '/api/')
+        if isinstance(self.call_view(views.list_data, '/api/'), JsonResponse):
+            self.stdout.write(f"{f'api.list_data_cache_hit.{size}':<48} {'not cached':>15}")
+            return
+        self.measure(f'api.list_data_cache_hit.{size}', lambda: self.call_view(views.list_data, '/api/'), rows=size)
+
+    def call_view(self, view, path):
+        response = view(self.factory.get(path))
+        if response.status_code != 200:
+            raise CommandError(f"{path} answered {response.status_code}: {response.content[:200]!r}")
+        return response
+
+    def environment(self):
+        versions = {}
+        for distribution in ('Django', 'numpy', 'scikit-fuzzy', 'openpyxl'):
+            try:
+                versions[distribution] = importlib.metadata.version(distribution)
+            except importlib.metadata.PackageNotFoundError:
+                versions[distribution] = None
+
+        return {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'versions': versions,
+        }
+
+    def compare(self, baseline, threshold):
+        """Print the ratio against the baseline per benchmark, fail on regressions"""
+
+        self.stdout.write(f"\n{'benchmark':<48} {'baseline ms':>12} {'now ms':>12} {'ratio':>7}")
+
+        regressions = []
+        for name, result in self.results.items():
+            if name not in baseline['results']:
+                continue
+            before = baseline['results'][name]['seconds']
+            ratio = result['seconds'] / before if before else float('inf')
+            flag = '  REGRESSION' if ratio > threshold else ''
+            if flag:
+                regressions.append(name)
+            self.stdout.write(
+                f"{name:<48} {before * 1e3:>12.3f} {result['seconds'] * 1e3:>12.3f} {ratio:>6.2f}x{flag}"
+            )
+
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} benchmark(s) more than {threshold:g}x slower than the baseline: "
+                f"{', '.join(regressions)}"
+            )
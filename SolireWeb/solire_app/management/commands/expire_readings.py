@@ -0,0 +1,65 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from solire_app.models import DeviceLatestReading, SoilCondition
+from solire_app.retention import expire_readings
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive the readings older than the retention period to gzip compressed "
+        "newline-delimited JSON files, one per day, and delete them in small "
+        "batches. Run it periodically (e.g. daily from cron); the hourly and daily "
+        "rollups and each device's latest reading are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SOLIRE_RETENTION_DAYS,
+                            help='Days of readings to keep (default: SOLIRE_RETENTION_DAYS)')
+        parser.add_argument('--archive-dir', default=settings.SOLIRE_ARCHIVE_DIR,
+                            help='Directory of the archive files (default: SOLIRE_ARCHIVE_DIR)')
+        parser.add_argument('--batch-size', type=int, default=settings.SOLIRE_RETENTION_BATCH_SIZE,
+                            help='Readings archived and deleted per transaction '
+                                 '(default: SOLIRE_RETENTION_BATCH_SIZE)')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to wait between batches, to leave the database to '
+                                 'the ingest (default: 0)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the readings that would expire')
+
+    def handle(self, *args, **options):
+        if options['days'] is None:
+            raise CommandError("No retention period: pass --days or set SOLIRE_RETENTION_DAYS")
+        if options['days'] < 0:
+            raise CommandError("--days must not be negative")
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be a positive integer")
+
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+
+        if options['dry_run']:
+            expired = (
+                SoilCondition.objects
+                .filter(timestamps__lt=before)
+                .exclude(id__in=DeviceLatestReading.objects.values('soil_condition_id'))
+                .count()
+            )
+            self.stdout.write(f"{expired} readings are older than {before:%Y-%m-%d %H:%M:%S}")
+            return
+
+        started = time.perf_counter()
+        deleted, archives = expire_readings(
+            before,
+            options['archive_dir'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(
+            f"Archived and deleted {deleted} readings older than {before:%Y-%m-%d %H:%M:%S} "
+            f"in {time.perf_counter() - started:.2f}s, to {len(archives)} archive files in {options['archive_dir']}"
+        )
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from solire_app import export
+from solire_app.filters import filtered_soil_conditions
+from solire_app.recommendations import fuzzy_system_instance
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the readings of a time range as Parquet or an Arrow IPC stream, "
+        "e.g. for pandas.read_parquet(), reading the database a chunk at a time. "
+        "Needs pyarrow."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='File to write')
+        parser.add_argument('--format', choices=export.EXPORT_FORMATS,
+                            help="parquet or arrow (default: from the output's extension, else parquet)")
+        parser.add_argument('--since', help='First timestamp to export, ISO 8601 (inclusive)')
+        parser.add_argument('--until', help='Last timestamp to export, ISO 8601 (exclusive)')
+        parser.add_argument('--device', help='Only the readings of this device_id')
+        parser.add_argument('--scores', action='store_true',
+                            help="Add each plant's suitability score as a column")
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE,
+                            help=f'Rows read and written at a time (default: {export.DEFAULT_CHUNK_SIZE})')
+
+    def handle(self, *args, **options):
+        export_format = options['format']
+        if export_format is None:
+            export_format = 'arrow' if options['output'].endswith(('.arrow', '.arrows')) else 'parquet'
+        if options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size must be a positive integer")
+
+        filters = {name: options[name] for name in ('since', 'until', 'device') if options[name]}
+        try:
+            soil_conditions = filtered_soil_conditions(filters).order_by('timestamps', 'id')
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        try:
+            written = export.write_export(
+                soil_conditions,
+                options['output'],
+                export_format,
+                fuzzy_system=fuzzy_system_instance if options['scores'] else None,
+                chunk_size=options['chunk_size'],
+            )
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"Exported {written} readings to {options['output']} ({export_format}) "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
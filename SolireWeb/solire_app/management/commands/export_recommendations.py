@@ -0,0 +1,43 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand
+
+from solire_app.models import SoilCondition
+from solire_app.recommendations import REPORT_HEADER, refresh_recommendations, report_rows, stale_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Export every SoilCondition with its plant recommendation as CSV. Missing "
+        "or stale recommendations are first recomputed across a pool of worker "
+        "processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='CSV file to write (default: stdout)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes, 0 scores in this process (default: SOLIRE_BULK_WORKERS)')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows read from the database at a time (default: 2000)')
+
+    def handle(self, *args, **options):
+        soil_conditions = SoilCondition.objects.order_by('timestamps')
+        refreshed = refresh_recommendations(stale_recommendations(soil_conditions), options['workers'])
+        if refreshed:
+            self.stderr.write(f"Recomputed {refreshed} recommendations")
+
+        exported = 0
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            writer = csv.writer(output)
+            writer.writerow(REPORT_HEADER)
+            for row in report_rows(soil_conditions, options['chunk_size']):
+                writer.writerow(row)
+                exported += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if options['output']:
+            self.stdout.write(f"Exported {exported} rows to {options['output']}")
@@ -0,0 +1,74 @@
+import logging
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from solire_app.mqtt_ingest import MqttIngestWorker, create_mqtt_client
+from solire_app.recommendations import store_recommendations
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Subscribe to the MQTT topic the SolireSense sensors publish to and store "
+        "every reading as a SoilCondition, in batches, until interrupted. Replaces "
+        "a separate MQTT-to-HTTP bridge in front of api/insert/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=settings.SOLIRE_MQTT_HOST,
+                            help='MQTT broker host (default: SOLIRE_MQTT_HOST)')
+        parser.add_argument('--port', type=int, default=settings.SOLIRE_MQTT_PORT,
+                            help='MQTT broker port (default: SOLIRE_MQTT_PORT)')
+        parser.add_argument('--topic', default=settings.SOLIRE_MQTT_TOPIC,
+                            help='Topic to subscribe to (default: SOLIRE_MQTT_TOPIC)')
+        parser.add_argument('--client-id', default=settings.SOLIRE_MQTT_CLIENT_ID,
+                            help='MQTT client id, keep it stable so the broker keeps the session '
+                                 '(default: SOLIRE_MQTT_CLIENT_ID)')
+        parser.add_argument('--batch-size', type=int, default=settings.SOLIRE_INGEST_BATCH_SIZE,
+                            help='Readings per INSERT (default: SOLIRE_INGEST_BATCH_SIZE)')
+        parser.add_argument('--flush-interval', type=float, default=1.0,
+                            help='Longest time in seconds a reading waits to be stored (default: 1.0)')
+        parser.add_argument('--max-buffer', type=int, default=None,
+                            help='Readings buffered before the broker is slowed down (default: 10 batches)')
+        parser.add_argument('--spool-path', default=settings.SOLIRE_MQTT_SPOOL_PATH,
+                            help='File keeping the readings that could not be stored at shutdown '
+                                 '(default: SOLIRE_MQTT_SPOOL_PATH)')
+
+    def handle(self, *args, **options):
+        try:
+            client = create_mqtt_client(options['client_id'])
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        if settings.SOLIRE_MQTT_USERNAME:
+            client.username_pw_set(settings.SOLIRE_MQTT_USERNAME, settings.SOLIRE_MQTT_PASSWORD)
+
+        worker = MqttIngestWorker(
+            client,
+            topic=options['topic'],
+            batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'],
+            max_buffer=options['max_buffer'],
+            on_batch=self.store_recommendations,
+            spool_path=options['spool_path'],
+            log=self.stdout.write,
+        )
+
+        # Ctrl+C and a service manager's SIGTERM both flush what is buffered first
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+        signal.signal(signal.SIGINT, lambda *_: worker.stop())
+
+        self.stdout.write(f"Ingesting '{options['topic']}' from {options['host']}:{options['port']}")
+        worker.run(options['host'], options['port'])
+        self.stdout.write(
+            f"Stopped: {worker.inserted} readings stored, {worker.rejected} rejected of {worker.received}"
+        )
+
+    def store_recommendations(self, created):
+        try:
+            store_recommendations(created)
+        except Exception:
+            logger.exception("Could not store the recommendations of %d readings", len(created))
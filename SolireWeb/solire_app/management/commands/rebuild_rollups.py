@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from solire_app.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the hourly and daily rollups from every stored SoilCondition. "
+        "Run it once for the history stored before the rollups existed; new "
+        "readings keep them up to date on their own."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_rollups()
+        self.stdout.write(f"Wrote {written} rollups in {time.perf_counter() - started:.2f}s")
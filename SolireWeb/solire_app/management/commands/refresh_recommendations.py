@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from solire_app.models import SoilCondition
+from solire_app.recommendations import refresh_recommendations, stale_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored recommendation of every SoilCondition that has none "
+        "for the current fuzzy rule set, e.g. after the rules changed. Run it "
+        "after deploys (or from cron) so reads never have to catch up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes, 0 scores in this process (default: SOLIRE_BULK_WORKERS)')
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every row, not only the missing or stale ones')
+
+    def handle(self, *args, **options):
+        soil_conditions = SoilCondition.objects.all()
+        if not options['all']:
+            soil_conditions = stale_recommendations(soil_conditions)
+
+        started = time.perf_counter()
+        refreshed = refresh_recommendations(soil_conditions, options['workers'])
+        self.stdout.write(f"Refreshed {refreshed} recommendations in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the shared fuzzy system ahead of traffic: write the compiled rule "
+        "base, build the lookup table if it is enabled and run a first "
+        "recommendation. Run it at deploy time so workers start warm."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        from solire_app.recommendations import fuzzy_system_instance
+
+        # Any attribute access builds the lazy instance
+        fingerprint = fuzzy_system_instance.fingerprint
+        built = time.perf_counter()
+        self.stdout.write(f"Fuzzy system {fingerprint} ready in {built - started:.3f}s")
+
+        if settings.SOLIRE_FUZZY_COMPILED_PATH is not None:
+            fuzzy_system_instance.save_compiled(settings.SOLIRE_FUZZY_COMPILED_PATH)
+            self.stdout.write(f"Compiled rule base written to {settings.SOLIRE_FUZZY_COMPILED_PATH}")
+
+        if fuzzy_system_instance.lookup_table is not None:
+            self.stdout.write(f"Lookup table at {fuzzy_system_instance.lookup_table.path}")
+
+        fuzzy_system_instance.get_plant_recommendation(6.5, 26, 70)
+        self.stdout.write(f"First recommendation took {time.perf_counter() - built:.3f}s")
@@ -0,0 +1,228 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Upper bounds of the duration buckets, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the query count buckets
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Prometheus histogram with labels, kept in this process
+
+    Each label combination counts its observations per bucket (cumulated
+    when exposed), their sum and their number. Every worker process of a
+    deployment keeps its own, so scrape each of them.
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        """Lines of the Prometheus text format"""
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(
+                (labels, (list(counts), total, count)) for labels, (counts, total, count) in self._series.items()
+            )
+
+        for labels, (counts, total, count) in series:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            separator = ',' if label_text else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text}{separator}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text}{separator}le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {_format_value(total)}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    'solire_request_duration_seconds', 'Time to build the response of a request, by view',
+    ('view', 'method', 'status'), DURATION_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    'solire_db_queries', 'Database queries run by a request, by view',
+    ('view',), COUNT_BUCKETS,
+)
+DB_DURATION = Histogram(
+    'solire_db_duration_seconds', 'Time a request spent in database queries, by view',
+    ('view',), DURATION_BUCKETS,
+)
+FUZZY_DURATION = Histogram(
+    'solire_fuzzy_duration_seconds',
+    'Time a request spent in get_plant_recommendation and get_plant_recommendation_batch, by view',
+    ('view',), DURATION_BUCKETS,
+)
+
+HISTOGRAMS = (REQUEST_DURATION, DB_QUERIES, DB_DURATION, FUZZY_DURATION)
+
+
+def expose():
+    """Every metric in the Prometheus text format"""
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.expose())
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    """What one request spent its time on, filled in by the hooks below"""
+
+    __slots__ = ('queries', 'db_time', 'fuzzy_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.fuzzy_time = 0.0
+
+
+# Stats of the request being handled. A context variable rather than a
+# thread local, so sync_to_async threads and the async views' fuzzy
+# executor add to the request that started them.
+_request_stats = contextvars.ContextVar('solire_request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting and timing the queries of the current request"""
+
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver adding record_query() to a database connection"""
+
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def record_fuzzy_time(method_name, seconds):
+    """PlantRecommendationFuzzySystem timer adding to the current request's fuzzy time"""
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.fuzzy_time += seconds
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, database queries and fuzzy time of every request
+
+    Requests are labelled with the name of their URL pattern (e.g.
+    solire_app:list_data), or 'unmatched'. A streamed response is measured
+    until the view returns it, not until its last byte. Fuzzy time includes
+    the chunks scored in BulkRecommendationRunner's worker processes, which
+    report their time back; summed over parallel workers it can exceed the
+    request's duration. With SOLIRE_METRICS_SERVER_TIMING the numbers are
+    also sent in a Server-Timing header, which browsers show in their
+    developer tools.
+
+    Off unless SOLIRE_METRICS_ENABLED: timing every query and fuzzy call
+    adds a measurable share to short requests.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SOLIRE_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        # Connections opened from now on, and the ones already open here
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(None, connection)
+        self.get_response = get_response
+        self.server_timing = settings.SOLIRE_METRICS_SERVER_TIMING
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, stats, duration):
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unmatched'
+
+        REQUEST_DURATION.observe(duration, view, request.method, response.status_code)
+        DB_QUERIES.observe(stats.queries, view)
+        DB_DURATION.observe(stats.db_time, view)
+        FUZZY_DURATION.observe(stats.fuzzy_time, view)
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'total;dur={duration * 1e3:.2f}, '
+                f'db;dur={stats.db_time * 1e3:.2f};desc="{stats.queries} queries", '
+                f'fuzzy;dur={stats.fuzzy_time * 1e3:.2f}'
+            )
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solire_app', '0007_alter_soilcondition_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoilRecommendation',
+            fields=[
+                ('soil_condition', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation', serialize=False, to='solire_app.soilcondition')),
+                ('recommended_plants', models.TextField()),
+                ('rule_set_version', models.CharField(db_index=True, max_length=64)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solire_app', '0008_soilrecommendation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='soilcondition',
+            index=models.Index(fields=['timestamps', 'id'], name='soilcondition_timestamps_id'),
+        ),
+    ]
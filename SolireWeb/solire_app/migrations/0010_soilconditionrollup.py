@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solire_app', '0009_soilcondition_soilcondition_timestamps_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoilConditionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField()),
+                ('ph_sum', models.FloatField()),
+                ('ph_min', models.FloatField()),
+                ('ph_max', models.FloatField()),
+                ('temperature_sum', models.FloatField()),
+                ('temperature_min', models.FloatField()),
+                ('temperature_max', models.FloatField()),
+                ('moisture_sum', models.BigIntegerField()),
+                ('moisture_min', models.IntegerField()),
+                ('moisture_max', models.IntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket'), name='soilconditionrollup_period_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def latest_reading_of_existing_data(apps, schema_editor):
+    # Every reading so far has the default device id
+    SoilCondition = apps.get_model('solire_app', 'SoilCondition')
+    DeviceLatestReading = apps.get_model('solire_app', 'DeviceLatestReading')
+    latest = SoilCondition.objects.order_by('-timestamps', '-id').first()
+    if latest is not None:
+        DeviceLatestReading.objects.create(
+            device_id=latest.device_id, soil_condition=latest, timestamps=latest.timestamps
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solire_app', '0011_datasetversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceLatestReading',
+            fields=[
+                ('device_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('timestamps', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='soilcondition',
+            name='device_id',
+            field=models.CharField(default='SolireSense', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='soilcondition',
+            index=models.Index(fields=['device_id', 'timestamps', 'id'], name='soilcondition_device_ts_id'),
+        ),
+        migrations.AddField(
+            model_name='devicelatestreading',
+            name='soil_condition',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='solire_app.soilcondition'),
+        ),
+        migrations.RunPython(latest_reading_of_existing_data, migrations.RunPython.noop),
+    ]
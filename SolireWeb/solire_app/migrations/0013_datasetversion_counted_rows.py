@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('solire_app', '0012_soilcondition_device_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetversion',
+            name='counted_last_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='datasetversion',
+            name='counted_rows',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,14 +1,115 @@
 from django.db import models
 
+# Device of the readings stored before probes sent their own id, and of
+# readings that still come without one: the firmware's original MQTT_ID
+DEFAULT_DEVICE_ID = 'SolireSense'
+
 
 class SoilCondition(models.Model):
     id = models.AutoField(primary_key=True)
+    device_id = models.CharField(max_length=64, default=DEFAULT_DEVICE_ID)
     ph_value = models.FloatField()
     temperature_value = models.FloatField()
     moisture_value = models.IntegerField()
     # rgb_value = models.IntegerField()
     timestamps = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Time ordered reads and keyset pagination, see pagination.keyset_page()
+            models.Index(fields=['timestamps', 'id'], name='soilcondition_timestamps_id'),
+            # The same for the readings of one device
+            models.Index(fields=['device_id', 'timestamps', 'id'], name='soilcondition_device_ts_id'),
+        ]
+
     def __str__(self):
         # return str(self.id + self.ph_value + self.temperature_value + self.moisture_value + self.rgb_value)
-        return str(self.id + self.ph_value + self.temperature_value + self.moisture_value)
\ No newline at end of file
+        return str(self.id + self.ph_value + self.temperature_value + self.moisture_value)
+
+class SoilRecommendation(models.Model):
+    """Plant recommendation of a SoilCondition, computed once when it is stored"""
+
+    soil_condition = models.OneToOneField(
+        SoilCondition, on_delete=models.CASCADE, primary_key=True, related_name='recommendation'
+    )
+    recommended_plants = models.TextField()
+    # PlantRecommendationFuzzySystem.rule_set_version the text was computed
+    # with; rows with another version are recomputed
+    rule_set_version = models.CharField(max_length=64, db_index=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.recommended_plants
+
+
+class DeviceLatestReading(models.Model):
+    """
+    Newest SoilCondition of each device
+
+    Updated as readings are stored (see devices.update_latest_readings()),
+    so the current state of every probe is one row per device instead of a
+    search through all the readings.
+    """
+
+    device_id = models.CharField(max_length=64, primary_key=True)
+    soil_condition = models.ForeignKey(SoilCondition, on_delete=models.CASCADE, related_name='+')
+    # Copy of soil_condition.timestamps, to compare with new readings
+    timestamps = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.device_id}: {self.soil_condition_id}"
+
+
+class SoilConditionRollup(models.Model):
+    """
+    Count, sum, min and max of the SoilConditions of one hour or day
+
+    Kept up to date as readings are stored (see rollups.add_to_rollups()),
+    so charts over long ranges read one row per bucket instead of every
+    reading. The mean of a metric is its sum / count.
+    """
+
+    PERIOD_CHOICES = [('hour', 'Hour'), ('day', 'Day')]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    # Start of the hour or day
+    bucket = models.DateTimeField()
+    count = models.IntegerField()
+    ph_sum = models.FloatField()
+    ph_min = models.FloatField()
+    ph_max = models.FloatField()
+    temperature_sum = models.FloatField()
+    temperature_min = models.FloatField()
+    temperature_max = models.FloatField()
+    moisture_sum = models.BigIntegerField()
+    moisture_min = models.IntegerField()
+    moisture_max = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'bucket'], name='soilconditionrollup_period_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.bucket}: {self.count} readings"
+
+
+class DatasetVersion(models.Model):
+    """
+    Single row counting the writes to the stored readings
+
+    Bumped by every insert and clear (see caching.bump_data_version()), it
+    is the ETag / Last-Modified of the list endpoints and part of their
+    cache keys, so a changed dataset never serves an old response.
+    """
+
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Exact SoilCondition count and largest id, taken after retention
+    # deleted readings out of id order (see retention.expire_readings());
+    # None until then, and again after a clear
+    counted_rows = models.BigIntegerField(null=True, blank=True)
+    counted_last_id = models.BigIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"v{self.version} ({self.updated_at})"
@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.db import DatabaseError
+
+from .ingest import ReadingError, ingest_readings
+
+logger = logging.getLogger(__name__)
+
+
+def create_mqtt_client(client_id):
+    """
+    A paho-mqtt client with a persistent session
+
+    With clean_session off the broker keeps the subscription and queues QoS 1
+    messages while the worker is down or reconnecting, so none are lost.
+    """
+
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        raise ImportError("MQTT ingestion needs paho-mqtt (pip install paho-mqtt)") from None
+
+    if hasattr(mqtt, 'CallbackAPIVersion'):
+        # paho-mqtt 2.x
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id, clean_session=False)
+    return mqtt.Client(client_id=client_id, clean_session=False)
+
+
+class MqttIngestWorker:
+    """
+    Store the readings published to an MQTT topic as SoilConditions
+
+    Messages are buffered as they arrive and flushed to the database in
+    batches, one bulk INSERT per flush, when batch_size messages are waiting
+    or flush_interval seconds after the first of them arrived. Payloads are
+    validated like insert_data (extra keys the firmware sends, such as
+    temperature_f or ph_adc, are ignored).
+
+    The buffer holds at most max_buffer messages. When it is full, e.g. while
+    the database is unavailable, the client's network thread blocks on it,
+    so the broker stops delivering instead of the worker growing without
+    bound. A failed flush is retried with backoff and keeps its messages.
+    Dropped connections are re-established by the client's network loop and
+    the topic is subscribed again on every connect.
+
+    The broker considers a message delivered once on_message returned, so
+    buffered messages are the worker's to keep. Those it cannot store when
+    it stops (the database is down, or stop() interrupted a retry) are
+    appended to spool_path and stored first on the next run().
+
+    Parameters:
+    client: paho-mqtt Client, or anything with its interface (e.g. the
+        in-process tests.FakeMqttClient)
+    topic (str): Topic the sensors publish to
+    qos (int): Subscription QoS
+    batch_size (int): Messages per flush
+    flush_interval (float): Longest time in seconds a message waits for its flush
+    max_buffer (int): Messages buffered before the client is blocked,
+        defaults to 10 batches
+    on_batch (callable): Called with each list of stored SoilConditions
+    spool_path (str or Path): File keeping the messages that could not be
+        stored at shutdown, one JSON string per line; None drops them
+    log (callable): Called with progress messages, defaults to the module
+        logger's info(); errors always go to the logger
+    """
+
+    def __init__(self, client, topic='Sensors', qos=1, batch_size=500, flush_interval=1.0, max_buffer=None,
+                 on_batch=None, spool_path=None, log=None):
+        if batch_size <= 0:
+            raise ValueError("Batch size must be a positive integer")
+
+        self.client = client
+        self.topic = topic
+        self.qos = qos
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_batch = on_batch
+        self.spool_path = spool_path
+        self.log = log or logger.info
+        self.received = 0
+        self.inserted = 0
+        self.rejected = 0
+        self._buffer = queue.Queue(maxsize=max_buffer or 10 * batch_size)
+        self._stop = threading.Event()
+
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+
+    # Callbacks run in the client's network thread; they take *args to fit
+    # both the paho-mqtt 1.x and 2.x signatures
+
+    def _on_connect(self, client, userdata, flags, reason_code, *args):
+        if reason_code != 0:
+            logger.error("Connection to the MQTT broker refused: %s", reason_code)
+            return
+        self.log(f"Connected, subscribing to '{self.topic}'")
+        client.subscribe(self.topic, qos=self.qos)
+
+    def _on_disconnect(self, client, userdata, *args):
+        if not self._stop.is_set():
+            logger.warning("Disconnected from the MQTT broker, reconnecting")
+
+    def _on_message(self, client, userdata, message):
+        # Blocks while the buffer is full, which is the backpressure
+        while not self._stop.is_set():
+            try:
+                self._buffer.put(message.payload, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def stop(self):
+        """Make run() flush what is buffered and return; safe from any thread"""
+
+        self._stop.set()
+
+    def run(self, host, port=1883, keepalive=60):
+        """Store the spooled readings, then connect and store incoming ones until stop() is called"""
+
+        # Before connecting, so the broker keeps the new messages meanwhile
+        self._replay_spool()
+
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.client.connect_async(host, port, keepalive)
+        self.client.loop_start()
+        try:
+            while not self._stop.is_set():
+                self._flush(self._next_batch())
+        finally:
+            self.client.loop_stop()
+            self.client.disconnect()
+            # What arrived before the loop stopped is still stored
+            batch = []
+            while True:
+                try:
+                    batch.append(self._buffer.get_nowait())
+                except queue.Empty:
+                    break
+            for start in range(0, len(batch), self.batch_size):
+                self._flush(batch[start:start + self.batch_size], retry=False)
+
+    def _spool(self, payloads):
+        """Append payloads the database did not take to the spool file"""
+
+        with open(self.spool_path, 'a', encoding='utf-8') as spool:
+            for payload in payloads:
+                if isinstance(payload, bytes):
+                    payload = payload.decode('utf-8', errors='replace')
+                spool.write(json.dumps(payload) + '\n')
+
+    def _replay_spool(self):
+        """Store what the last run() spooled"""
+
+        if self.spool_path is None:
+            return
+
+        # Moved aside first, so what fails again is spooled anew instead of
+        # into the file being read. A replay file left by a crash is stored
+        # again too, which may duplicate readings but loses none.
+        replay_path = f'{self.spool_path}.replay'
+        if os.path.exists(self.spool_path):
+            with open(self.spool_path, encoding='utf-8') as spool, open(replay_path, 'a', encoding='utf-8') as replay:
+                replay.write(spool.read())
+            os.remove(self.spool_path)
+        if not os.path.exists(replay_path):
+            return
+
+        with open(replay_path, encoding='utf-8') as replay:
+            payloads = [json.loads(line) for line in replay if line.strip()]
+        self.log(f"Storing {len(payloads)} spooled readings")
+        for start in range(0, len(payloads), self.batch_size):
+            self._flush(payloads[start:start + self.batch_size])
+        os.remove(replay_path)
+
+    def _next_batch(self):
+        """Wait for the first message, then collect up to batch_size until flush_interval ran out"""
+
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            timeout = 0.5 if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._buffer.get(timeout=min(timeout, 0.5)))
+            except queue.Empty:
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _flush(self, payloads, retry=True):
+        if not payloads:
+            return
+
+        readings = []
+        for index, payload in enumerate(payloads):
+            try:
+                readings.append((index, json.loads(payload)))
+            except ValueError as e:
+                readings.append((index, ReadingError(f'Invalid JSON: {e}')))
+
+        delay = 1
+        while True:
+            try:
+                # The whole batch is one bulk_create, so a failed flush
+                # stored nothing and can simply be retried
+                received, inserted, errors = ingest_readings(readings, batch_size=len(readings),
+                                                             on_batch=self.on_batch)
+                break
+            except DatabaseError as e:
+                if not retry or self._stop.is_set():
+                    if self.spool_path is None:
+                        logger.error("Dropped %d readings, could not store them: %s", len(readings), e)
+                    else:
+                        logger.error("Spooled %d readings to %s, could not store them: %s",
+                                     len(readings), self.spool_path, e)
+                        self._spool(payloads)
+                    return
+                logger.warning("Could not store %d readings, retrying in %ds: %s", len(readings), delay, e)
+                self._stop.wait(delay)
+                delay = min(delay * 2, 60)
+
+        self.received += received
+        self.inserted += inserted
+        self.rejected += len(errors)
+        for error in errors:
+            logger.warning("Rejected reading: %s", error['error'])
+        self.log(f"Stored {inserted} of {received} readings")
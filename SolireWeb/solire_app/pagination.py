@@ -0,0 +1,149 @@
+import base64
+import json
+
+from django.db import connection
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 100
+
+MAX_PAGE_SIZE = 1000
+
+# Tables estimated below this many rows are counted exactly
+EXACT_COUNT_LIMIT = 10000
+
+
+def encode_cursor(timestamps, id):
+    """Opaque cursor pointing just past the row with this (timestamps, id)"""
+
+    payload = json.dumps([timestamps.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamps, id) of a cursor made by encode_cursor(), ValueError if it is malformed"""
+
+    try:
+        timestamps, id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        timestamps = parse_datetime(timestamps)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+
+    if timestamps is None or not isinstance(id, int):
+        raise ValueError("Invalid cursor")
+    return timestamps, id
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Page size from a query parameter, ValueError unless it is 1..MAX_PAGE_SIZE"""
+
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"limit must be an integer between 1 and {MAX_PAGE_SIZE}") from None
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be an integer between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def _page_queryset(queryset, cursor, limit, descending, offset=0):
+    """The rows of a page plus one, which tells whether another page follows"""
+
+    if descending:
+        queryset = queryset.order_by('-timestamps', '-id')
+    else:
+        queryset = queryset.order_by('timestamps', 'id')
+
+    if cursor is not None:
+        timestamps, id = decode_cursor(cursor)
+        # (timestamps, id) < (cursor) written as a range on the leading index
+        # column, which every database turns into an index seek
+        if descending:
+            queryset = queryset.filter(timestamps__lte=timestamps).exclude(timestamps=timestamps, id__gte=id)
+        else:
+            queryset = queryset.filter(timestamps__gte=timestamps).exclude(timestamps=timestamps, id__lte=id)
+
+    return queryset[offset:offset + limit + 1]
+
+
+def _page(rows, limit):
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    if isinstance(last, dict):
+        return rows, encode_cursor(last['timestamps'], last['id'])
+    return rows, encode_cursor(last.timestamps, last.id)
+
+
+def keyset_page(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True, offset=0):
+    """
+    One page of a SoilCondition queryset in (timestamps, id) order
+
+    Instead of an OFFSET, the page starts right after the row the cursor
+    points at and is read through the (timestamps, id) index, so a page costs
+    the same on a thousand rows or tens of millions. Rows inserted while a
+    client pages through never shift or repeat its pages.
+
+    Parameters:
+    queryset (QuerySet): SoilConditions, as model instances or values() with
+        'timestamps' and 'id'
+    cursor (str): next_cursor of the previous page, None for the first page
+    limit (int): Rows per page
+    descending (bool): Newest first (the default) or oldest first
+    offset (int): Rows to skip after the cursor. Only for jumping to a page
+        without its cursor (e.g. the last one): skipped rows are still read,
+        so an offset page costs more the deeper it is.
+
+    Returns:
+    tuple: (list of rows, cursor of the next page or None on the last page)
+    """
+
+    return _page(list(_page_queryset(queryset, cursor, limit, descending, offset)), limit)
+
+
+async def akeyset_page(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """Async version of keyset_page(), reading the page with the async ORM"""
+
+    rows = [row async for row in _page_queryset(queryset, cursor, limit, descending)]
+    return _page(rows, limit)
+
+
+def estimated_count(model, counted=None):
+    """
+    (number of rows of a model's table, whether it is an estimate)
+
+    Small tables are counted exactly. On large ones a full COUNT(*) reads
+    every row, so PostgreSQL's planner statistics are used instead, and on
+    other databases the span of the auto-increment primary key, which is
+    exact as long as rows are only ever deleted oldest first.
+
+    Deletes that leave older rows behind make that span overstate the
+    count. For them, counted is an exact (row count, largest pk) taken after
+    the deletes, and the estimate is that count plus the pks allocated since.
+    """
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+            row = cursor.fetchone()
+        if row is not None and row[0] >= EXACT_COUNT_LIMIT:
+            return row[0], True
+    else:
+        # Separate queries, so each is a single index seek (SQLite only
+        # optimizes a lone MIN() or MAX())
+        last = model.objects.aggregate(last=Max('pk'))['last']
+        if last is None:
+            return 0, False
+        if counted is not None:
+            rows, counted_last = counted
+            estimate = rows + max(last - counted_last, 0)
+        else:
+            estimate = last - model.objects.aggregate(first=Min('pk'))['first'] + 1
+        if estimate >= EXACT_COUNT_LIMIT:
+            return estimate, True
+
+    return model.objects.count(), False
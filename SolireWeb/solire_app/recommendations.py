@@ -0,0 +1,308 @@
+import itertools
+import logging
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics
+from .models import SoilRecommendation
+
+logger = logging.getLogger(__name__)
+
+
+def _create_fuzzy_system():
+    """Build the shared fuzzy system with the engine options from settings"""
+
+    # Imported here so numpy / skfuzzy are only loaded once something needs them
+    from .helpers.fuzzy_logic import PlantRecommendationFuzzySystem
+
+    fuzzy_system = PlantRecommendationFuzzySystem(
+        settings.SOLIRE_FUZZY_COMPILED_PATH, settings.SOLIRE_FUZZY_DEFUZZIFIER
+    )
+    if settings.SOLIRE_FUZZY_LOOKUP_TABLE:
+        fuzzy_system.enable_lookup_table(settings.SOLIRE_FUZZY_LOOKUP_DIR, settings.SOLIRE_FUZZY_LOOKUP_STEPS)
+    if settings.SOLIRE_FUZZY_CACHE_SIZE:
+        fuzzy_system.enable_cache(settings.SOLIRE_FUZZY_CACHE_SIZE, settings.SOLIRE_FUZZY_CACHE_PRECISION)
+    # Only adds up inside requests that MetricsMiddleware measures
+    fuzzy_system.set_timer(metrics.record_fuzzy_time)
+    return fuzzy_system
+
+
+# Initialize the fuzzy system globally or as a singleton
+# This avoids re-initializing the system on every request, which can be slow.
+# It is created on first use, so importing this module or the views (worker
+# boot, migrate and other manage.py commands) does not pay for it.
+fuzzy_system_instance = SimpleLazyObject(_create_fuzzy_system)
+
+
+def invalid_reasons(sc):
+    """Reasons a stored reading cannot be fed to the fuzzy system"""
+
+    reasons = []
+    if not (0.0 <= sc.ph_value <= 14.0):
+        reasons.append("pH out of range (0-14)")
+    if not (0 <= sc.temperature_value <= 50):
+        reasons.append("Temperature out of range (0-50°C)")
+    if not (0 <= sc.moisture_value <= 100):
+        reasons.append("Moisture out of range (0-100%)")
+
+    # Special case for 0 moisture, as it often means 'no data' or extremely dry
+    if sc.moisture_value == 0:
+        reasons.append("Moisture is 0%")
+
+    # Special case for pH of 0, as it often means 'no data' or extremely acidic
+    if sc.ph_value == 0:
+        reasons.append("pH is 0")
+
+    # Special case for temperature of 0, as it often means 'no data' or extremely cold
+    if sc.temperature_value == 0:
+        reasons.append("Temperature is 0°C")
+
+    return reasons
+
+
+def format_recommended_plants(recommended_plants):
+    """Render a get_plant_recommendation result as the 'Recommended Plants' text"""
+
+    if recommended_plants and recommended_plants['all_plants']:
+        recommended_plants_str = ', '.join([
+            f"{plant['plant']} [{plant['suitability_score']:.2f}, {plant['confidence']}]({plant['status']})"
+            for plant in recommended_plants['all_plants']
+        ])
+        # If all suitability scores are very low after processing
+        if all(plant['suitability_score'] < 0.1 for plant in recommended_plants['all_plants']):
+            recommended_plants_str += " (Note: All plants show very low suitability.)"
+        return recommended_plants_str
+
+    return "N/A - No plant recommendations found (possibly due to rule non-firing)."
+
+
+def score_recommended_plants(soil_conditions):
+    """
+    'Recommended Plants' text for every SoilCondition, in order.
+
+    Valid readings are scored together in one vectorized pass instead of
+    running the skfuzzy simulators row by row. Errors from the fuzzy system
+    are raised, see recommended_plants_strings() for the tolerant version.
+    """
+
+    recommended_plants_strs = []
+    valid_indexes = []
+    for index, sc in enumerate(soil_conditions):
+        reasons = invalid_reasons(sc)
+        if reasons:
+            recommended_plants_strs.append(f"Invalid Input: {'; '.join(reasons)}. No recommendation.")
+        else:
+            recommended_plants_strs.append("")
+            valid_indexes.append(index)
+
+    if not valid_indexes:
+        return recommended_plants_strs
+
+    # Pass parameters in the correct order: (pH, Temperature, Moisture)
+    recommendations = fuzzy_system_instance.get_plant_recommendation_batch(
+        [float(soil_conditions[index].ph_value) for index in valid_indexes],
+        [soil_conditions[index].temperature_value for index in valid_indexes],
+        [soil_conditions[index].moisture_value for index in valid_indexes],
+    )
+    for index, recommended_plants in zip(valid_indexes, recommendations):
+        recommended_plants_strs[index] = format_recommended_plants(recommended_plants)
+
+    return recommended_plants_strs
+
+
+def recommended_plants_strings(soil_conditions):
+    """'Recommended Plants' text for every SoilCondition, with errors reported in the text"""
+
+    try:
+        return score_recommended_plants(soil_conditions)
+
+    except ValueError as ve:  # Catch validation errors from fuzzy system's internal checks
+        logger.exception("Fuzzy system input validation failed")
+        error = f"Fuzzy Logic Input Error: {str(ve)}"
+    except Exception as e:
+        logger.exception("General error in get_plant_recommendation_batch")
+        error = f"Error in recommendation logic: {str(e)}"
+
+    return [
+        f"Invalid Input: {'; '.join(reasons)}. No recommendation." if reasons else error
+        for reasons in map(invalid_reasons, soil_conditions)
+    ]
+
+
+def _reading(sc):
+    """(pH, Temperature, Moisture) of a SoilCondition, or None if it is invalid"""
+
+    if invalid_reasons(sc):
+        return None
+    return float(sc.ph_value), sc.temperature_value, sc.moisture_value
+
+
+def _bulk_runner(workers=None):
+    """BulkRecommendationRunner configured from settings"""
+
+    from .helpers.bulk_recommendations import BulkRecommendationRunner
+
+    return BulkRecommendationRunner(
+        workers=settings.SOLIRE_BULK_WORKERS if workers is None else workers,
+        compiled_path=settings.SOLIRE_FUZZY_COMPILED_PATH,
+        defuzzifier=settings.SOLIRE_FUZZY_DEFUZZIFIER,
+        lookup_dir=settings.SOLIRE_FUZZY_LOOKUP_DIR if settings.SOLIRE_FUZZY_LOOKUP_TABLE else None,
+        lookup_steps=settings.SOLIRE_FUZZY_LOOKUP_STEPS,
+        timer=metrics.record_fuzzy_time,
+    )
+
+
+def _iter_recommended_plants_strings(soil_conditions, runner):
+    """Yield (SoilCondition, 'Recommended Plants' text) in order, scored by a BulkRecommendationRunner"""
+
+    for sc, recommended_plants in runner.recommendations(soil_conditions, reading=_reading):
+        if recommended_plants is None:
+            yield sc, f"Invalid Input: {'; '.join(invalid_reasons(sc))}. No recommendation."
+        else:
+            yield sc, format_recommended_plants(recommended_plants)
+
+
+def save_recommendations(rows, version):
+    """Insert or update the SoilRecommendation of every (SoilCondition, text) pair"""
+
+    recommendations = [
+        SoilRecommendation(soil_condition=sc, recommended_plants=recommended_plants_str, rule_set_version=version)
+        for sc, recommended_plants_str in rows
+    ]
+    SoilRecommendation.objects.bulk_create(
+        recommendations,
+        update_conflicts=True,
+        unique_fields=['soil_condition'],
+        update_fields=['recommended_plants', 'rule_set_version', 'computed_at'],
+    )
+    for recommendation in recommendations:
+        recommendation.soil_condition.recommendation = recommendation
+
+
+def store_recommendations(soil_conditions):
+    """
+    Compute and save the recommendation of every SoilCondition
+
+    Errors from the fuzzy system are raised, so they are never stored.
+    """
+
+    version = fuzzy_system_instance.rule_set_version
+    save_recommendations(zip(soil_conditions, score_recommended_plants(soil_conditions)), version)
+
+
+def stale_recommendations(soil_conditions):
+    """The SoilConditions of a queryset without a recommendation for the current rule set"""
+
+    return soil_conditions.exclude(recommendation__rule_set_version=fuzzy_system_instance.rule_set_version)
+
+
+def refresh_recommendations(soil_conditions, workers=None):
+    """
+    Recompute and save the recommendations of a queryset
+
+    Scored through the process pool with workers (SOLIRE_BULK_WORKERS by
+    default), or by the shared fuzzy system with 0.
+
+    Returns:
+    int: Number of rows refreshed
+    """
+
+    version = fuzzy_system_instance.rule_set_version
+    workers = settings.SOLIRE_BULK_WORKERS if workers is None else workers
+    refreshed = 0
+    last_id = None
+    with _bulk_runner(workers) as runner:
+        batch_size = runner.chunk_size * runner.max_pending
+        while True:
+            # Read by id ranges rather than through one open cursor, since the
+            # recommendations are written while reading
+            batch = soil_conditions.order_by('id')
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            batch = list(batch[:batch_size])
+            if not batch:
+                return refreshed
+
+            if workers:
+                rows = _iter_recommended_plants_strings(batch, runner)
+            else:
+                rows = zip(batch, score_recommended_plants(batch))
+            save_recommendations(rows, version)
+            refreshed += len(batch)
+            last_id = batch[-1].id
+
+
+def rows_with_recommendations(soil_conditions, version, store=True):
+    """
+    Attach missing or stale recommendations to a list of SoilConditions
+
+    They are saved too, unless store is False (e.g. while a cursor is still
+    open on the table), in which case they are only computed.
+    """
+
+    def is_current(sc):
+        try:
+            return sc.recommendation.rule_set_version == version
+        except SoilRecommendation.DoesNotExist:
+            return False
+
+    stale = [sc for sc in soil_conditions if not is_current(sc)]
+    if stale and store:
+        try:
+            store_recommendations(stale)
+            stale = []
+        except Exception:
+            logger.exception("Could not store recommendations")
+    texts = dict(zip((sc.id for sc in stale), recommended_plants_strings(stale))) if stale else {}
+
+    for sc in soil_conditions:
+        yield sc, texts[sc.id] if sc.id in texts else sc.recommendation.recommended_plants
+
+
+def recommended_plants_rows(soil_conditions, chunk_size=2000):
+    """
+    Yield (SoilCondition, 'Recommended Plants' text) for a queryset, in order.
+
+    Texts come from the SoilRecommendation stored at ingest. Rows without one
+    for the current rule set (stored before the rules changed) are refreshed
+    first with refresh_recommendations(), through the process pool when
+    SOLIRE_BULK_WORKERS is set and there are at least SOLIRE_BULK_MIN_ROWS of
+    them, so nothing is written while the rows are read.
+    """
+
+    stale = stale_recommendations(soil_conditions)
+    workers = 0
+    if settings.SOLIRE_BULK_WORKERS and stale.count() >= settings.SOLIRE_BULK_MIN_ROWS:
+        workers = settings.SOLIRE_BULK_WORKERS
+    try:
+        refresh_recommendations(stale, workers)
+    except Exception:
+        logger.exception("Could not refresh recommendations")
+
+    version = fuzzy_system_instance.rule_set_version
+    rows = soil_conditions.select_related('recommendation').iterator(chunk_size=chunk_size)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        # Only rows the refresh could not score are still stale
+        yield from rows_with_recommendations(chunk, version, store=False)
+
+
+# Columns of the readings report (api/report/, in both formats, and the
+# export_recommendations command)
+REPORT_HEADER = ['#', 'Device', 'Temperature (C)', 'Moisture (%)', 'pH', 'Recommended Plants', 'Timestamps']
+
+
+def report_rows(soil_conditions, chunk_size=2000):
+    """Yield the report's data rows, reading the queryset a chunk at a time, see recommended_plants_rows()"""
+
+    rows = recommended_plants_rows(soil_conditions, chunk_size)
+    for number, (sc, recommended_plants_str) in enumerate(rows, start=1):
+        yield [
+            number,
+            sc.device_id,
+            sc.temperature_value,
+            sc.moisture_value,
+            float(sc.ph_value),
+            recommended_plants_str,
+            sc.timestamps.strftime('%d-%m-%Y %H:%M:%S'),
+        ]
@@ -0,0 +1,137 @@
+import gzip
+import json
+import os
+import time
+from itertools import groupby
+from pathlib import Path
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count, Max
+
+from .caching import bump_data_version
+from .models import DatasetVersion, DeviceLatestReading, SoilCondition, SoilRecommendation
+
+# SoilCondition columns written to the archives
+ARCHIVE_FIELDS = ('id', 'device_id', 'ph_value', 'temperature_value', 'moisture_value', 'timestamps')
+
+
+def archive_path(archive_dir, day):
+    """Archive file of the readings of one day"""
+
+    return Path(archive_dir) / f"soilconditions-{day.isoformat()}.ndjson.gz"
+
+
+def _append_to_archive(path, rows):
+    """
+    Append rows to a gzip compressed newline-delimited JSON file, durably
+
+    Each call adds a gzip member, which gzip / zcat and Python's gzip module
+    read as one stream, and the file is fsynced before returning, so the
+    rows are on disk before they are deleted.
+    """
+
+    lines = ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows).encode()
+    with open(path, 'ab') as archive:
+        with gzip.GzipFile(fileobj=archive, mode='ab') as compressed:
+            compressed.write(lines)
+        archive.flush()
+        os.fsync(archive.fileno())
+
+
+def _delete_soil_conditions(ids):
+    """
+    Delete SoilConditions and their recommendations by id
+
+    Straight DELETE statements: QuerySet.delete() would load every row into
+    Django's delete collector first, to find what cascades from it, which
+    took two thirds of the time. None of them is a device's latest reading.
+    The ids are bound a chunk at a time, as older SQLite builds allow no
+    more than 999 parameters per statement.
+    """
+
+    chunk_size = connection.features.max_query_params or len(ids)
+    table = connection.ops.quote_name(SoilCondition._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            # Nothing points to a recommendation, so this is a single DELETE already
+            SoilRecommendation.objects.filter(soil_condition_id__in=chunk).delete()
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+
+
+def _record_row_count():
+    """
+    Store the exact SoilCondition count and largest id in the DatasetVersion
+
+    The kept latest readings are older than rows that were deleted, so the
+    id span no longer matches the row count; pagination.estimated_count()
+    starts from this count instead. One full scan, once per run.
+    """
+
+    counted = SoilCondition.objects.aggregate(rows=Count('id'), last=Max('id'))
+    DatasetVersion.objects.filter(pk=1).update(counted_rows=counted['rows'], counted_last_id=counted['last'])
+
+
+def expire_readings(before, archive_dir, batch_size=2000, pause=0.0, log=None):
+    """
+    Archive and delete the SoilConditions stored before a date, a batch at a time
+
+    Every batch is appended to the archive file of its readings' day (see
+    archive_path()), then deleted with its recommendations in a short
+    transaction of its own, so writers only wait for one batch and no more
+    than batch_size rows are held in memory. The latest reading of each
+    device is kept, as are the rollups, which still cover the deleted
+    readings. A run interrupted between the two steps archives its last
+    batch again the next time; the ids tell the copies apart. At the end the
+    remaining readings are counted once, for the total of paged lists.
+
+    Parameters:
+    before (datetime): Readings with older timestamps expire
+    archive_dir (str or Path): Directory of the archive files, created if missing
+    batch_size (int): Rows archived and deleted per transaction
+    pause (float): Seconds to sleep between batches, to leave the database to other writers
+    log (callable): Called with a progress message after each batch
+
+    Returns:
+    tuple: (readings deleted, paths of the archive files written to)
+    """
+
+    Path(archive_dir).mkdir(parents=True, exist_ok=True)
+    expired = (
+        SoilCondition.objects
+        .filter(timestamps__lt=before)
+        .exclude(id__in=DeviceLatestReading.objects.values('soil_condition_id'))
+        .order_by('timestamps', 'id')
+        .values(*ARCHIVE_FIELDS)
+    )
+
+    deleted = 0
+    archives = set()
+    while True:
+        # Deleted rows are gone from the index, so each batch is the start of what is left
+        batch = list(expired[:batch_size])
+        if not batch:
+            break
+
+        for day, rows in groupby(batch, key=lambda row: row['timestamps'].date()):
+            path = archive_path(archive_dir, day)
+            _append_to_archive(path, rows)
+            archives.add(path)
+
+        with transaction.atomic():
+            _delete_soil_conditions([row['id'] for row in batch])
+            bump_data_version()
+        deleted += len(batch)
+
+        if log is not None:
+            log(f"Deleted {deleted} readings, up to {batch[-1]['timestamps']}")
+        if pause:
+            time.sleep(pause)
+
+    if deleted:
+        with transaction.atomic():
+            _record_row_count()
+            bump_data_version()
+
+    return deleted, sorted(archives)
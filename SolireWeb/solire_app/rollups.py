@@ -0,0 +1,110 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum, Value
+from django.db.models.functions import Greatest, Least, Trunc
+
+from .caching import bump_data_version
+from .models import SoilCondition, SoilConditionRollup
+
+PERIODS = ('hour', 'day')
+
+# Rollup field prefix -> SoilCondition field
+METRICS = {
+    'ph': 'ph_value',
+    'temperature': 'temperature_value',
+    'moisture': 'moisture_value',
+}
+
+
+def bucket_start(timestamps, period):
+    """Start of the hour or day a timestamp falls in"""
+
+    if period == 'hour':
+        return timestamps.replace(minute=0, second=0, microsecond=0)
+    return timestamps.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _totals(soil_conditions):
+    """{(period, bucket): {'count': n, 'ph_sum': ..., 'ph_min': ..., ...}} of some SoilConditions"""
+
+    totals = defaultdict(lambda: {'count': 0})
+    for sc in soil_conditions:
+        for period in PERIODS:
+            bucket = totals[period, bucket_start(sc.timestamps, period)]
+            first = bucket['count'] == 0
+            bucket['count'] += 1
+            for metric, field in METRICS.items():
+                value = getattr(sc, field)
+                if first:
+                    bucket[f'{metric}_sum'] = bucket[f'{metric}_min'] = bucket[f'{metric}_max'] = value
+                else:
+                    bucket[f'{metric}_sum'] += value
+                    bucket[f'{metric}_min'] = min(bucket[f'{metric}_min'], value)
+                    bucket[f'{metric}_max'] = max(bucket[f'{metric}_max'], value)
+    return totals
+
+
+def add_to_rollups(soil_conditions):
+    """
+    Add newly stored SoilConditions to the hourly and daily rollups
+
+    Each bucket they touch is updated in place with one UPDATE (count and
+    sums incremented, min / max widened), or created if it is new, so the
+    cost depends on the number of buckets, not on the history behind them.
+    Call it in the transaction that stores the readings, so both are
+    committed together.
+    """
+
+    for (period, bucket), totals in _totals(soil_conditions).items():
+        updates = {'count': F('count') + totals['count']}
+        for metric in METRICS:
+            updates[f'{metric}_sum'] = F(f'{metric}_sum') + Value(totals[f'{metric}_sum'])
+            updates[f'{metric}_min'] = Least(f'{metric}_min', Value(totals[f'{metric}_min']))
+            updates[f'{metric}_max'] = Greatest(f'{metric}_max', Value(totals[f'{metric}_max']))
+
+        rollups = SoilConditionRollup.objects.filter(period=period, bucket=bucket)
+        if rollups.update(**updates):
+            continue
+        try:
+            with transaction.atomic():
+                SoilConditionRollup.objects.create(period=period, bucket=bucket, **totals)
+        except IntegrityError:
+            # Another writer created the bucket in the meantime
+            rollups.update(**updates)
+
+
+def rebuild_rollups(batch_size=1000):
+    """
+    Recompute every rollup from the stored SoilConditions
+
+    Returns:
+    int: Number of rollup rows written
+    """
+
+    written = 0
+    with transaction.atomic():
+        SoilConditionRollup.objects.all().delete()
+        for period in PERIODS:
+            aggregates = {'count': Count('id')}
+            for metric, field in METRICS.items():
+                aggregates[f'{metric}_sum'] = Sum(field)
+                aggregates[f'{metric}_min'] = Min(field)
+                aggregates[f'{metric}_max'] = Max(field)
+
+            buckets = (
+                SoilCondition.objects
+                .annotate(bucket=Trunc('timestamps', period))
+                .values('bucket')
+                .annotate(**aggregates)
+                .order_by('bucket')
+            )
+            batch = []
+            for totals in buckets.iterator():
+                batch.append(SoilConditionRollup(period=period, **totals))
+                if len(batch) >= batch_size:
+                    written += len(SoilConditionRollup.objects.bulk_create(batch))
+                    batch = []
+            written += len(SoilConditionRollup.objects.bulk_create(batch))
+        bump_data_version()
+    return written
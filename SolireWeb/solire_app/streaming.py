@@ -0,0 +1,46 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_DONE = object()
+
+
+def is_asgi_request(request):
+    """Whether a request came through the ASGI handler (solire/asgi.py) rather than WSGI"""
+
+    return isinstance(request, ASGIRequest)
+
+
+async def aiterate(iterator):
+    """
+    Async iterator over a sync one, advancing it in the request's sync thread
+
+    Each next() runs through sync_to_async, so a database cursor the
+    iterator holds stays in the one thread (and connection) of its request.
+    That costs a thread switch per item, so items should be chunks of rows
+    rather than single rows.
+    """
+
+    iterator = iter(iterator)
+    next_item = sync_to_async(next)
+    try:
+        while (item := await next_item(iterator, _DONE)) is not _DONE:
+            yield item
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close)()
+
+
+def async_streaming(request, response):
+    """
+    A streaming response that streams under ASGI too
+
+    Under ASGI, Django reads a sync streaming_content whole into a list
+    before it sends the first byte, so a large report or export would sit in
+    memory until it is complete. When the request came through the ASGI
+    handler, the content is handed over a chunk at a time with aiterate()
+    instead. WSGI responses are returned unchanged.
+    """
+
+    if is_asgi_request(request) and not response.is_async:
+        response.streaming_content = aiterate(response.streaming_content)
+    return response
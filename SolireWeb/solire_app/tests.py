@@ -1,3 +1,1313 @@
-from django.test import TestCase
+import asyncio
+import collections
+import gzip
+import io
+import itertools
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from pyarrow import ipc
+
+from . import metrics, mqtt_ingest, pagination, recommendations, views
+from .caching import bump_data_version
+from .devices import update_latest_readings
+from .ingest import clean_reading, ingest_readings, store_reading
+from .helpers.bulk_recommendations import BulkRecommendationRunner
+from .helpers.fuzzy_cache import RecommendationCache
+from .helpers.fuzzy_logic import PlantRecommendationFuzzySystem
+from .helpers.fuzzy_lookup import RecommendationLookupTable
+from .models import DEFAULT_DEVICE_ID, DatasetVersion, DeviceLatestReading, SoilCondition, SoilConditionRollup, SoilRecommendation
+from .retention import expire_readings
+from .helpers.fuzzy_vectorized import BATCH_TOLERANCE, VectorizedMamdaniEngine
+
+# Readings the fuzzy paths are compared on: membership edges and plateaus,
+# zeros (the 'no data' readings) and values outside the input universes,
+# which skfuzzy clips
+FUZZY_GRID = list(itertools.product(
+    (-1.0, 0.0, 5.0, 6.2, 7.25, 15.5),
+    (0.0, 18.0, 22.5, 26.0, 31.0, 55.0),
+    (0.0, 45.0, 62.5, 70.0, 82.0, 120.0),
+))
+
+
+def _skfuzzy_scores(fuzzy_system, readings):
+    """Raw score of every plant per reading from the skfuzzy simulators, 0.0 where no rule fires"""
+
+    scores = np.zeros((len(readings), len(fuzzy_system.vectorized_engine.plant_names)))
+    for column, plant_name in enumerate(fuzzy_system.vectorized_engine.plant_names):
+        simulator = fuzzy_system.simulators[plant_name]
+        for row, (ph_value, temp_value, humidity_value) in enumerate(readings):
+            simulator.input['ph'] = ph_value
+            simulator.input['temperature'] = temp_value
+            simulator.input['humidity'] = humidity_value
+            try:
+                simulator.compute()
+                scores[row, column] = simulator.output[plant_name.lower()]
+            except (KeyError, ValueError):
+                # No rule fired, so there is no crisp output
+                continue
+    return scores
+
+
+class VectorizedEngineTests(SimpleTestCase):
+    """The vectorized engine against the skfuzzy control systems it replaces"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fuzzy_system = PlantRecommendationFuzzySystem()
+        cls.reference = _skfuzzy_scores(cls.fuzzy_system, FUZZY_GRID)
+
+    def test_batch_scores_match_skfuzzy(self):
+        plant_names, scores = self.fuzzy_system.score_plants_batch(*zip(*FUZZY_GRID))
+
+        self.assertEqual(plant_names, list(self.fuzzy_system.crop_rules))
+        self.assertEqual(scores.shape, self.reference.shape)
+        np.testing.assert_allclose(scores, self.reference, rtol=0, atol=BATCH_TOLERANCE)
+        # Some readings fire no rule at all, which both score 0.0
+        self.assertTrue((self.reference == 0.0).any())
+
+    def test_single_and_batch_recommendations_match_skfuzzy(self):
+        batch = self.fuzzy_system.get_plant_recommendation_batch(*zip(*FUZZY_GRID))
+        plant_names = self.fuzzy_system.vectorized_engine.plant_names
+
+        for reading, expected, recommendation in zip(FUZZY_GRID, np.round(self.reference, 3).tolist(), batch):
+            expected = dict(zip(plant_names, expected))
+            single = self.fuzzy_system.get_plant_recommendation(*reading)
+            for result in (single, recommendation):
+                scores = {plant['plant']: plant['suitability_score'] for plant in result['all_plants']}
+                self.assertEqual(scores, expected, reading)
+                self.assertEqual(
+                    [plant['suitability_score'] for plant in result['all_plants']],
+                    sorted(expected.values(), reverse=True),
+                )
+            self.assertEqual(single, recommendation)
+
+
+class AnalyticDefuzzifierTests(SimpleTestCase):
+    """The exact centroid against the sampled one on a much finer output universe"""
+
+    def test_matches_a_dense_centroid(self):
+        fuzzy_system = PlantRecommendationFuzzySystem(defuzzifier='analytic')
+        engine = fuzzy_system.vectorized_engine
+        # The output sets are piecewise linear, so interpolating them onto a
+        # finer universe keeps their shape; only the sampling error shrinks
+        universe = np.linspace(0, 1, 10001)
+        dense = VectorizedMamdaniEngine(
+            engine.inputs,
+            engine.rules,
+            {plant_name: (universe, {label: np.interp(universe, output_universe, mf) for label, mf in terms.items()})
+             for plant_name, (output_universe, terms) in engine.outputs.items()},
+        )
+
+        _, scores = fuzzy_system.score_plants_batch(*zip(*FUZZY_GRID))
+
+        np.testing.assert_allclose(scores, dense.score(*zip(*FUZZY_GRID)), rtol=0, atol=1e-7)
+        # Within the sampling error of the default centroid, but a different rule set version
+        centroid = PlantRecommendationFuzzySystem()
+        np.testing.assert_allclose(scores, centroid.score_plants_batch(*zip(*FUZZY_GRID))[1], rtol=0, atol=1e-3)
+        self.assertNotEqual(fuzzy_system.rule_set_version, centroid.rule_set_version)
+
+
+class LookupTableTests(SimpleTestCase):
+    """Scores interpolated from the precomputed grid against the engine's"""
+
+    # Coarser than DEFAULT_LOOKUP_STEPS so the table builds in about a second
+    STEPS = {'ph': 0.5, 'temperature': 1.0, 'humidity': 2.0}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.fuzzy_system = PlantRecommendationFuzzySystem()
+        cls.fuzzy_system.enable_lookup_table(cls.directory.name, cls.STEPS)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_grid_points_are_exact(self):
+        axes = self.fuzzy_system.lookup_table.axes
+        grid = [axis.ravel() for axis in np.meshgrid(axes['ph'], axes['temperature'], axes['humidity'],
+                                                      indexing='ij')]
+
+        _, scores = self.fuzzy_system.score_plants_batch(*grid)
+
+        # Stored as float32
+        np.testing.assert_allclose(scores, self.fuzzy_system.vectorized_engine.score(*grid), rtol=0, atol=1e-6)
+
+    def test_interpolated_scores_stay_close(self):
+        readings = np.random.default_rng(0).uniform((0, 0, 0), (14, 50, 100), size=(5000, 3)).T
+
+        _, scores = self.fuzzy_system.score_plants_batch(*readings)
+
+        error = np.abs(scores - self.fuzzy_system.vectorized_engine.score(*readings))
+        self.assertLess(error.mean(), 0.005)
+        # Out of range inputs are clipped to the grid, like the engine clips them
+        _, clipped = self.fuzzy_system.score_plants_batch([-1.0, 15.5], [-5.0, 55.0], [-10.0, 120.0])
+        _, edges = self.fuzzy_system.score_plants_batch([0.0, 14.0], [0.0, 50.0], [0.0, 100.0])
+        np.testing.assert_array_equal(clipped, edges)
+
+    def test_table_is_reused_until_the_rules_change(self):
+        with mock.patch.object(RecommendationLookupTable, 'build') as build:
+            self.fuzzy_system.enable_lookup_table(self.directory.name, self.STEPS)
+        build.assert_not_called()
+        self.assertIn(self.fuzzy_system.fingerprint, self.fuzzy_system.lookup_table.path.name)
+        self.assertTrue(self.fuzzy_system.rule_set_version.startswith(f"{self.fuzzy_system.fingerprint}-lookup-"))
+
+        other = PlantRecommendationFuzzySystem()
+        other.crop_rules['Padi'] = other.crop_rules['Padi'][:1]
+        other.setup_fuzzy_system()
+        self.assertNotEqual(RecommendationLookupTable(other, self.directory.name, self.STEPS).path,
+                            self.fuzzy_system.lookup_table.path)
+
+
+class RecommendationCacheTests(SimpleTestCase):
+    """The opt-in LRU cache of get_plant_recommendation"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fuzzy_system = PlantRecommendationFuzzySystem()
+
+    def tearDown(self):
+        self.fuzzy_system.disable_cache()
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = RecommendationCache(maxsize=2)
+        cache.put((1.0, 1.0, 1.0), {'a': 0.1})
+        cache.put((2.0, 2.0, 2.0), {'a': 0.2})
+        cache.get((1.0, 1.0, 1.0))
+        cache.put((3.0, 3.0, 3.0), {'a': 0.3})
+
+        self.assertIsNone(cache.get((2.0, 2.0, 2.0)))
+        self.assertEqual(dict(cache.get((1.0, 1.0, 1.0))), {'a': 0.1})
+        self.assertEqual(dict(cache.get((3.0, 3.0, 3.0))), {'a': 0.3})
+        self.assertEqual(cache.stats(), {
+            'hits': 3, 'misses': 1, 'evictions': 1, 'size': 2, 'maxsize': 2, 'hit_rate': 0.75,
+        })
+        cache.clear()
+        self.assertEqual(cache.stats()['size'], 0)
+        self.assertEqual(RecommendationCache().stats()['hit_rate'], 0.0)
+
+    def test_callers_cannot_change_cached_scores(self):
+        cache = self.fuzzy_system.enable_cache()
+        scores = {'a': 0.5}
+        cache.put((1.0, 1.0, 1.0), scores)
+        scores['a'] = 0.9
+        self.assertEqual(dict(cache.get((1.0, 1.0, 1.0))), {'a': 0.5})
+
+        first = self.fuzzy_system.get_plant_recommendation(6.5, 26.0, 70)
+        first['all_plants'][0]['suitability_score'] = -1.0
+        first['all_plants'].clear()
+        second = self.fuzzy_system.get_plant_recommendation(6.5, 26.0, 70)
+
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertTrue(second['all_plants'])
+        self.assertGreaterEqual(second['top_recommendation']['suitability_score'], 0)
+
+    def test_cached_recommendations_score_the_rounded_inputs(self):
+        reading = (6.534, 26.46, 70.4)
+        rounded = (6.53, 26.5, 70.0)
+        self.fuzzy_system.enable_cache()
+
+        cached = self.fuzzy_system.get_plant_recommendation(*reading)
+        [batch] = self.fuzzy_system.get_plant_recommendation_batch(*([value] for value in rounded))
+
+        self.assertEqual(cached['all_plants'], batch['all_plants'])
+        # The response still echoes the reading itself
+        self.assertEqual(cached['input_conditions'], {'ph': 6.534, 'temperature': 26.46, 'humidity': 70.4})
+
+    def test_uncached_recommendations_match_the_batch(self):
+        reading = (6.534, 26.46, 70.4)
+
+        single = self.fuzzy_system.get_plant_recommendation(*reading)
+        [batch] = self.fuzzy_system.get_plant_recommendation_batch(*([value] for value in reading))
+
+        self.assertIsNone(self.fuzzy_system.cache)
+        self.assertEqual(single, batch)
+
+
+class CompiledRuleBaseTests(SimpleTestCase):
+    """A system loaded from save_compiled() against one built with skfuzzy"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = Path(cls.directory.name) / 'compiled_rule_base.npz'
+        cls.built = PlantRecommendationFuzzySystem(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_loaded_system_scores_like_the_built_one(self):
+        self.assertTrue(self.path.exists())
+
+        loaded = PlantRecommendationFuzzySystem(self.path)
+
+        # Loaded with NumPy alone, skfuzzy is left unbuilt
+        self.assertNotIn('ph', loaded.__dict__)
+        self.assertNotIn('simulators', loaded.__dict__)
+        self.assertEqual(loaded.fingerprint, self.built.fingerprint)
+        _, expected = self.built.score_plants_batch(*zip(*FUZZY_GRID))
+        _, scores = loaded.score_plants_batch(*zip(*FUZZY_GRID))
+        np.testing.assert_array_equal(scores, expected)
+
+        # The skfuzzy reference is still there when asked for
+        readings = FUZZY_GRID[::37]
+        np.testing.assert_allclose(_skfuzzy_scores(loaded, readings), expected[::37], rtol=0, atol=BATCH_TOLERANCE)
+
+    def test_stale_file_is_rebuilt(self):
+        with mock.patch.object(PlantRecommendationFuzzySystem, '_compiled_source_key', return_value='changed'):
+            fuzzy_system = PlantRecommendationFuzzySystem()
+            self.assertFalse(fuzzy_system.load_compiled(self.path))
+        self.assertFalse(fuzzy_system.load_compiled(Path(self.directory.name) / 'missing.npz'))
+
+    def test_new_crop_only_needs_its_rules(self):
+        fuzzy_system = PlantRecommendationFuzzySystem()
+        fuzzy_system.plant_database['Sorgum'] = {'ph': (5.5, 7.5), 'temp': (23, 30), 'humidity': (50, 80)}
+        fuzzy_system.crop_rules['Sorgum'] = [
+            ([['ph.acidic', 'ph.neutral'], ['temperature.normal', 'temperature.hot'], ['humidity.medium']],
+             'suitable'),
+            ([['ph.alkaline', 'temperature.cold', 'humidity.high']], 'unsuitable'),
+        ]
+        fuzzy_system.setup_fuzzy_system()
+
+        plant_names, scores = fuzzy_system.score_plants_batch(*zip(*FUZZY_GRID))
+
+        self.assertEqual(plant_names[-1], 'Sorgum')
+        self.assertNotEqual(fuzzy_system.fingerprint, self.built.fingerprint)
+        readings = FUZZY_GRID[::37]
+        np.testing.assert_allclose(_skfuzzy_scores(fuzzy_system, readings), scores[::37], rtol=0,
+                                   atol=BATCH_TOLERANCE)
+
+
+class BulkRecommendationRunnerTests(SimpleTestCase):
+    """Recommendations from the process pool against the in-process batch path"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.compiled_path = Path(cls.directory.name) / 'compiled_rule_base.npz'
+        cls.fuzzy_system = PlantRecommendationFuzzySystem(cls.compiled_path)
+        cls.expected = cls.fuzzy_system.get_plant_recommendation_batch(*zip(*FUZZY_GRID))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def assertRecommendations(self, workers):
+        # Every fifth item is skipped, and the small chunks keep several in flight
+        items = [None if index % 5 == 0 else reading for index, reading in enumerate(FUZZY_GRID)]
+        timings = []
+        with BulkRecommendationRunner(workers=workers, chunk_size=16, max_pending=3, compiled_path=self.compiled_path,
+                                      timer=lambda *timing: timings.append(timing)) as runner:
+            results = list(runner.recommendations(items, reading=lambda item: item))
+
+        self.assertEqual([item for item, _ in results], items)
+        for (item, recommendation), expected in zip(results, self.expected):
+            self.assertEqual(recommendation, None if item is None else expected)
+        # The scoring time of every chunk, also from the worker processes
+        self.assertEqual(len(timings), -(-len(items) // 16))
+        self.assertEqual({name for name, _ in timings}, {'get_plant_recommendation_batch'})
+        self.assertTrue(all(seconds > 0 for _, seconds in timings))
+
+    def test_inline(self):
+        self.assertRecommendations(workers=0)
+
+    def test_process_pool(self):
+        self.assertRecommendations(workers=2)
+
+    def test_process_pool_matches_inline_with_uneven_chunks(self):
+        # Runs of 9 skipped items leave some chunks with nothing to score
+        items = [None if index % 40 < 9 else reading for index, reading in enumerate(FUZZY_GRID)]
+        with BulkRecommendationRunner(workers=0, compiled_path=self.compiled_path) as inline, \
+                BulkRecommendationRunner(workers=2, max_pending=3, compiled_path=self.compiled_path) as pool:
+            # Single items, a size that leaves a short last chunk, and one chunk for everything
+            for chunk_size in (1, 7, 50, len(items) + 1):
+                inline.chunk_size = pool.chunk_size = chunk_size
+                with self.subTest(chunk_size=chunk_size):
+                    self.assertEqual(
+                        list(pool.recommendations(items, reading=lambda item: item)),
+                        list(inline.recommendations(items, reading=lambda item: item)),
+                    )
+
+
+class StoredRecommendationTests(TestCase):
+    """Recommendations read back with the readings, refreshed when missing"""
+
+    def test_missing_recommendations_are_refreshed_before_reading(self):
+        SoilCondition.objects.bulk_create(
+            SoilCondition(ph_value=ph_value, temperature_value=temp_value, moisture_value=humidity_value)
+            for ph_value, temp_value, humidity_value in [(6.5, 26, 70), (5.0, 31, 45), (0, 26, 70), (7.25, 22, 82)]
+        )
+        soil_conditions = SoilCondition.objects.order_by('id')
+
+        rows = list(recommendations.recommended_plants_rows(soil_conditions, chunk_size=2))
+
+        self.assertEqual([sc.id for sc, _ in rows], list(soil_conditions.values_list('id', flat=True)))
+        self.assertEqual(recommendations.recommended_plants_strings([sc for sc, _ in rows]), [text for _, text in rows])
+        self.assertEqual(
+            list(SoilRecommendation.objects.order_by('soil_condition_id').values_list('recommended_plants', flat=True)),
+            [text for _, text in rows],
+        )
+        self.assertFalse(recommendations.stale_recommendations(soil_conditions).exists())
+
+    def test_failed_recommendation_is_logged_and_the_reading_kept(self):
+        with mock.patch.object(views, 'store_recommendations', side_effect=RuntimeError('fuzzy system down')), \
+                self.assertLogs('solire_app.views', 'ERROR') as logs:
+            response = self.client.post(reverse('solire_app:insert_data'), content_type='application/json',
+                                        data={'temperature_c': 26, 'moisture_percent': 70, 'ph_value': 6.5})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(SoilCondition.objects.filter(id=response.json()['id']).exists())
+        self.assertIn('Could not store the recommendation of reading', logs.output[0])
+        self.assertIn('RuntimeError: fuzzy system down', logs.output[0])
+
+
+class RetentionTests(TestCase):
+    """Expired readings archived and deleted, and the row count afterwards"""
+
+    def setUp(self):
+        now = timezone.now()
+        # A probe not heard of for long, whose reading is kept as its latest,
+        # then 20 expired and 10 recent readings of another
+        readings = SoilCondition.objects.bulk_create(
+            [SoilCondition(device_id='retired', ph_value=6.5, temperature_value=26, moisture_value=70)]
+            + [SoilCondition(device_id='probe', ph_value=6.5, temperature_value=26, moisture_value=70)
+               for _ in range(30)]
+        )
+        self.ids = [sc.id for sc in readings]
+        SoilCondition.objects.filter(id__in=self.ids[:21]).update(timestamps=now - timedelta(days=40))
+        SoilCondition.objects.filter(id__in=self.ids[21:]).update(timestamps=now)
+        SoilRecommendation.objects.bulk_create(
+            SoilRecommendation(soil_condition_id=id, recommended_plants='Tomato', rule_set_version='test')
+            for id in self.ids
+        )
+        update_latest_readings(SoilCondition.objects.all())
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+
+    def expire(self, **kwargs):
+        return expire_readings(timezone.now() - timedelta(days=30), self.archive_dir, **kwargs)
+
+    def test_deletes_bind_at_most_max_query_params(self):
+        with mock.patch.object(connection.features, 'max_query_params', 3), \
+                CaptureQueriesContext(connection) as queries:
+            deleted, archives = self.expire(batch_size=8)
+
+        self.assertEqual(deleted, 20)
+        remaining = [self.ids[0]] + self.ids[21:]
+        self.assertEqual(list(SoilCondition.objects.order_by('id').values_list('id', flat=True)), remaining)
+        self.assertEqual(
+            list(SoilRecommendation.objects.order_by('soil_condition_id').values_list('soil_condition_id', flat=True)),
+            remaining,
+        )
+        # Batches of 8, 8 and 4 ids, deleted 3 at a time from both tables
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 2 * (3 + 3 + 2))
+        archived = [json.loads(line) for path in archives for line in gzip.open(path)]
+        self.assertEqual(sorted(row['id'] for row in archived), self.ids[1:21])
+
+    @mock.patch.object(pagination, 'EXACT_COUNT_LIMIT', 1)
+    def test_estimated_total_counts_the_kept_readings(self):
+        self.expire()
+
+        response = self.client.get(reverse('solire_app:list_data_with_recommendation'), {'limit': 5})
+        # Not the 31 ids between the kept reading and the newest one
+        self.assertEqual(response.json()['total'], 11)
+        self.assertTrue(response.json()['total_is_estimate'])
+
+        self.client.post(reverse('solire_app:insert_data'), content_type='application/json',
+                         data={'temperature_c': 26, 'moisture_percent': 70, 'ph_value': 6.5})
+        response = self.client.get(reverse('solire_app:list_data_with_recommendation'), {'limit': 5})
+        self.assertEqual(response.json()['total'], 12)
+
+
+def _reading_line(**reading):
+    return json.dumps({'temperature_c': 26, 'moisture_percent': 70, 'ph_value': 6.5, **reading})
+
+
+class BulkIngestTests(TestCase):
+    """api/insert/bulk/ with JSON arrays and NDJSON bodies"""
+
+    def post(self, body, content_type='application/json'):
+        return self.client.post(reverse('solire_app:insert_data_bulk'), data=body, content_type=content_type)
+
+    def assertStored(self, values):
+        """The stored (pH, temperature, moisture) in id order, each with its recommendation"""
+
+        soil_conditions = SoilCondition.objects.order_by('id')
+        self.assertEqual(
+            [(sc.ph_value, sc.temperature_value, sc.moisture_value) for sc in soil_conditions], values
+        )
+        self.assertEqual(
+            list(SoilRecommendation.objects.order_by('soil_condition_id').values_list('soil_condition_id', flat=True)),
+            [sc.id for sc in soil_conditions],
+        )
+
+    @override_settings(SOLIRE_INGEST_BATCH_SIZE=2)
+    def test_json_array_is_stored_in_batches(self):
+        readings = [{'temperature_c': 20 + index, 'moisture_percent': 60, 'ph_value': 6.5} for index in range(5)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(json.dumps(readings))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'success': True, 'received': 5, 'inserted': 5, 'errors': []})
+        self.assertStored([(6.5, 20.0 + index, 60) for index in range(5)])
+        # Batches of 2, 2 and 1, and the recommendations written per batch
+        inserts = collections.Counter(
+            query['sql'].split()[2].strip('"') for query in queries if query['sql'].startswith('INSERT')
+        )
+        self.assertEqual(inserts['solire_app_soilcondition'], 3)
+        self.assertEqual(inserts['solire_app_soilrecommendation'], 3)
+
+    def test_ndjson_with_a_bad_line_is_a_partial_success(self):
+        body = '\n'.join([
+            _reading_line(temperature_c=21),
+            '{"temperature_c": 22,',
+            '',
+            _reading_line(ph_value=15),
+            _reading_line(temperature_c=24, device_id='probe-2'),
+        ]) + '\n'
+        response = self.post(body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 207)
+        data = response.json()
+        self.assertEqual((data['success'], data['received'], data['inserted']), (False, 4, 2))
+        # Positions among the non-blank lines
+        self.assertEqual([error['index'] for error in data['errors']], [1, 2])
+        self.assertTrue(data['errors'][0]['error'].startswith('Invalid JSON'))
+        self.assertEqual(data['errors'][1]['received_ph'], 15)
+        self.assertStored([(6.5, 21.0, 70), (6.5, 24.0, 70)])
+        self.assertEqual(SoilCondition.objects.get(temperature_value=24).device_id, 'probe-2')
+
+    def test_rejected_bodies(self):
+        for body, content_type in [
+            ('{"temperature_c": 26', 'application/json'),
+            (_reading_line(), 'application/json'),
+            (json.dumps([{'temperature_c': 26}, 'not a reading']), 'application/json'),
+            ('not json\n', 'application/x-ndjson'),
+        ]:
+            with self.subTest(body=body):
+                response = self.post(body, content_type)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+
+        self.assertFalse(SoilCondition.objects.exists())
+
+
+class KeysetPaginationTests(TestCase):
+    """list_data pages walked with their cursors"""
+
+    def test_tied_timestamps_are_returned_exactly_once(self):
+        readings = SoilCondition.objects.bulk_create(
+            SoilCondition(ph_value=6.5, temperature_value=26, moisture_value=70) for _ in range(11)
+        )
+        # Two runs of readings sharing a timestamp, which page boundaries split
+        ids = [sc.id for sc in readings]
+        SoilCondition.objects.filter(id__in=ids[:7]).update(timestamps=datetime(2026, 10, 18, 9, 0))
+        SoilCondition.objects.filter(id__in=ids[7:]).update(timestamps=datetime(2026, 10, 18, 10, 0))
+
+        for order in ('desc', 'asc'):
+            with self.subTest(order=order):
+                seen = []
+                params = {'limit': 3, 'order': order, 'fields': 'id'}
+                while True:
+                    page = self.client.get(reverse('solire_app:list_data'), params).json()
+                    seen.extend(row['id'] for row in page['data'])
+                    if page['next_cursor'] is None:
+                        break
+                    params['cursor'] = page['next_cursor']
+
+                # Every id once, in (timestamps, id) order
+                self.assertEqual(seen, ids if order == 'asc' else ids[::-1])
+
+
+class ListFormatTests(TestCase):
+    """The columns and msgpack formats hold the same values as the json one"""
+
+    def test_timestamps_are_written_like_the_json_encoder(self):
+        readings = SoilCondition.objects.bulk_create(
+            SoilCondition(ph_value=6.5, temperature_value=26, moisture_value=70) for _ in range(3)
+        )
+        # Whole seconds (no fraction), microseconds, and less than a millisecond
+        for sc, microsecond in zip(readings, [0, 123456, 500]):
+            SoilCondition.objects.filter(id=sc.id).update(
+                timestamps=datetime(2026, 10, 18, 9, 1, 2 + sc.id % 50, microsecond)
+            )
+
+        rows = self.client.get(reverse('solire_app:list_data')).json()['data']
+        data = self.client.get(reverse('solire_app:list_data'), {'format': 'columns'}).json()['data']
+
+        self.assertEqual(data['timestamps'], [row['timestamps'] for row in rows])
+        self.assertEqual(sorted(len(value) for value in data['timestamps']), [19, 23, 23])
+
+
+class ConditionalGetTests(TestCase):
+    """ETags, 304s and the response cache of the list endpoints"""
+
+    def setUp(self):
+        # The cache outlives each test's rollback, which resets the version
+        cache.clear()
+        self.store_reading()
+
+    def store_reading(self):
+        response = self.client.post(reverse('solire_app:insert_data'), content_type='application/json',
+                                    data={'temperature_c': 26, 'moisture_percent': 70, 'ph_value': 6.5})
+        self.assertEqual(response.status_code, 201)
+
+    def test_matching_if_none_match_is_not_modified(self):
+        etag = self.client.get(reverse('solire_app:list_data'))['ETag']
+
+        response = self.client.get(reverse('solire_app:list_data'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_insert_changes_the_etag(self):
+        etag = self.client.get(reverse('solire_app:list_data'))['ETag']
+        self.store_reading()
+
+        response = self.client.get(reverse('solire_app:list_data'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['data']), 2)
+
+    def test_cached_response_is_not_served_after_a_write(self):
+        self.assertEqual(len(self.client.get(reverse('solire_app:list_data')).json()['data']), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.client.get(reverse('solire_app:list_data')).json()['data']), 1)
+        # From the cache: only the DatasetVersion was read
+        self.assertEqual([query['sql'] for query in queries if 'solire_app_soilcondition' in query['sql']], [])
+
+        self.store_reading()
+
+        self.assertEqual(len(self.client.get(reverse('solire_app:list_data')).json()['data']), 2)
+
+    def test_errors_have_no_validators(self):
+        for response in [
+            self.client.get(reverse('solire_app:device_latest', args=['missing'])),
+            self.client.get(reverse('solire_app:list_data'), {'limit': 0}),
+        ]:
+            with self.subTest(status=response.status_code):
+                self.assertIn(response.status_code, (400, 404))
+                self.assertNotIn('ETag', response)
+                self.assertNotIn('Last-Modified', response)
+
+    async def test_async_list_has_the_same_validators(self):
+        response = await self.async_client.get(reverse('solire_app:list_data'))
+        async_response = await self.async_client.get(reverse('solire_app:list_data_async'))
+
+        for header in ('ETag', 'Last-Modified', 'Vary'):
+            self.assertEqual(async_response[header], response[header])
+        not_modified = await self.async_client.get(reverse('solire_app:list_data_async'),
+                                                   headers={'If-None-Match': response['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_version_is_bumped_after_the_commit_outside_sqlite(self):
+        version = DatasetVersion.objects.get(pk=1).version
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                self.captureOnCommitCallbacks() as callbacks:
+            bump_data_version()
+            # No UPDATE of the shared row inside the writer's transaction
+            self.assertEqual(DatasetVersion.objects.get(pk=1).version, version)
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(DatasetVersion.objects.get(pk=1).version, version + 1)
+
+
+class AsyncViewTests(TestCase):
+    """The async views answer like the sync ones they mirror"""
+
+    def setUp(self):
+        cache.clear()
+
+    async def assertSameResponses(self, name, async_name, method='get', cases=()):
+        for kwargs in cases:
+            with self.subTest(view=name, **kwargs):
+                response = await sync_to_async(getattr(self.client, method))(reverse(f'solire_app:{name}'), **kwargs)
+                async_response = await getattr(self.async_client, method)(reverse(f'solire_app:{async_name}'), **kwargs)
+                self.assertEqual(async_response.status_code, response.status_code)
+                self.assertEqual(async_response['Content-Type'], response['Content-Type'])
+                self.assertEqual(async_response.content, response.content)
+
+    async def test_insert(self):
+        reading = {'temperature_c': 26, 'moisture_percent': 70, 'ph_value': 6.5, 'device_id': 'probe'}
+        response = await sync_to_async(self.client.post)(
+            reverse('solire_app:insert_data'), data=reading, content_type='application/json'
+        )
+        async_response = await self.async_client.post(
+            reverse('solire_app:insert_data_async'), data=reading, content_type='application/json'
+        )
+
+        self.assertEqual((async_response.status_code, response.status_code), (201, 201))
+        self.assertEqual({**async_response.json(), 'id': None}, {**response.json(), 'id': None})
+        stored = [sc async for sc in SoilCondition.objects.select_related('recommendation').order_by('id')]
+        self.assertEqual(
+            [(sc.device_id, sc.ph_value, sc.temperature_value, sc.moisture_value) for sc in stored],
+            [('probe', 6.5, 26.0, 70)] * 2,
+        )
+        self.assertEqual(stored[1].recommendation.recommended_plants, stored[0].recommendation.recommended_plants)
+
+        await self.assertSameResponses('insert_data', 'insert_data_async', 'post', [
+            {'data': '{"temperature_c": 26', 'content_type': 'application/json'},
+            {'data': {**reading, 'ph_value': 15}, 'content_type': 'application/json'},
+            {'data': {'temperature_c': 26}, 'content_type': 'application/json'},
+        ])
+
+    async def test_list(self):
+        await SoilCondition.objects.abulk_create(
+            SoilCondition(device_id=f'probe-{index % 2}', ph_value=5 + index / 2, temperature_value=20 + index,
+                          moisture_value=40 + index)
+            for index in range(5)
+        )
+        first_page = (await self.async_client.get(reverse('solire_app:list_data_async'), {'limit': 2})).json()
+
+        await self.assertSameResponses('list_data', 'list_data_async', cases=[
+            {},
+            {'data': {'format': 'columns'}},
+            {'data': {'limit': 2}},
+            {'data': {'limit': 2, 'cursor': first_page['next_cursor']}},
+            {'data': {'order': 'asc', 'fields': 'id,ph_value', 'device': 'probe-1', 'min_ph': 5.5}},
+            {'data': {'limit': 2, 'format': 'columns', 'fields': 'timestamps,moisture_value'}},
+            {'data': {'limit': 0}},
+            {'data': {'format': 'xml'}},
+            {'data': {'cursor': 'not-a-cursor'}},
+        ])
+
+    async def test_recommend(self):
+        await self.assertSameResponses('recommendation_plants', 'recommendation_plants_async', cases=[
+            {'data': {'ph': 6.5, 'temp': 26, 'humidity': 70}},
+            {'data': {'ph': 6.5}},
+        ])
+        await self.assertSameResponses('recommendation_plants', 'recommendation_plants_async', 'post', cases=[
+            {'data': {'ph': 5.5, 'temp': 30, 'humidity': 80}, 'content_type': 'application/json'},
+            {'data': '{', 'content_type': 'application/json'},
+        ])
+
+
+class RollupTests(TestCase):
+    """Rollups kept up to date as readings are stored, and api/rollups/"""
+
+    def setUp(self):
+        cache.clear()
+        # Single and bulk inserts over three hours of two days, out of order
+        for stored_at, readings in [
+            (datetime(2026, 10, 17, 23, 10), [(6.5, 21.5, 70)]),
+            (datetime(2026, 10, 18, 9, 5), [(5.0, 18.0, 40), (7.5, 30.25, 90), (6.0, 25.0, 60)]),
+            (datetime(2026, 10, 17, 23, 50), [(4.5, 35.0, 20), (8.0, 12.5, 95)]),
+            (datetime(2026, 10, 18, 9, 55), [(6.8, 22.0, 75)]),
+            (datetime(2026, 10, 18, 10, 0), [(7.0, 19.5, 55), (5.5, 28.0, 65)]),
+        ]:
+            with mock.patch('django.utils.timezone.now', return_value=stored_at):
+                fields = [{'ph_value': ph, 'temperature_c': temperature, 'moisture_percent': moisture}
+                          for ph, temperature, moisture in readings]
+                if len(fields) == 1:
+                    store_reading(clean_reading(fields[0]))
+                else:
+                    ingest_readings(enumerate(fields))
+
+    def rollups(self):
+        return {
+            (rollup.pop('period'), rollup.pop('bucket')): rollup
+            for rollup in SoilConditionRollup.objects.values(*[
+                field.name for field in SoilConditionRollup._meta.fields if field.name != 'id'
+            ])
+        }
+
+    def test_incremental_rollups_equal_a_rebuild(self):
+        incremental = self.rollups()
+        call_command('rebuild_rollups', stdout=io.StringIO())
+        rebuilt = self.rollups()
+
+        self.assertEqual(sorted(incremental), sorted(rebuilt))
+        self.assertEqual(len(incremental), 3 + 2)
+        for key, rollup in rebuilt.items():
+            with self.subTest(bucket=key):
+                self.assertEqual(incremental[key].keys(), rollup.keys())
+                for field, value in rollup.items():
+                    self.assertAlmostEqual(incremental[key][field], value)
+
+    def get(self, **params):
+        return self.client.get(reverse('solire_app:list_rollups'), params)
+
+    def test_period_since_and_until(self):
+        hours = self.get().json()
+        self.assertEqual(hours['period'], 'hour')
+        self.assertEqual([row['bucket'] for row in hours['data']],
+                         ['2026-10-17T23:00:00', '2026-10-18T09:00:00', '2026-10-18T10:00:00'])
+        self.assertEqual([row['count'] for row in hours['data']], [3, 4, 2])
+        self.assertAlmostEqual(hours['data'][1]['ph_mean'], (5.0 + 7.5 + 6.0 + 6.8) / 4)
+        self.assertEqual((hours['data'][0]['moisture_min'], hours['data'][0]['moisture_max']), (20, 95))
+
+        days = self.get(period='day').json()['data']
+        self.assertEqual([(row['bucket'], row['count']) for row in days],
+                         [('2026-10-17T00:00:00', 3), ('2026-10-18T00:00:00', 6)])
+
+        # since takes in the bucket it falls in, until is exclusive
+        self.assertEqual(
+            [row['bucket'] for row in self.get(since='2026-10-18T09:30', until='2026-10-18T10:00').json()['data']],
+            ['2026-10-18T09:00:00'],
+        )
+        self.assertEqual([row['bucket'] for row in self.get(period='day', since='2026-10-18').json()['data']],
+                         ['2026-10-18T00:00:00'])
+
+        for params in [{'period': 'week'}, {'since': 'yesterday'}, {'until': '2026-13-01'}]:
+            with self.subTest(**params):
+                self.assertEqual(self.get(**params).status_code, 400)
+
+
+class DeviceTests(TestCase):
+    """Readings of several probes and the latest reading of each"""
+
+    def setUp(self):
+        cache.clear()
+
+    def store(self, stored_at, **reading):
+        with mock.patch('django.utils.timezone.now', return_value=stored_at):
+            return store_reading(clean_reading({'temperature_c': 26, 'moisture_percent': 70, 'ph_value': 6.5,
+                                                **reading}))
+
+    def latest(self):
+        return dict(DeviceLatestReading.objects.values_list('device_id', 'soil_condition_id'))
+
+    def test_device_of_ingested_readings(self):
+        for reading in [{'device_id': 'probe-1'}, {}]:
+            response = self.client.post(reverse('solire_app:insert_data'), content_type='application/json',
+                                        data={'temperature_c': 26, 'moisture_percent': 70, **reading})
+            self.assertEqual(response.status_code, 201)
+        response = self.client.post(reverse('solire_app:insert_data_bulk'), content_type='application/x-ndjson',
+                                    data=_reading_line(device_id='probe-2') + '\n' + _reading_line(device_id=7))
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['errors'][0]['received_device_id'], 7)
+        self.assertEqual(list(SoilCondition.objects.order_by('id').values_list('device_id', flat=True)),
+                         ['probe-1', DEFAULT_DEVICE_ID, 'probe-2'])
+        self.assertEqual(sorted(self.latest()), [DEFAULT_DEVICE_ID, 'probe-1', 'probe-2'])
+
+        response = self.client.post(reverse('solire_app:insert_data'), content_type='application/json',
+                                    data={'temperature_c': 26, 'moisture_percent': 70, 'device_id': 'x' * 65})
+        self.assertEqual(response.status_code, 400)
+
+    def test_latest_reading_ignores_older_readings_stored_later(self):
+        newest = self.store(datetime(2026, 10, 18, 10, 0), device_id='probe')
+        # Buffered by the probe and delivered late
+        self.store(datetime(2026, 10, 18, 9, 0), device_id='probe')
+        self.assertEqual(self.latest(), {'probe': newest.id})
+
+        # Within a batch the newest wins whatever the order, and on a tie the highest id
+        late = SoilCondition.objects.bulk_create(
+            SoilCondition(device_id='probe', ph_value=6.5, temperature_value=26, moisture_value=70) for _ in range(2)
+        )
+        for sc, hour in zip(late, [11, 8]):
+            SoilCondition.objects.filter(id=sc.id).update(timestamps=datetime(2026, 10, 18, hour, 0))
+        late = list(SoilCondition.objects.filter(id__in=[sc.id for sc in late]).order_by('id'))
+        update_latest_readings(list(reversed(late)))
+        self.assertEqual(self.latest(), {'probe': late[0].id})
+
+        tied = self.store(datetime(2026, 10, 18, 11, 0), device_id='probe')
+        self.assertEqual(self.latest(), {'probe': tied.id})
+        self.assertEqual(DeviceLatestReading.objects.get().timestamps, datetime(2026, 10, 18, 11, 0))
+
+    def test_devices_api(self):
+        self.store(datetime(2026, 10, 18, 9, 0), device_id='probe-b', ph_value=5.5)
+        newest_a = self.store(datetime(2026, 10, 18, 10, 0), device_id='probe-a', ph_value=7.0)
+        self.store(datetime(2026, 10, 18, 8, 0), device_id='probe-a', ph_value=6.0)
+
+        devices = self.client.get(reverse('solire_app:list_devices')).json()['data']
+        self.assertEqual([(row['device_id'], row['ph_value']) for row in devices], [('probe-a', 7.0), ('probe-b', 5.5)])
+        self.assertTrue(all(row['recommended_plants'] for row in devices))
+
+        response = self.client.get(reverse('solire_app:device_latest', args=['probe-a']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], devices[0])
+        self.assertEqual(response.json()['data']['id'], newest_a.id)
+
+        response = self.client.get(reverse('solire_app:device_latest', args=['probe-c']))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.json()['success'])
+
+    def test_export_recommendations_matches_the_csv_report(self):
+        self.store(datetime(2026, 10, 18, 9, 0), device_id='probe-b', ph_value=5.5)
+        self.store(datetime(2026, 10, 18, 10, 0), device_id='probe-a', ph_value=7.0, temperature_c=60)
+        report = b''.join(self.client.get(reverse('solire_app:generate_report'), {'format': 'csv'}).streaming_content)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'recommendations.csv'
+            call_command('export_recommendations', output=str(path), workers=0, stdout=io.StringIO())
+            exported = path.read_bytes()
+
+        self.assertEqual(exported, report)
+        self.assertTrue(exported.startswith(b'#,Device,'))
+
+
+class ReportStreamingTests(TestCase):
+    """The streamed report under WSGI and through the ASGI handler"""
+
+    @classmethod
+    def setUpTestData(cls):
+        SoilCondition.objects.bulk_create(
+            SoilCondition(ph_value=6.5, temperature_value=20 + index % 10, moisture_value=40 + index % 50)
+            for index in range(2500)
+        )
+
+    def wsgi_report(self, report_format):
+        response = self.client.get(reverse('solire_app:generate_report'), {'format': report_format})
+        self.assertFalse(response.is_async)
+        return b''.join(response.streaming_content)
+
+    async def test_csv_is_streamed_in_chunks_under_asgi(self):
+        response = await self.async_client.get(reverse('solire_app:generate_report'), {'format': 'csv'})
+
+        # An async iterator, which the ASGI handler sends as it goes instead
+        # of reading it whole first
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # 1000 lines per chunk, the header included
+        self.assertEqual([chunk.count(b'\r\n') for chunk in chunks], [1000, 1000, 501])
+        self.assertEqual(b''.join(chunks), await sync_to_async(self.wsgi_report)('csv'))
+
+    async def test_xlsx_is_streamed_under_asgi(self):
+        response = await self.async_client.get(reverse('solire_app:generate_report'))
+
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        rows = list(load_workbook(io.BytesIO(content), read_only=True).active.values)
+        self.assertEqual(len(rows), 2501)
+        self.assertEqual(list(rows[0]), views.REPORT_HEADER)
+
+
+class ExportStreamingTests(TestCase):
+    """The Arrow / Parquet export is streamed through the ASGI handler too"""
+
+    @classmethod
+    def setUpTestData(cls):
+        SoilCondition.objects.bulk_create(
+            SoilCondition(ph_value=6.5, temperature_value=20 + index % 10, moisture_value=40 + index % 50)
+            for index in range(2500)
+        )
+
+    def wsgi_export(self):
+        response = self.client.get(reverse('solire_app:export_data'), {'format': 'arrow'})
+        self.assertFalse(response.is_async)
+        return b''.join(response.streaming_content)
+
+    async def test_arrow_is_streamed_under_asgi(self):
+        response = await self.async_client.get(reverse('solire_app:export_data'), {'format': 'arrow'})
+
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(ipc.open_stream(content).read_all().num_rows, 2500)
+        self.assertEqual(content, await sync_to_async(self.wsgi_export)())
+
+
+@override_settings(SOLIRE_SSE_POLL_INTERVAL=0.05, SOLIRE_SSE_MAX_DURATION=10)
+class LiveFeedTests(TestCase):
+    """Server-sent events of new readings"""
+
+    def store_reading(self):
+        response = self.client.post(reverse('solire_app:insert_data'), content_type='application/json',
+                                    data={'temperature_c': 26, 'moisture_percent': 70, 'ph_value': 6.5})
+        return response.json()['id']
+
+    def test_events_under_wsgi(self):
+        first = self.store_reading()
+        response = self.client.get(reverse('solire_app:stream_data'), {'last_event_id': first - 1})
+
+        self.assertFalse(response.is_async)
+        events = iter(response.streaming_content)
+        self.assertEqual(next(events), b'retry: 3000\n\n')
+        self.assertEqual(next(events), f'id: {first}\nevent: reading\ndata: {{"id": {first}}}\n\n'.encode())
+        response.close()
+
+    async def test_events_are_sent_as_they_arrive_under_asgi(self):
+        started = time.monotonic()
+        response = await self.async_client.get(reverse('solire_app:stream_data'))
+
+        self.assertTrue(response.is_async)
+        events = aiter(response.streaming_content)
+        self.assertEqual(await anext(events), b'retry: 3000\n\n')
+        for _ in range(2):
+            reading_id = await sync_to_async(self.store_reading)()
+            event = await asyncio.wait_for(anext(events), timeout=5)
+            self.assertTrue(event.startswith(f'id: {reading_id}\nevent: reading\ndata: '.encode()))
+            self.assertEqual(json.loads(event.split(b'data: ', 1)[1]), {'id': reading_id})
+        await events.aclose()
+        # Long before SOLIRE_SSE_MAX_DURATION, when a buffered stream would end
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_dashboard_polls_under_wsgi(self):
+        cache.clear()
+        response = self.client.get(reverse('solire_app:index'))
+
+        self.assertFalse(response.context['live_stream'])
+        self.assertContains(response, 'const liveStream = false;')
+        # What the page polls for: the newest id, which changes with every new reading
+        self.store_reading()
+        newest = self.store_reading()
+        poll = self.client.get(reverse('solire_app:list_data'), {'limit': 1, 'fields': 'id'})
+        self.assertEqual(poll.json()['data'], [{'id': newest}])
+        self.assertEqual(self.client.get(reverse('solire_app:list_data'), {'limit': 1, 'fields': 'id'},
+                                         headers={'If-None-Match': poll['ETag']}).status_code, 304)
+
+    async def test_dashboard_streams_under_asgi(self):
+        response = await self.async_client.get(reverse('solire_app:index'))
+
+        self.assertTrue(response.context['live_stream'])
+        self.assertContains(response, 'const liveStream = true;')
+
+
+class HistogramTests(SimpleTestCase):
+    def test_exposition_format(self):
+        histogram = metrics.Histogram('solire_test', 'Test histogram', ('view',), (0, 1, 2.5))
+        for value in (0, 0.5, 1, 3):
+            histogram.observe(value, 'solire_app:list_data')
+        histogram.observe(2, 'say "hi"\n')
+
+        self.assertEqual(histogram.expose(), [
+            '# HELP solire_test Test histogram',
+            '# TYPE solire_test histogram',
+            # Bucket bounds are inclusive and the counts cumulative
+            'solire_test_bucket{view="say \\"hi\\"\\n",le="0"} 0',
+            'solire_test_bucket{view="say \\"hi\\"\\n",le="1"} 0',
+            'solire_test_bucket{view="say \\"hi\\"\\n",le="2.5"} 1',
+            'solire_test_bucket{view="say \\"hi\\"\\n",le="+Inf"} 1',
+            'solire_test_sum{view="say \\"hi\\"\\n"} 2',
+            'solire_test_count{view="say \\"hi\\"\\n"} 1',
+            'solire_test_bucket{view="solire_app:list_data",le="0"} 1',
+            'solire_test_bucket{view="solire_app:list_data",le="1"} 3',
+            'solire_test_bucket{view="solire_app:list_data",le="2.5"} 3',
+            'solire_test_bucket{view="solire_app:list_data",le="+Inf"} 4',
+            'solire_test_sum{view="solire_app:list_data"} 4.5',
+            'solire_test_count{view="solire_app:list_data"} 4',
+        ])
+
+
+def _metric_value(text, sample):
+    """Value of one sample line of the Prometheus text format, 0 if absent"""
+
+    for line in text.splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0
+
+
+@override_settings(SOLIRE_METRICS_ENABLED=True, SOLIRE_METRICS_SERVER_TIMING=True)
+class MetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_requests_are_measured(self):
+        SoilCondition.objects.create(ph_value=6.5, temperature_value=26, moisture_value=70)
+        view = 'view="solire_app:list_data_with_recommendation"'
+        before = self.client.get(reverse('solire_app:metrics')).content.decode()
+
+        response = self.client.get(reverse('solire_app:list_data_with_recommendation'))
+
+        self.assertEqual(response.status_code, 200)
+        match = re.fullmatch(r'total;dur=([\d.]+), db;dur=([\d.]+);desc="(\d+) queries", fuzzy;dur=([\d.]+)',
+                             response['Server-Timing'])
+        self.assertIsNotNone(match)
+        total, db_time, queries, fuzzy_time = map(float, match.groups())
+        self.assertGreater(queries, 0)
+        # The stale recommendation was scored in this request
+        self.assertGreater(fuzzy_time, 0)
+        # Each rounded to 0.01 ms
+        self.assertGreaterEqual(total + 0.02, db_time + fuzzy_time)
+
+        scrape = self.client.get(reverse('solire_app:metrics'))
+        self.assertEqual(scrape['Content-Type'], metrics.CONTENT_TYPE)
+        after = scrape.content.decode()
+        for sample, added in (
+            (f'solire_request_duration_seconds_count{{{view},method="GET",status="200"}}', 1),
+            (f'solire_db_queries_count{{{view}}}', 1),
+            (f'solire_db_queries_sum{{{view}}}', queries),
+            (f'solire_fuzzy_duration_seconds_count{{{view}}}', 1),
+        ):
+            self.assertEqual(_metric_value(after, sample) - _metric_value(before, sample), added, sample)
+
+    @override_settings(SOLIRE_METRICS_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('solire_app:list_data'))
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get(reverse('solire_app:metrics')).status_code, 404)
+
+
+class FakeMqttClient:
+    """
+    In-process stand-in for a paho-mqtt Client and its broker session
+
+    publish() queues a message at the broker. The network thread started by
+    loop_start() connects, calls on_connect and hands the queued messages to
+    on_message one at a time once the topic is subscribed, like paho's loop:
+    while on_message blocks, nothing else is delivered. drop_connection()
+    cuts the connection; messages keep queueing (a persistent session) until
+    the thread reconnects.
+    """
+
+    def __init__(self):
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self.subscriptions = []
+        self.connects = 0
+        self.delivered = 0
+        self._messages = collections.deque()
+        self._condition = threading.Condition()
+        self._running = False
+        self._reconnect_after = None
+        self._thread = None
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def connect_async(self, host, port=1883, keepalive=60):
+        self.address = (host, port)
+
+    def loop_start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def loop_stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+
+    def disconnect(self):
+        pass
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.append((topic, qos))
+
+    def publish(self, topic, payload):
+        with self._condition:
+            self._messages.append(types.SimpleNamespace(topic=topic, payload=payload.encode()))
+            self._condition.notify_all()
+
+    def pending(self):
+        """Messages the broker still holds"""
+
+        with self._condition:
+            return len(self._messages)
+
+    def drop_connection(self, reconnect_after=0.2):
+        with self._condition:
+            self._reconnect_after = reconnect_after
+            self._condition.notify_all()
+
+    def _loop(self):
+        while self._running:
+            self.connects += 1
+            self.on_connect(self, None, {}, 0)
+
+            while True:
+                with self._condition:
+                    self._condition.wait_for(lambda: not self._running or self._reconnect_after is not None
+                                             or (self.subscriptions and self._messages))
+                    if not self._running:
+                        return
+                    reconnect_after, self._reconnect_after = self._reconnect_after, None
+                    message = self._messages.popleft() if reconnect_after is None else None
+
+                if message is None:
+                    break
+                self.on_message(self, None, message)
+                self.delivered += 1
+
+            self.on_disconnect(self, None, 1)
+            with self._condition:
+                self._condition.wait_for(lambda: not self._running, timeout=reconnect_after)
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _reading(index):
+    return json.dumps({'temperature_c': 26, 'moisture_percent': 70, 'ph_value': 6.5, 'device_id': f'probe-{index % 3}'})
+
+
+class MqttIngestWorkerTests(TestCase):
+    """MqttIngestWorker against FakeMqttClient"""
+
+    def setUp(self):
+        self.client = FakeMqttClient()
+        self.batches = []
+        self.messages = []
+
+    def worker(self, **options):
+        return mqtt_ingest.MqttIngestWorker(
+            self.client, topic='Sensors', on_batch=lambda created: self.batches.append(len(created)),
+            log=self.messages.append, **options
+        )
+
+    def run_worker(self, worker, control):
+        """Run the worker here, so it stores through the test's database connection, until control() returns"""
+
+        def stop_after_control():
+            try:
+                control()
+            finally:
+                worker.stop()
+
+        controller = threading.Thread(target=stop_after_control, daemon=True)
+        controller.start()
+        worker.run('broker.test')
+        controller.join()
+
+    def test_readings_are_stored_in_batches(self):
+        worker = self.worker(batch_size=10, flush_interval=0.3)
+        for index in range(25):
+            self.client.publish('Sensors', _reading(index))
+        self.client.publish('Sensors', 'not json')
+        self.client.publish('Sensors', json.dumps({'temperature_c': 26}))
+
+        with self.assertLogs(mqtt_ingest.logger, 'WARNING') as logs:
+            self.run_worker(worker, lambda: _wait_for(lambda: worker.received >= 27))
+
+        self.assertEqual(len([message for message in logs.output if 'Rejected reading' in message]), 2)
+        self.assertEqual(self.client.subscriptions, [('Sensors', 1)])
+        self.assertEqual(self.batches, [10, 10, 5])
+        self.assertEqual((worker.received, worker.inserted, worker.rejected), (27, 25, 2))
+        self.assertEqual(SoilCondition.objects.count(), 25)
+        self.assertEqual(set(SoilCondition.objects.values_list('device_id', flat=True)),
+                         {'probe-0', 'probe-1', 'probe-2'})
+
+    def test_full_buffer_stops_the_deliveries(self):
+        worker = self.worker(batch_size=5, flush_interval=0.1, max_buffer=5)
+        released = threading.Event()
+        ingest_readings = mqtt_ingest.ingest_readings
+        observed = []
+
+        def slow_ingest_readings(*args, **kwargs):
+            released.wait(10)
+            return ingest_readings(*args, **kwargs)
+
+        def control():
+            _wait_for(lambda: self.client.delivered >= 10)
+            time.sleep(0.3)
+            observed.append((self.client.delivered, self.client.pending()))
+            released.set()
+            _wait_for(lambda: worker.inserted >= 30)
+
+        for index in range(30):
+            self.client.publish('Sensors', _reading(index))
+        with mock.patch.object(mqtt_ingest, 'ingest_readings', slow_ingest_readings):
+            self.run_worker(worker, control)
+
+        # 5 in the blocked flush, 5 buffered and one waiting in on_message;
+        # the broker kept the rest
+        self.assertEqual(observed, [(10, 19)])
+        self.assertEqual(worker.inserted, 30)
+        self.assertEqual(SoilCondition.objects.count(), 30)
+
+    def test_failed_flush_is_retried(self):
+        worker = self.worker(batch_size=5, flush_interval=0.1)
+        ingest_readings = mqtt_ingest.ingest_readings
+        calls = []
+
+        def failing_once(*args, **kwargs):
+            calls.append(len(args[0]))
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return ingest_readings(*args, **kwargs)
+
+        for index in range(5):
+            self.client.publish('Sensors', _reading(index))
+        with mock.patch.object(mqtt_ingest, 'ingest_readings', failing_once), \
+                self.assertLogs(mqtt_ingest.logger, 'WARNING') as logs:
+            self.run_worker(worker, lambda: _wait_for(lambda: worker.inserted >= 5))
+
+        self.assertEqual(calls, [5, 5])
+        self.assertTrue(any('retrying in 1s' in message for message in logs.output))
+        self.assertEqual(worker.inserted, 5)
+        self.assertEqual(SoilCondition.objects.count(), 5)
+
+    def test_reconnects_and_resubscribes(self):
+        worker = self.worker(batch_size=5, flush_interval=0.1)
+
+        def control():
+            for index in range(5):
+                self.client.publish('Sensors', _reading(index))
+            _wait_for(lambda: worker.inserted >= 5)
+            self.client.drop_connection(reconnect_after=0.3)
+            _wait_for(lambda: any('Disconnected' in message for message in logs.output))
+            # Published while the worker is away, delivered after it is back
+            for index in range(5, 10):
+                self.client.publish('Sensors', _reading(index))
+            _wait_for(lambda: worker.inserted >= 10)
+
+        with self.assertLogs(mqtt_ingest.logger, 'WARNING') as logs:
+            self.run_worker(worker, control)
+
+        self.assertEqual(self.client.connects, 2)
+        self.assertEqual(self.client.subscriptions, [('Sensors', 1), ('Sensors', 1)])
+        self.assertEqual(worker.inserted, 10)
+        self.assertEqual(SoilCondition.objects.count(), 10)
+
+    def test_unstored_readings_are_spooled_for_the_next_run(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        spool_path = Path(directory.name) / 'spool.ndjson'
+        worker = self.worker(batch_size=5, flush_interval=0.1, spool_path=spool_path)
+        calls = []
+
+        def database_down(*args, **kwargs):
+            calls.append(len(args[0]))
+            raise OperationalError('database is locked')
+
+        for index in range(5):
+            self.client.publish('Sensors', _reading(index))
+        with mock.patch.object(mqtt_ingest, 'ingest_readings', database_down), \
+                self.assertLogs(mqtt_ingest.logger, 'WARNING') as logs:
+            # stop() interrupts the retry
+            self.run_worker(worker, lambda: _wait_for(lambda: calls))
+
+        self.assertTrue(any('Spooled 5 readings' in message for message in logs.output))
+        self.assertEqual(SoilCondition.objects.count(), 0)
+        self.assertEqual(spool_path.read_text().splitlines(), [json.dumps(_reading(index)) for index in range(5)])
+
+        # The broker holds nothing any more, the spool has it all
+        self.client = FakeMqttClient()
+        worker = self.worker(batch_size=5, flush_interval=0.1, spool_path=spool_path)
+        self.run_worker(worker, lambda: _wait_for(lambda: worker.inserted >= 5))
+
+        self.assertEqual(worker.inserted, 5)
+        self.assertEqual(self.batches, [5])
+        self.assertEqual(SoilCondition.objects.count(), 5)
+        self.assertEqual(list(Path(directory.name).iterdir()), [])
@@ -6,9 +6,20 @@ app_name = 'solire_app'
 urlpatterns = [
     path("", views.index, name="index"),
     path("api/insert/", views.insert_data, name="insert_data"),
+    path("api/insert/bulk/", views.insert_data_bulk, name="insert_data_bulk"),
     path("api/", views.list_data, name="list_data"),
+    path("api/rollups/", views.list_rollups, name="list_rollups"),
+    path("api/devices/", views.list_devices, name="list_devices"),
+    path("api/devices/<str:device_id>/", views.device_latest, name="device_latest"),
     path("api/recommendation-list", views.list_data_with_recommendation, name="list_data_with_recommendation"),
+    path("api/stream/", views.stream_data, name="stream_data"),
     path("api/recommend/", views.recommend_plant, name="recommendation_plants"),
     path("api/clear/", views.clear_data, name="clear_data"),
     path("api/report/", views.generate_report, name="generate_report"),
+    path("api/export/", views.export_data, name="export_data"),
+    path("metrics", views.metrics_view, name="metrics"),
+    # Async versions for ASGI deployments
+    path("api/async/insert/", views.insert_data_async, name="insert_data_async"),
+    path("api/async/", views.list_data_async, name="list_data_async"),
+    path("api/async/recommend/", views.recommend_plant_async, name="recommendation_plants_async"),
 ]
@@ -1,23 +1,52 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
 from django.shortcuts import render
 from django.views.decorators.http import require_http_methods
-from django.http import JsonResponse, HttpResponse
-from openpyxl import Workbook
-from openpyxl.styles import Font
-
-from .helpers.fuzzy_logic import PlantRecommendationFuzzySystem
-from .models import SoilCondition
+from django.views.decorators.vary import vary_on_headers
+from django.http import FileResponse, JsonResponse, HttpResponse, StreamingHttpResponse
+
+from . import export, metrics
+from .caching import bump_data_version, cached_response, data_condition, data_etag, data_version
+from .filters import filtered_soil_conditions, parse_timestamp
+from .formats import IsoTimestamp, columns, encode_response, negotiate_format
+from .ingest import (
+    ReadingError, clean_reading, ingest_readings, parse_readings, store_reading, wait_for_new_readings,
+)
+from .models import DatasetVersion, DeviceLatestReading, SoilCondition, SoilConditionRollup, SoilRecommendation
+from .pagination import akeyset_page, estimated_count, keyset_page, parse_page_size
+from .recommendations import (
+    REPORT_HEADER, fuzzy_system_instance, recommended_plants_rows, report_rows, rows_with_recommendations,
+    score_recommended_plants, store_recommendations,
+)
+from .rollups import METRICS, PERIODS, bucket_start
+from .streaming import async_streaming, is_asgi_request
+import asyncio
+import contextvars
+import csv
+import itertools
 import json
+import logging
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
 
-# Initialize the fuzzy system globally or as a singleton
-# This avoids re-initializing the system on every request, which can be slow.
-fuzzy_system_instance = PlantRecommendationFuzzySystem()
 
 def index(request):
+    # The readings table is filled a page at a time by the browser, see
+    # list_data_with_recommendation, so the page itself holds no rows.
+    # Only the ASGI handler streams new readings without holding a thread
+    # per open page; under WSGI the page polls api/ instead.
     return render(
         request,
         'solire_app/index.html',
         {
-            'soil_conditions': SoilCondition.objects.all(),
+            'page_size': settings.SOLIRE_INDEX_PAGE_SIZE,
+            'live_stream': is_asgi_request(request),
+            'live_poll_ms': int(settings.SOLIRE_LIVE_POLL_INTERVAL * 1000),
         },
     )
 
@@ -28,27 +57,30 @@ def insert_data(request):
         # Parse JSON data from request body
         data = json.loads(request.body)
         
-        # Validate pH value before creating the object
-        ph_value = float(data.get('ph_value', 0))
-        if not (0.0 <= ph_value <= 14.0):
+        # Validate the reading before creating the object
+        try:
+            fields = clean_reading(data)
+        except ReadingError as e:
             return JsonResponse({
                 'success': False,
-                'error': 'pH value must be between 0 and 14',
-                'received_ph': ph_value
+                'error': str(e),
+                **e.details
             }, status=400)
 
         # Create new instance
-        obj = SoilCondition.objects.create(
-            temperature_value=data['temperature_c'],
-            moisture_value=data['moisture_percent'],
-            ph_value=ph_value,
-        )
+        obj = store_reading(fields)
+
+        # Store its recommendation right away, so reads never have to compute it
+        try:
+            store_recommendations([obj])
+        except Exception:
+            logger.exception("Could not store the recommendation of reading %s", obj.id)
 
         return JsonResponse({
             'success': True,
             'message': 'Data inserted successfully',
             'id': obj.id,
-            'saved_ph': ph_value
+            'saved_ph': obj.ph_value
         }, status=201)
 
     except json.JSONDecodeError:
@@ -56,11 +88,52 @@ def insert_data(request):
             'success': False,
             'error': 'Invalid JSON data'
         }, status=400)
-    except KeyError as e:
+    except Exception as e:
         return JsonResponse({
             'success': False,
-            'error': f'Missing required field: {str(e)}',
-            'required_fields': ['temperature_c', 'moisture_percent', 'ph_value']
+            'error': str(e),
+            'type': type(e).__name__
+        }, status=500)
+
+
+@require_http_methods(["POST"])
+def insert_data_bulk(request):
+    """
+    Insert many readings in one request
+
+    The body is either a JSON array of readings or newline-delimited JSON
+    (one reading per line, Content-Type application/x-ndjson), which is read
+    line by line instead of being loaded whole. Every reading is validated
+    like insert_data; valid ones are stored with one INSERT per
+    SOLIRE_INGEST_BATCH_SIZE rows and the invalid ones are reported by their
+    position in the body.
+    """
+
+    def store_batch(created):
+        try:
+            store_recommendations(created)
+        except Exception:
+            logger.exception("Could not store the recommendations of %d readings", len(created))
+
+    try:
+        content_type = request.content_type or ''
+        if 'ndjson' in content_type or 'jsonl' in content_type:
+            readings = parse_readings(request)
+        else:
+            data = json.loads(request.body)
+            if not isinstance(data, list):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Expected a JSON array of readings'
+                }, status=400)
+            readings = enumerate(data)
+
+        received, inserted, errors = ingest_readings(readings, on_batch=store_batch)
+
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid JSON data'
         }, status=400)
     except Exception as e:
         return JsonResponse({
@@ -69,14 +142,207 @@ def insert_data(request):
             'type': type(e).__name__
         }, status=500)
 
+    if not errors:
+        status = 201
+    elif inserted:
+        # Multi-Status: some readings were stored, see errors for the rest
+        status = 207
+    else:
+        status = 400
+
+    return JsonResponse({
+        'success': not errors,
+        'received': received,
+        'inserted': inserted,
+        'errors': errors
+    }, status=status)
+
+
+# Columns list_data can return, see its fields parameter
+LIST_DATA_FIELDS = ('id', 'device_id', 'ph_value', 'temperature_value', 'moisture_value', 'timestamps')
+
+def _list_data_fields(params):
+    """Columns requested with fields=a,b,c (all of LIST_DATA_FIELDS by default)"""
+
+    if not params.get('fields'):
+        return list(LIST_DATA_FIELDS)
+
+    fields = [field.strip() for field in params['fields'].split(',') if field.strip()]
+    unknown = [field for field in fields if field not in LIST_DATA_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"fields must be a comma separated list of {', '.join(LIST_DATA_FIELDS)}")
+    return fields
+
+
+def _list_data_format(request):
+    """Negotiated format of a list_data response, which its ETag and cache key depend on"""
+
+    try:
+        return negotiate_format(request)
+    except ValueError:
+        return 'invalid'
+
+
+def _list_data_etag(request, *args, **kwargs):
+    return f"{data_etag(request)}-{_list_data_format(request)}"
+
+
+def _list_data_query(params):
+    """
+    (values() queryset, fields, cursor, limit, descending) of a list_data page
+
+    Raises ValueError for malformed parameters.
+    """
+
+    if params.get('order', 'desc') not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'")
+    fields = _list_data_fields(params)
+    # The cursor needs timestamps and id even when they are not returned
+    soil_conditions = filtered_soil_conditions(params).values(*{*fields, 'timestamps', 'id'})
+    return (
+        soil_conditions,
+        fields,
+        params.get('cursor') or None,
+        parse_page_size(params.get('limit')),
+        params.get('order', 'desc') == 'desc',
+    )
+
+
+def _list_data_columns(fields):
+    """values_list() arguments of fields, with the timestamps already formatted by the database"""
+
+    return [IsoTimestamp('timestamps') if field == 'timestamps' else field for field in fields]
+
+
+def _list_data_page_response(rows, fields, next_cursor, response_format):
+    if response_format == 'json':
+        return JsonResponse({
+            'success': True,
+            'data': [{field: row[field] for field in fields} for row in rows],
+            'next_cursor': next_cursor,
+        }, status=200)
+
+    return encode_response({
+        'success': True,
+        'data': columns([[row[field] for field in fields] for row in rows], fields),
+        'next_cursor': next_cursor,
+    }, response_format)
+
 
 @require_http_methods(["GET"])
+@vary_on_headers('Accept')
+@data_condition(etag_func=_list_data_etag)
+@cached_response('list_data', vary_on=_list_data_format)
 def list_data(request):
+    """
+    Stored readings, newest first
+
+    Without query parameters every row is returned, as before. With any of
+    them the response is one keyset-paginated page:
+
+    limit: rows per page (default 100, at most 1000)
+    cursor: next_cursor of the previous page
+    order: 'desc' (newest first, default) or 'asc'
+    device, since, until, min_ph, max_ph, min_temperature, max_temperature,
+    min_moisture, max_moisture: filters, see filters.filtered_soil_conditions()
+    fields: comma separated columns to return, e.g. fields=timestamps,ph_value
+
+    format (which alone does not make the response a page), or else the
+    Accept header, picks how the rows are written:
+
+    json: a list of objects, one per row (default)
+    columns: one JSON array per column, {"data": {"id": [...], ...}}, which
+        does not repeat the column names on every row
+    msgpack: the columns as MessagePack (Accept: application/msgpack)
+    """
+
     try:
-        soil_conditions = SoilCondition.objects.all().order_by('-timestamps')
+        try:
+            response_format = negotiate_format(request)
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+
+        params = request.GET.copy()
+        params.pop('format', None)
+        if not params:
+            soil_conditions = SoilCondition.objects.all().order_by('-timestamps')
+            if response_format == 'json':
+                return JsonResponse({
+                    'success': True,
+                    'data': list(soil_conditions.values())
+                }, status=200)
+
+            # Tuples straight from the cursor, without building a dict per row
+            fields = list(LIST_DATA_FIELDS)
+            return encode_response({
+                'success': True,
+                'data': columns(list(soil_conditions.values_list(*_list_data_columns(fields))), fields)
+            }, response_format)
+
+        try:
+            soil_conditions, fields, cursor, limit, descending = _list_data_query(params)
+            rows, next_cursor = keyset_page(soil_conditions, cursor=cursor, limit=limit, descending=descending)
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+
+        return _list_data_page_response(rows, fields, next_cursor, response_format)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+@require_http_methods(["GET"])
+@data_condition()
+@cached_response('list_rollups')
+def list_rollups(request):
+    """
+    Hourly or daily min / max / mean / count of every metric, oldest first
+
+    period: 'hour' (default) or 'day'
+    since / until (ISO 8601): bucket start range, since inclusive, until exclusive
+
+    Reads the rollup tables, so a year of data is at most 8784 hourly or 366
+    daily rows however many readings it holds.
+    """
+
+    try:
+        try:
+            params = request.GET
+            period = params.get('period', 'hour')
+            if period not in PERIODS:
+                raise ValueError("period must be 'hour' or 'day'")
+            rollups = SoilConditionRollup.objects.filter(period=period).order_by('bucket')
+            if params.get('since'):
+                rollups = rollups.filter(bucket__gte=bucket_start(parse_timestamp('since', params['since']), period))
+            if params.get('until'):
+                rollups = rollups.filter(bucket__lt=parse_timestamp('until', params['until']))
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+
+        data = []
+        for rollup in rollups.values().iterator():
+            row = {'bucket': rollup['bucket'], 'count': rollup['count']}
+            for metric in METRICS:
+                row[f'{metric}_min'] = rollup[f'{metric}_min']
+                row[f'{metric}_max'] = rollup[f'{metric}_max']
+                row[f'{metric}_mean'] = rollup[f'{metric}_sum'] / rollup['count']
+            data.append(row)
+
         return JsonResponse({
             'success': True,
-            'data': list(soil_conditions.values())
+            'period': period,
+            'data': data
         }, status=200)
     except Exception as e:
         return JsonResponse({
@@ -85,63 +351,97 @@ def list_data(request):
         }, status=500)
 
 
+def _recommendation_row(sc, recommended_plants_str):
+    """A SoilCondition with its recommendation, as list_data_with_recommendation returns it"""
+
+    return {
+        'id': sc.id,
+        'device_id': sc.device_id,
+        'temperature_value': sc.temperature_value,
+        'moisture_value': sc.moisture_value,
+        'ph_value': float(sc.ph_value),
+        'recommended_plants': recommended_plants_str,
+        'timestamps': sc.timestamps.strftime('%d-%m-%Y %H:%M:%S'),
+    }
+
+
+def _recommendation_page(request):
+    """One page of list_data_with_recommendation, see its parameters"""
+
+    params = request.GET
+    try:
+        limit = parse_page_size(params.get('limit'))
+        try:
+            offset = int(params.get('offset') or 0)
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            raise ValueError("offset must be a non-negative integer")
+        rows, next_cursor = keyset_page(
+            SoilCondition.objects.select_related('recommendation'),
+            cursor=params.get('cursor') or None,
+            limit=limit,
+            offset=offset,
+        )
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+
+    dataset = data_version(request)
+    counted = None
+    if dataset.counted_rows is not None:
+        counted = (dataset.counted_rows, dataset.counted_last_id)
+    total, total_is_estimate = estimated_count(SoilCondition, counted)
+    version = fuzzy_system_instance.rule_set_version
+    return JsonResponse({
+        'success': True,
+        'data': [_recommendation_row(sc, text) for sc, text in rows_with_recommendations(rows, version)],
+        'next_cursor': next_cursor,
+        'total': total,
+        'total_is_estimate': total_is_estimate,
+    }, status=200)
+
+
+def _rule_set_version(request):
+    return fuzzy_system_instance.rule_set_version
+
+
+def _recommendation_etag(request, *args, **kwargs):
+    """ETag of a response with recommendations, which also change with the rule set"""
+
+    return f"{data_etag(request)}-{fuzzy_system_instance.rule_set_version}"
+
+
 @require_http_methods(["GET"])
+@data_condition(etag_func=_recommendation_etag)
+@cached_response('list_data_with_recommendation', vary_on=_rule_set_version)
 def list_data_with_recommendation(request):
+    """
+    Stored readings with their recommendations, newest first
+
+    Without query parameters every row is returned, as before. With any of
+    them the response is one page, for the dashboard's table:
+
+    limit: rows per page (default 100, at most 1000)
+    cursor: next_cursor of the previous page
+    offset: rows to skip, to jump to a page without its cursor
+
+    A page also reports the table's total row count, estimated on large
+    tables (total_is_estimate) so it never costs a full COUNT(*).
+    """
+
     try:
+        if request.GET:
+            return _recommendation_page(request)
+
         soil_conditions = SoilCondition.objects.all().order_by('-timestamps')
         result_data = []
 
-        for sc in soil_conditions:
-            recommended_plants_str = ""
-
-            invalid_reasons = []
-            if not (0.0 <= sc.ph_value <= 14.0):
-                invalid_reasons.append("pH out of range (0-14)")
-            if not (0 <= sc.temperature_value <= 50):
-                invalid_reasons.append("Temperature out of range (0-50°C)")
-            if not (0 <= sc.moisture_value <= 100):
-                invalid_reasons.append("Moisture out of range (0-100%)")
-            if sc.moisture_value == 0:
-                invalid_reasons.append("Moisture is 0%")
-            if sc.ph_value == 0:
-                invalid_reasons.append("pH is 0")
-            if sc.temperature_value == 0:
-                invalid_reasons.append("Temperature is 0°C")
-
-            if invalid_reasons:
-                recommended_plants_str = f"Invalid Input: {'; '.join(invalid_reasons)}. No recommendation."
-            else:
-                try:
-                    recommended_plants = fuzzy_system_instance.get_plant_recommendation(
-                        float(sc.ph_value),
-                        sc.temperature_value,
-                        sc.moisture_value
-                    )
-
-                    if recommended_plants and recommended_plants['all_plants']:
-                        recommended_plants_str = ', '.join([
-                            f"{plant['plant']} [{plant['suitability_score']:.2f}, {plant['confidence']}]({plant['status']})"
-                            for plant in recommended_plants['all_plants']
-                        ])
-                        if all(plant['suitability_score'] < 0.1 for plant in recommended_plants['all_plants']):
-                            recommended_plants_str += " (Note: All plants show very low suitability.)"
-                    else:
-                        recommended_plants_str = "N/A - No plant recommendations found (possibly due to rule non-firing)."
-
-                except ValueError as ve:
-                    recommended_plants_str = f"Fuzzy Logic Input Error: {str(ve)}"
-                except Exception as e:
-                    recommended_plants_str = f"Error in recommendation logic: {str(e)}"
-
+        for sc, recommended_plants_str in recommended_plants_rows(soil_conditions):
             # Append result including fuzzy recommendation
-            result_data.append({
-                'id': sc.id,
-                'temperature_value': sc.temperature_value,
-                'moisture_value': sc.moisture_value,
-                'ph_value': float(sc.ph_value),
-                'recommended_plants': recommended_plants_str,
-                'timestamps': sc.timestamps.strftime('%d-%m-%Y %H:%M:%S'),
-            })
+            result_data.append(_recommendation_row(sc, recommended_plants_str))
 
         return JsonResponse({
             'success': True,
@@ -156,9 +456,181 @@ def list_data_with_recommendation(request):
         }, status=500)
 
 
+def _latest_readings(device_latest_readings):
+    """list_data_with_recommendation rows of the latest readings of some DeviceLatestReadings"""
+
+    soil_conditions = [
+        latest.soil_condition
+        for latest in device_latest_readings.select_related('soil_condition__recommendation').order_by('device_id')
+    ]
+    version = fuzzy_system_instance.rule_set_version
+    return [_recommendation_row(sc, text) for sc, text in rows_with_recommendations(soil_conditions, version)]
+
+
+@require_http_methods(["GET"])
+@data_condition(etag_func=_recommendation_etag)
+@cached_response('list_devices', vary_on=_rule_set_version)
+def list_devices(request):
+    """
+    Latest reading and recommendation of every device, by device_id
+
+    Reads one DeviceLatestReading per device, so its cost grows with the
+    number of devices, not with the readings stored.
+    """
+
+    try:
+        return JsonResponse({
+            'success': True,
+            'data': _latest_readings(DeviceLatestReading.objects.all())
+        }, status=200)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+@require_http_methods(["GET"])
+@data_condition(etag_func=_recommendation_etag)
+@cached_response('device_latest', vary_on=_rule_set_version)
+def device_latest(request, device_id):
+    """Latest reading and recommendation of one device; its history is api/?device=<device_id>"""
+
+    try:
+        data = _latest_readings(DeviceLatestReading.objects.filter(device_id=device_id))
+        if not data:
+            return JsonResponse({
+                'success': False,
+                'error': f"No readings from device '{device_id}'"
+            }, status=404)
+
+        return JsonResponse({
+            'success': True,
+            'data': data[0]
+        }, status=200)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+def _new_readings_query(last_id):
+    # New ids come from the primary key index, so a poll costs the same
+    # however large the table is
+    return SoilCondition.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:500]
+
+
+def _reading_events_of(chunk):
+    """The server-sent events of some new reading ids"""
+
+    return [f"id: {reading_id}\nevent: reading\ndata: {json.dumps({'id': reading_id})}\n\n" for reading_id in chunk]
+
+
+def _reading_events(last_id):
+    """
+    Server-sent events for the readings stored after last_id, as they arrive
+
+    Each event carries only the reading's id, {"id": ...}, also as event id;
+    the rows themselves are read from api/ or api/recommendation-list,
+    which page and cache them. Between readings a comment keeps proxies from closing the
+    connection; after SOLIRE_SSE_MAX_DURATION the stream ends and the
+    browser reconnects with Last-Event-ID, so no server thread is held forever.
+    """
+
+    started = last_activity = time.monotonic()
+    yield f"retry: {settings.SOLIRE_SSE_RETRY_MS}\n\n"
+
+    while time.monotonic() - started < settings.SOLIRE_SSE_MAX_DURATION:
+        chunk = list(_new_readings_query(last_id))
+        if chunk:
+            yield from _reading_events_of(chunk)
+            last_id = chunk[-1]
+            last_activity = time.monotonic()
+            continue
+
+        if time.monotonic() - last_activity >= settings.SOLIRE_SSE_KEEPALIVE:
+            yield ": keepalive\n\n"
+            last_activity = time.monotonic()
+
+        # Readings stored by this process wake the stream right away, the
+        # others (another worker, ingest_mqtt) are seen at the next poll
+        wait_for_new_readings(settings.SOLIRE_SSE_POLL_INTERVAL)
+
+
+async def _areading_events(last_id):
+    """
+    Async version of _reading_events(), for requests through the ASGI handler
+
+    Django would read a sync generator whole before sending any of it, so
+    the browser would get nothing until SOLIRE_SSE_MAX_DURATION ran out.
+    Polls go through the async ORM and the stream waits with asyncio.sleep(),
+    so an open stream holds no thread between polls; every new reading,
+    from this process or another, is seen at the next poll.
+    """
+
+    started = last_activity = time.monotonic()
+    yield f"retry: {settings.SOLIRE_SSE_RETRY_MS}\n\n"
+
+    while time.monotonic() - started < settings.SOLIRE_SSE_MAX_DURATION:
+        chunk = [reading_id async for reading_id in _new_readings_query(last_id)]
+        if chunk:
+            for event in _reading_events_of(chunk):
+                yield event
+            last_id = chunk[-1]
+            last_activity = time.monotonic()
+            continue
+
+        if time.monotonic() - last_activity >= settings.SOLIRE_SSE_KEEPALIVE:
+            yield ": keepalive\n\n"
+            last_activity = time.monotonic()
+
+        await asyncio.sleep(settings.SOLIRE_SSE_POLL_INTERVAL)
+
+
+@require_http_methods(["GET"])
+def stream_data(request):
+    """
+    Live feed of the ids of new readings (text/event-stream)
+
+    Resumes after the Last-Event-ID header the browser's EventSource sends
+    on reconnect, or after the last_event_id query parameter (e.g. the
+    newest id of a table loaded just before). Without either, only readings
+    stored from now on are sent. Requests through the ASGI handler get the
+    async stream, _areading_events(). Under WSGI every open stream holds a
+    worker thread for up to SOLIRE_SSE_MAX_DURATION, so the dashboard only
+    opens one when served over ASGI.
+    """
+
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if last_id is None:
+        last_id = SoilCondition.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    else:
+        try:
+            last_id = int(last_id)
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Last-Event-ID must be a reading id'
+            }, status=400)
+
+    events = _areading_events(last_id) if is_asgi_request(request) else _reading_events(last_id)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def clear_data(request):
     try:
-        SoilCondition.objects.all().delete()
+        with transaction.atomic():
+            DeviceLatestReading.objects.all().delete()
+            SoilCondition.objects.all().delete()
+            SoilConditionRollup.objects.all().delete()
+            bump_data_version()
+            # Nothing is left, so the id span is exact again
+            DatasetVersion.objects.filter(pk=1).update(counted_rows=None, counted_last_id=None)
         return JsonResponse({
             'success': True,
             'message': 'Data cleared successfully'
@@ -170,91 +642,100 @@ def clear_data(request):
         }, status=500)
 
 
+class _Echo:
+    """File-like object whose write() returns the data, to stream what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_chunks(soil_conditions, chunk_size=1000):
+    """The report as CSV text, chunk_size rows per string"""
+
+    writer = csv.writer(_Echo())
+    lines = (writer.writerow(line) for line in itertools.chain([REPORT_HEADER], report_rows(soil_conditions)))
+    while chunk := ''.join(itertools.islice(lines, chunk_size)):
+        yield chunk
+
+
+def _csv_report(request, soil_conditions):
+    """The report as CSV, streamed while the rows are read, under WSGI and ASGI alike"""
+
+    response = StreamingHttpResponse(_csv_chunks(soil_conditions), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="soil_conditions_report.csv"'
+    return async_streaming(request, response)
+
+
+def _xlsx_report(request, soil_conditions):
+    """
+    The report as an Excel workbook, built in openpyxl's write-only mode
+
+    Rows are appended to a worksheet that openpyxl keeps in a temporary file,
+    and the finished workbook is written to another one and streamed from
+    there, so memory stays flat however many rows there are.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+
+    # Set header row
+    bold = Font(bold=True)
+    header_row = []
+    for val in REPORT_HEADER:
+        cell = WriteOnlyCell(ws, value=val)
+        cell.font = bold
+        header_row.append(cell)
+    ws.append(header_row)
+
+    # Set data rows
+    for row in report_rows(soil_conditions):
+        ws.append(row)
+
+    # Prepare the file for download
+    report_file = tempfile.TemporaryFile()
+    try:
+        wb.save(report_file)
+        report_file.seek(0)
+    except Exception:
+        report_file.close()
+        raise
+    response = FileResponse(
+        report_file,
+        as_attachment=True,
+        filename='soil_conditions_report.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+    # Read per 64 KiB rather than 4 KiB, as each read is a thread switch under ASGI
+    response.block_size = 65536
+    return async_streaming(request, response)
+
+
+@require_http_methods(["GET"])
 def generate_report(request):
     """
-    Generate an Excel report from the database.
+    Generate a report of the database, as an Excel workbook or as CSV.
+
+    ?format=csv starts the download right away and streams the rows as they
+    are read; the default ?format=xlsx is sent once the workbook is complete.
+    ?device=<device_id> limits the report to one device.
     """
+    report_format = request.GET.get('format', 'xlsx')
+    if report_format not in ('xlsx', 'csv'):
+        return JsonResponse({
+            'success': False,
+            'error': 'format must be xlsx or csv'
+        }, status=400)
+
     try:
         soil_conditions = SoilCondition.objects.all().order_by('timestamps')
-        wb = Workbook()
-        ws = wb.active
-
-        # Set header row
-        header_row = ['#', 'Temperature (C)', 'Moisture (%)', 'pH', 'Recommended Plants', 'Timestamps']
-        for col, val in enumerate(header_row, start=1):
-            cell = ws.cell(row=1, column=col)
-            cell.value = val
-            cell.font = Font(bold=True)
-
-        # Set data rows
-        for row_idx, sc in enumerate(soil_conditions, start=2):
-            ws.cell(row=row_idx, column=1).value = row_idx - 1
-            ws.cell(row=row_idx, column=2).value = sc.temperature_value
-            ws.cell(row=row_idx, column=3).value = sc.moisture_value
-            ws.cell(row=row_idx, column=4).value = float(sc.ph_value)
-
-            recommended_plants_str = ""  # Initialize for safety
-
-            # --- Pre-Fuzzy System Validation and Messaging ---
-            invalid_reasons = []
-            if not (0.0 <= sc.ph_value <= 14.0):
-                invalid_reasons.append("pH out of range (0-14)")
-            if not (0 <= sc.temperature_value <= 50):
-                invalid_reasons.append("Temperature out of range (0-50°C)")
-            if not (0 <= sc.moisture_value <= 100):
-                invalid_reasons.append("Moisture out of range (0-100%)")
-
-            # Special case for 0 moisture, as it often means 'no data' or extremely dry
-            if sc.moisture_value == 0:
-                invalid_reasons.append("Moisture is 0%")
-
-            # Special case for pH of 0, as it often means 'no data' or extremely acidic
-            if sc.ph_value == 0:
-                invalid_reasons.append("pH is 0")
-
-            # Special case for temperature of 0, as it often means 'no data' or extremely cold
-            if sc.temperature_value == 0:
-                invalid_reasons.append("Temperature is 0°C")
-
-            if invalid_reasons:
-                recommended_plants_str = f"Invalid Input: {'; '.join(invalid_reasons)}. No recommendation."
-            else:
-                try:
-                    # Pass parameters in the correct order: (pH, Temperature, Moisture)
-                    recommended_plants = fuzzy_system_instance.get_plant_recommendation(
-                        float(sc.ph_value),
-                        sc.temperature_value,
-                        sc.moisture_value
-                    )
-
-                    # Format the output from the fuzzy system
-                    if recommended_plants and recommended_plants['all_plants']:
-                        recommended_plants_str = ', '.join([
-                            f"{plant['plant']} [{plant['suitability_score']:.2f}, {plant['confidence']}]({plant['status']})"
-                            for plant in recommended_plants['all_plants']
-                        ])
-                        # If all suitability scores are very low after processing
-                        if all(plant['suitability_score'] < 0.1 for plant in recommended_plants['all_plants']):
-                            recommended_plants_str += " (Note: All plants show very low suitability.)"
-                    else:
-                        recommended_plants_str = "N/A - No plant recommendations found (possibly due to rule non-firing)."
-
-                except ValueError as ve:  # Catch validation errors from fuzzy system's internal checks
-                    print(f"ERROR: Fuzzy system input validation failed for row {row_idx - 1}: {str(ve)}")
-                    recommended_plants_str = f"Fuzzy Logic Input Error: {str(ve)}"
-                except Exception as e:
-                    print(f"ERROR: General error in get_plant_recommendation for row {row_idx - 1}: {str(e)}")
-                    recommended_plants_str = f"Error in recommendation logic: {str(e)}"
-
-            ws.cell(row=row_idx, column=5).value = recommended_plants_str
-            ws.cell(row=row_idx, column=6).value = sc.timestamps.strftime('%d-%m-%Y %H:%M:%S')
-
-        # Prepare the file for download
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename="soil_conditions_report.xlsx"'
-        wb.save(response)
-
-        return response
+        if request.GET.get('device'):
+            soil_conditions = soil_conditions.filter(device_id=request.GET['device'])
+        if report_format == 'csv':
+            return _csv_report(request, soil_conditions)
+        return _xlsx_report(request, soil_conditions)
 
     except Exception as e:
         return JsonResponse({
@@ -263,50 +744,259 @@ def generate_report(request):
         }, status=500)
 
 
-def recommend_plant(request):
+@require_http_methods(["GET"])
+def export_data(request):
+    """
+    Readings as Parquet or an Arrow IPC stream, for loading into pandas & co.
+
+    format: 'parquet' (default) or 'arrow'
+    scores: 1 to add each plant's suitability score as a column
+    device, since, until, min_ph, ...: filters, see filters.filtered_soil_conditions()
+
+    Rows are oldest first, read and written a chunk at a time and streamed
+    as they are written, under ASGI too, so memory stays flat however many
+    are exported. Needs pyarrow.
+    """
+
+    export_format = request.GET.get('format', 'parquet')
+    if export_format not in export.EXPORT_FORMATS:
+        return JsonResponse({
+            'success': False,
+            'error': f"format must be one of {', '.join(export.EXPORT_FORMATS)}"
+        }, status=400)
+
+    try:
+        soil_conditions = filtered_soil_conditions(request.GET).order_by('timestamps', 'id')
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+
+    try:
+        fuzzy_system = fuzzy_system_instance if request.GET.get('scores') in ('1', 'true') else None
+        # Fail before the response starts if pyarrow is missing
+        export.export_schema()
+        response = StreamingHttpResponse(
+            export.stream_export(soil_conditions, export_format, fuzzy_system),
+            content_type=export.CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="soil_conditions.{export.FILE_EXTENSIONS[export_format]}"'
+        )
+        return async_streaming(request, response)
+
+    except ImportError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=501)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Request metrics of this process in the Prometheus text format, see metrics.MetricsMiddleware"""
+
+    if not settings.SOLIRE_METRICS_ENABLED:
+        return JsonResponse({
+            'success': False,
+            'error': 'Metrics are disabled (SOLIRE_METRICS_ENABLED)'
+        }, status=404)
+
+    return HttpResponse(metrics.expose(), content_type=metrics.CONTENT_TYPE)
+
+
+def _recommendation_params(request):
+    """(pH, temperature, humidity) of a recommend_plant request, ValueError with the API message if invalid"""
+
     if request.method == 'GET':
         # Get parameters from GET request (e.g., /recommend/?ph=6.5&temp=28&humidity=70)
         try:
-            ph_value = float(request.GET.get('ph'))
-            temp_value = int(request.GET.get('temp'))
-            humidity_value = int(request.GET.get('humidity'))
+            return float(request.GET.get('ph')), int(request.GET.get('temp')), int(request.GET.get('humidity'))
         except (TypeError, ValueError):
-            return JsonResponse({'error': 'Invalid or missing input parameters. Please provide ph, temp, and humidity as numbers.'}, status=400)
+            raise ValueError('Invalid or missing input parameters. Please provide ph, temp, and humidity as numbers.') from None
+
+    # Get parameters from POST request (e.g., JSON payload)
+    try:
+        data = json.loads(request.body)
+        return float(data.get('ph')), int(data.get('temp')), int(data.get('humidity'))
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        raise ValueError('Invalid JSON or missing input parameters. Please provide ph, temp, and humidity as numbers.') from None
 
+
+def recommend_plant(request):
+    if request.method not in ('GET', 'POST'):
+        return JsonResponse({'error': 'Only GET and POST requests are supported.'}, status=405)
+
+    try:
+        ph_value, temp_value, humidity_value = _recommendation_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    try:
+        recommendation_results = fuzzy_system_instance.get_plant_recommendation(
+            ph_value, temp_value, humidity_value
+        )
+        return JsonResponse(recommendation_results)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        # Catch any other unexpected errors from the fuzzy system
+        return JsonResponse({'error': f'An unexpected error occurred: {e}'}, status=500)
+
+def recommendation_form(request):
+    # A simple view to render a form for input
+    return render(request, 'recommendation/recommendation_form.html')
+
+
+# Async versions of the ingestion and listing API for ASGI deployments
+# (solire/asgi.py). Database access goes through the async ORM, and fuzzy
+# inference, which is CPU-bound, runs on _fuzzy_executor so a slow
+# recommendation never stalls the event loop and the other connections on it.
+
+_fuzzy_executor = ThreadPoolExecutor(
+    max_workers=settings.SOLIRE_ASYNC_FUZZY_WORKERS, thread_name_prefix='solire-fuzzy'
+)
+
+
+async def _run_fuzzy(func, *args):
+    """Run func(*args) on the fuzzy executor; func must reach fuzzy_system_instance itself"""
+
+    # In the request's context, so its metrics get the fuzzy time
+    return await asyncio.get_running_loop().run_in_executor(
+        _fuzzy_executor, contextvars.copy_context().run, func, *args
+    )
+
+
+def _versioned_recommended_plants(soil_conditions):
+    """(rule set version, 'Recommended Plants' texts) of SoilConditions"""
+
+    return fuzzy_system_instance.rule_set_version, score_recommended_plants(soil_conditions)
+
+
+def _recommend(ph_value, temp_value, humidity_value):
+    """get_plant_recommendation() of the shared fuzzy system"""
+
+    return fuzzy_system_instance.get_plant_recommendation(ph_value, temp_value, humidity_value)
+
+
+@require_http_methods(["POST"])
+async def insert_data_async(request):
+    """Async version of insert_data"""
+
+    try:
+        # Parse JSON data from request body
+        data = json.loads(request.body)
+
+        # Validate the reading before creating the object
         try:
-            recommendation_results = fuzzy_system_instance.get_plant_recommendation(
-                ph_value, temp_value, humidity_value
+            fields = clean_reading(data)
+        except ReadingError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e),
+                **e.details
+            }, status=400)
+
+        # The rollups are updated in the same transaction, which needs a
+        # sync connection
+        obj = await sync_to_async(store_reading)(fields)
+
+        # Store its recommendation right away, so reads never have to compute it
+        try:
+            version, (recommended_plants_str,) = await _run_fuzzy(_versioned_recommended_plants, [obj])
+            await SoilRecommendation.objects.acreate(
+                soil_condition=obj, recommended_plants=recommended_plants_str, rule_set_version=version
             )
-            return JsonResponse(recommendation_results)
-        except ValueError as e:
-            return JsonResponse({'error': str(e)}, status=400)
-        except Exception as e:
-            # Catch any other unexpected errors from the fuzzy system
-            return JsonResponse({'error': f'An unexpected error occurred: {e}'}, status=500)
-
-    elif request.method == 'POST':
-        # Get parameters from POST request (e.g., JSON payload)
-        import json
+        except Exception:
+            logger.exception("Could not store the recommendation of reading %s", obj.id)
+
+        return JsonResponse({
+            'success': True,
+            'message': 'Data inserted successfully',
+            'id': obj.id,
+            'saved_ph': obj.ph_value
+        }, status=201)
+
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid JSON data'
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            'type': type(e).__name__
+        }, status=500)
+
+
+@require_http_methods(["GET"])
+@vary_on_headers('Accept')
+@data_condition(etag_func=_list_data_etag)
+@cached_response('list_data', vary_on=_list_data_format)
+async def list_data_async(request):
+    """Async version of list_data, with the same query parameters and formats"""
+
+    try:
         try:
-            data = json.loads(request.body)
-            ph_value = float(data.get('ph'))
-            temp_value = int(data.get('temp'))
-            humidity_value = int(data.get('humidity'))
-        except (json.JSONDecodeError, TypeError, ValueError):
-            return JsonResponse({'error': 'Invalid JSON or missing input parameters. Please provide ph, temp, and humidity as numbers.'}, status=400)
+            response_format = negotiate_format(request)
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+
+        params = request.GET.copy()
+        params.pop('format', None)
+        if not params:
+            soil_conditions = SoilCondition.objects.all().order_by('-timestamps')
+            if response_format == 'json':
+                return JsonResponse({
+                    'success': True,
+                    'data': [row async for row in soil_conditions.values()]
+                }, status=200)
+
+            fields = list(LIST_DATA_FIELDS)
+            return encode_response({
+                'success': True,
+                'data': columns([row async for row in soil_conditions.values_list(*_list_data_columns(fields))], fields)
+            }, response_format)
 
         try:
-            recommendation_results = fuzzy_system_instance.get_plant_recommendation(
-                ph_value, temp_value, humidity_value
-            )
-            return JsonResponse(recommendation_results)
+            soil_conditions, fields, cursor, limit, descending = _list_data_query(params)
+            rows, next_cursor = await akeyset_page(soil_conditions, cursor=cursor, limit=limit, descending=descending)
         except ValueError as e:
-            return JsonResponse({'error': str(e)}, status=400)
-        except Exception as e:
-            return JsonResponse({'error': f'An unexpected error occurred: {e}'}, status=500)
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
 
-    return JsonResponse({'error': 'Only GET and POST requests are supported.'}, status=405)
+        return _list_data_page_response(rows, fields, next_cursor, response_format)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
 
-def recommendation_form(request):
-    # A simple view to render a form for input
-    return render(request, 'recommendation/recommendation_form.html')
\ No newline at end of file
+
+@require_http_methods(["GET", "POST"])
+async def recommend_plant_async(request):
+    """Async version of recommend_plant"""
+
+    try:
+        params = _recommendation_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    try:
+        return JsonResponse(await _run_fuzzy(_recommend, *params))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'An unexpected error occurred: {e}'}, status=500)